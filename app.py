@@ -1,14 +1,47 @@
 import os
+import time
 from flask import Flask
-from init_db import init_database
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config
+from init_db import ensure_database
+from modules import assets, db, grading, jobs, missions, passwords
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
+    app.config.from_object(Config)
     app.secret_key = 'school-robotics-secret-key-2024'
     
-    # Инициализация базы данных
+    # Адрес клиента и схема из заголовков доверенных прокси (PROXY_FIX_X_FOR)
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config['PROXY_FIX_X_PROTO'])
+    
+    # Инициализация базы данных (пропускается, если схема уже актуальна)
     with app.app_context():
-        init_database()
+        db_init_mode, db_init_time = ensure_database(app.config['DATABASE_PATH'])
+    
+    # Профилирование SQL (SQL_PROFILING) - до создания пула соединений
+    from modules.profiling import init_profiling
+    init_profiling(app)
+    
+    # Общий пул соединений для всех blueprint'ов
+    db.init_app(app)
+    
+    # Пул проверки паролей и ограничение попыток входа
+    passwords.init_app(app)
+    
+    # Фоновая проверка решений задач в процессах-песочницах
+    grading.init_app(app)
+    
+    # Фоновые задания из очереди jobs
+    jobs.init_app(app)
+    
+    # Каталог миссий brainrots.json в памяти процесса
+    missions.init_app(app)
+    
+    # Собранные статические файлы (build_assets.py) и asset_url() в шаблонах
+    assets.init_app(app)
     
     # Регистрация blueprint'ов
     from modules.auth import auth_bp
@@ -20,6 +53,12 @@ def create_app():
     from modules.journal import journal_bp
     from modules.projects import projects_bp
     from modules.achievements import achievements_bp
+    from modules.search import search_bp
+    from modules.leaderboard import leaderboard_bp
+    from modules.challenges import challenges_bp
+    from modules.missions import missions_bp
+    from modules.jobs import jobs_bp
+    from modules.enrollment import enrollment_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
@@ -30,6 +69,25 @@ def create_app():
     app.register_blueprint(journal_bp)
     app.register_blueprint(projects_bp)
     app.register_blueprint(achievements_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(leaderboard_bp)
+    app.register_blueprint(challenges_bp)
+    app.register_blueprint(missions_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(enrollment_bp)
+    
+    # Периодическая сверка счётчиков панели управления
+    from modules.stats import start_reconciler
+    start_reconciler(app)
+    
+    # Время запуска процесса: холодный старт (инициализация схемы) или тёплый
+    app.config['STARTUP_TIMINGS'] = {
+        'pid': os.getpid(),
+        'db_init_mode': db_init_mode,
+        'db_init_seconds': round(db_init_time, 4),
+        'total_seconds': round(time.perf_counter() - started, 4),
+    }
+    app.logger.info('Запуск приложения: %s', app.config['STARTUP_TIMINGS'])
     
     return app
 
@@ -0,0 +1,272 @@
+"""Нагрузочный тест GET-маршрутов всех blueprint'ов.
+
+Создаёт временную базу и заполняет её generate_data.py (или берёт готовую
+через --db), входит под администратором и прогоняет каждый GET-маршрут
+приложения: через тестовый клиент Flask или через локальный WSGI-сервер
+(--wsgi, с --concurrency параллельными клиентами). Для каждого адреса
+печатает p50/p95/p99 задержки и запросов в секунду.
+
+С --save-baseline результаты сохраняются в JSON; с --baseline сравниваются
+с сохранёнными, и при росте p95 больше чем на --max-regression скрипт
+завершается с кодом 1.
+
+    python benchmark.py --scale small --save-baseline benchmarks/baseline.json
+    python benchmark.py --scale small --baseline benchmarks/baseline.json
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from generate_data import SCALES, generate
+
+# Адреса с параметрами, которых нет в правилах маршрутов: фильтры, поиск, вторые страницы
+EXTRA_URLS = [
+    '/students?status=all',
+    '/students?q=Иванов',
+    '/journal?group_id={group_id}',
+    '/journal/export?group_id={group_id}',
+    '/courses?q=курс',
+    '/groups?q=G0001',
+    '/search?q=Петров',
+]
+
+# Маршруты, не пригодные для многократного прогона
+SKIP_ENDPOINTS = {'static', 'assets.dist_file', 'auth.logout'}
+
+# Таблица для подстановки реальных id в параметры маршрутов
+ID_TABLES = {'student_id': 'students', 'course_id': 'courses', 'group_id': 'groups',
+             'lesson_id': 'lessons', 'project_id': 'projects'}
+
+
+def _sample_ids(db_path):
+    """id из середины таблиц: не первые строки, но и не пустые"""
+    conn = sqlite3.connect(db_path)
+    ids = {}
+    for arg, table in ID_TABLES.items():
+        row = conn.execute(f'SELECT id FROM {table} ORDER BY id LIMIT 1 OFFSET '
+                           f'(SELECT COUNT(*) / 2 FROM {table})').fetchone()
+        ids[arg] = row[0] if row else 1
+    conn.close()
+    return ids
+
+
+def route_urls(app, ids):
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in SKIP_ENDPOINTS or 'GET' not in rule.methods:
+            continue
+        urls.append(rule.build({arg: ids.get(arg, 1) for arg in rule.arguments}, append_unknown=False)[1])
+    urls += [url.format(**ids) for url in EXTRA_URLS]
+    return list(dict.fromkeys(urls))
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _summary(url, latencies, statuses, wall):
+    return {
+        'url': url,
+        'requests': len(latencies),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'rps': round(len(latencies) / wall, 1) if wall else None,
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+class TestClientDriver:
+    """Запросы через тестовый клиент Flask в текущем потоке"""
+
+    def __init__(self, app, username, password):
+        self.client = app.test_client()
+        self.client.post('/login', data={'username': username, 'password': password})
+
+    def get(self, url):
+        response = self.client.get(url)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class WSGIDriver:
+    """Запросы по HTTP к локальному многопоточному серверу Werkzeug"""
+
+    def __init__(self, app, username, password):
+        from werkzeug.serving import make_server
+        # Журнал каждого запроса сервера исказил бы замеры
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.cookies = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        opener.open(self.base + '/login',
+                    urllib.parse.urlencode({'username': username, 'password': password}).encode()).read()
+        self._local = threading.local()
+
+    def _opener(self):
+        # Свой opener на поток, общий набор cookie сессии
+        if not hasattr(self._local, 'opener'):
+            self._local.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        return self._local.opener
+
+    def get(self, url):
+        try:
+            with self._opener().open(self.base + urllib.parse.quote(url, safe='/?=&%')) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def run_benchmark(driver, urls, requests_per_url, warmup, concurrency):
+    results = []
+    for url in urls:
+        for _ in range(warmup):
+            driver.get(url)
+
+        latencies, statuses = [], []
+
+        def timed(_):
+            started = time.perf_counter()
+            status = driver.get(url)
+            return time.perf_counter() - started, status
+
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                measured = list(pool.map(timed, range(requests_per_url)))
+        else:
+            measured = [timed(i) for i in range(requests_per_url)]
+        wall = time.perf_counter() - started
+
+        for latency, status in measured:
+            latencies.append(latency)
+            statuses.append(status)
+        results.append(_summary(url, latencies, statuses, wall))
+    return results
+
+
+def compare(results, baseline, max_regression, min_delta_ms):
+    """Адреса, где p95 вырос больше допустимого относительно базовой линии"""
+    previous = {row['url']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row['url'])
+        if not old:
+            continue
+        # Мелкие абсолютные колебания быстрых страниц не считаем регрессией
+        if (row['p95_ms'] > old['p95_ms'] * (1 + max_regression)
+                and row['p95_ms'] - old['p95_ms'] >= min_delta_ms):
+            regressions.append((row['url'], old['p95_ms'], row['p95_ms']))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    previous = {row['url']: row for row in (baseline or {}).get('results', [])}
+    print(f'{"адрес":<48} {"p50":>8} {"p95":>8} {"p99":>8} {"req/s":>8} {"Δp95":>8}  статусы')
+    for row in results:
+        old = previous.get(row['url'])
+        delta = f'{(row["p95_ms"] / old["p95_ms"] - 1) * 100:+.0f}%' if old and old['p95_ms'] else ''
+        statuses = ', '.join(f'{code}×{count}' for code, count in row['statuses'].items())
+        print(f'{row["url"][:48]:<48} {row["p50_ms"]:8.2f} {row["p95_ms"]:8.2f} {row["p99_ms"]:8.2f} '
+              f'{row["rps"] or 0:8.1f} {delta:>8}  {statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='готовая база (по умолчанию - временная, заполненная generate_data.py)')
+    parser.add_argument('--scale', choices=SCALES, default='small', help='масштаб generate_data.py для временной базы')
+    parser.add_argument('--requests', type=int, default=50, help='запросов на адрес')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--wsgi', action='store_true', help='через локальный WSGI-сервер, а не тестовый клиент')
+    parser.add_argument('--concurrency', type=int, default=1, help='параллельных клиентов (только с --wsgi)')
+    parser.add_argument('--page-cache', action='store_true', help='не отключать кэш страниц')
+    parser.add_argument('--only', help='подстрока адреса: прогнать только подходящие')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='допустимый рост p95 (доля)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='минимальный рост p95 для регрессии, мс')
+    args = parser.parse_args()
+
+    workdir = None
+    db_path = args.db
+    if not db_path:
+        workdir = tempfile.mkdtemp(prefix='benchmark_')
+        db_path = os.path.join(workdir, 'school_robotics.db')
+        generate(db_path, log=lambda message: None, **SCALES[args.scale])
+
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ.setdefault('DASHBOARD_RECONCILE_INTERVAL', '0')
+    driver = None
+    try:
+        from config import Config
+        Config.DATABASE_PATH = db_path
+        from app import create_app
+        app = create_app()
+        app.config['PAGE_CACHE_ENABLED'] = args.page_cache
+
+        urls = route_urls(app, _sample_ids(db_path))
+        if args.only:
+            urls = [url for url in urls if args.only in url]
+
+        driver = (WSGIDriver if args.wsgi else TestClientDriver)(app, args.username, args.password)
+        concurrency = args.concurrency if args.wsgi else 1
+        results = run_benchmark(driver, urls, args.requests, args.warmup, concurrency)
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        print_results(results, baseline)
+
+        if args.save_baseline:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+            with open(args.save_baseline, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'scale': args.scale,
+                           'driver': 'wsgi' if args.wsgi else 'test_client', 'concurrency': concurrency,
+                           'results': results}, f, ensure_ascii=False, indent=2)
+            print(f'Базовая линия сохранена: {args.save_baseline}')
+
+        if baseline:
+            regressions = compare(results, baseline, args.max_regression, args.min_delta_ms)
+            for url, old, new in regressions:
+                print(f'❌ регрессия {url}: p95 {old:.2f} → {new:.2f} мс')
+            return 1 if regressions else 0
+        return 0
+    finally:
+        if driver is not None:
+            driver.close()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Замер времени запуска воркера: холодный и тёплый старт.
+
+Каждый запуск - отдельный процесс Python, который вызывает create_app()
+на временной базе. Первый запуск создаёт схему (холодный старт), остальные
+находят актуальную версию схемы и пропускают инициализацию (тёплый старт).
+Затем одновременно стартуют несколько воркеров на новой базе, чтобы
+проверить, что схему инициализирует только один из них.
+
+    python benchmark_startup.py [--warm-runs 5] [--workers 4]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_CHILD = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+timings = dict(app.config['STARTUP_TIMINGS'])
+timings['process_seconds'] = round(time.perf_counter() - started, 4)
+print('STARTUP ' + json.dumps(timings))
+'''
+
+
+def _spawn(db_path):
+    env = dict(os.environ, DATABASE_PATH=db_path, DASHBOARD_RECONCILE_INTERVAL='0')
+    return subprocess.Popen([sys.executable, '-c', _CHILD], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _result(process):
+    out, err = process.communicate()
+    for line in out.splitlines():
+        if line.startswith('STARTUP '):
+            return json.loads(line[len('STARTUP '):])
+    raise RuntimeError(f'Воркер не запустился:\n{err}')
+
+
+def _summary(label, runs):
+    totals = [run['process_seconds'] for run in runs]
+    db_init = [run['db_init_seconds'] for run in runs]
+    print(f'{label:<28} запусков: {len(runs):>2}  '
+          f'процесс: {statistics.median(totals) * 1000:8.1f} мс (медиана)  '
+          f'инициализация БД: {statistics.median(db_init) * 1000:8.1f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--warm-runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='startup_bench_')
+    try:
+        db_path = os.path.join(workdir, 'school_robotics.db')
+        cold = _result(_spawn(db_path))
+        warm = [_result(_spawn(db_path)) for _ in range(args.warm_runs)]
+
+        # Одновременный запуск воркеров на новой базе
+        parallel_db = os.path.join(workdir, 'parallel.db')
+        started = time.perf_counter()
+        processes = [_spawn(parallel_db) for _ in range(args.workers)]
+        parallel = [_result(process) for process in processes]
+        parallel_wall = time.perf_counter() - started
+
+        _summary('Холодный старт', [cold])
+        _summary('Тёплый старт', warm)
+        _summary(f'Параллельно, {args.workers} воркера', parallel)
+        modes = [run['db_init_mode'] for run in parallel]
+        print(f'  схему инициализировал {modes.count("cold")} из {len(modes)} воркеров, '
+              f'общее время {parallel_wall * 1000:.1f} мс')
+        return 0 if modes.count('cold') == 1 else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
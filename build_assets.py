@@ -0,0 +1,192 @@
+"""Сборка статических файлов: сторонние библиотеки локально, бандлы с хэшем.
+
+--fetch скачивает Bootstrap и bootstrap-icons (со шрифтами) в static/vendor,
+чтобы страницы открывались без доступа к CDN. Затем файлы из ASSET_BUNDLES
+(modules/assets.py) склеиваются, собственные style.css и main.js сжимаются,
+и в static/dist пишутся файлы вида app.<хэш>.css с вариантами .gz и .br
+(если установлен пакет brotli) и manifest.json, по которому asset_url()
+подставляет имена с хэшем.
+
+static/vendor и static/dist в репозиторий не входят: сборка - обязательный
+шаг развёртывания перед запуском gunicorn (с ASSETS_REQUIRED, который
+gunicorn.conf.py включает по умолчанию, приложение без manifest.json не
+стартует). Любая ошибка скачивания или сборки завершает скрипт с кодом 1.
+
+    python build_assets.py --fetch
+    python build_assets.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import urllib.request
+
+from modules.assets import ASSET_BUNDLES, DIST_DIR, MANIFEST_NAME, VENDOR_ASSETS
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+HASH_LENGTH = 12
+
+# Строки и комментарии CSS: строки сохраняются как есть, комментарии удаляются
+_CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_SOURCE_MAP_RE = re.compile(r'/\*# sourceMappingURL=.*?\*/|^//# sourceMappingURL=.*$', re.M)
+
+
+class BuildError(Exception):
+    """Сборка не выполнена: нет исходных файлов или они не скачались"""
+
+
+def fetch(static_dir, log=print):
+    for filename, url in VENDOR_ASSETS.items():
+        path = os.path.join(static_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+        except OSError as e:
+            raise BuildError(f'Не скачан {filename} ({url}): {e}')
+        if not data:
+            raise BuildError(f'Пустой ответ для {filename} ({url})')
+        # Файл пишется только целиком: оборванная загрузка не оставит половину
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+        log(f'{filename:<52} {len(data):>9} байт  <- {url}')
+
+
+def _squeeze_css(text):
+    # Пробелы вокруг ':' не трогаем: "a :hover" и "a:hover" - разные селекторы
+    return _CSS_PUNCT_RE.sub(r'\1', re.sub(r'\s+', ' ', text))
+
+
+def minify_css(text):
+    """Удаление комментариев и лишних пробелов; содержимое строк не меняется"""
+    parts, position = [], 0
+    for match in _CSS_TOKEN_RE.finditer(text):
+        parts.append(_squeeze_css(text[position:match.start()]))
+        if match.group(1):
+            parts.append(match.group(1))
+        position = match.end()
+    parts.append(_squeeze_css(text[position:]))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Осторожное сжатие JS без разбора: отступы, пустые строки и строки-комментарии"""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _hashed_name(name, data):
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return f'{stem}.{_digest(data)}{ext}'
+
+
+def _write(dist_dir, name, data, compress=True):
+    with open(os.path.join(dist_dir, name), 'wb') as f:
+        f.write(data)
+    if not compress:
+        return
+    # mtime=0: одинаковый вход даёт одинаковый .gz
+    with open(os.path.join(dist_dir, name + '.gz'), 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(os.path.join(dist_dir, name + '.br'), 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def _rewrite_css_urls(text, source, static_dir, dist_dir, copied):
+    """Файлы из url() (шрифты, картинки) копируются в dist с хэшем в имени"""
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^(data:|https?:|//|#)', url):
+            return match.group(0)
+        path = os.path.normpath(os.path.join(static_dir, os.path.dirname(source), re.split(r'[?#]', url)[0]))
+        if path not in copied:
+            if not os.path.isfile(path):
+                raise BuildError(f'{source} ссылается на отсутствующий файл {url}. '
+                                 'Скачайте его: python build_assets.py --fetch')
+            with open(path, 'rb') as f:
+                data = f.read()
+            copied[path] = _hashed_name(path, data)
+            # woff/woff2 уже сжаты - варианты .gz/.br не нужны
+            _write(dist_dir, copied[path], data, compress=not path.endswith(('.woff', '.woff2')))
+        return f'url("{copied[path]}")'
+
+    return _CSS_URL_RE.sub(replace, text)
+
+
+def build(static_dir, log=print):
+    """Сборка ASSET_BUNDLES в static_dir/dist; возвращает манифест"""
+    missing = [name for files in ASSET_BUNDLES.values() for name in files
+               if not os.path.exists(os.path.join(static_dir, name))]
+    if missing:
+        raise BuildError('Нет исходных файлов: ' + ', '.join(missing) + '. Скачайте их: python build_assets.py --fetch')
+
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    # Старые сборки удаляются целиком: в манифест попадут только новые имена
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    copied = {}
+    for bundle, sources in ASSET_BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+                text = f.read()
+            minified = '.min.' in source
+            # Без source map: ссылка на неё в сборке указывала бы в никуда
+            text = _SOURCE_MAP_RE.sub('', text)
+            if bundle.endswith('.css'):
+                text = _rewrite_css_urls(text, source, static_dir, dist_dir, copied)
+                text = text if minified else minify_css(text)
+            else:
+                text = text if minified else minify_js(text)
+            parts.append(text.strip())
+        # ';' между скриптами: файл без точки с запятой в конце не склеится со следующим
+        data = ('\n' if bundle.endswith('.css') else ';\n').join(parts).encode('utf-8')
+        name = _hashed_name(bundle, data)
+        _write(dist_dir, name, data)
+        manifest[bundle] = f'{DIST_DIR}/{name}'
+        log(f'{bundle:<16} -> {manifest[bundle]:<36} {len(data):>9} байт')
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fetch', action='store_true', help='скачать сторонние файлы в static/vendor')
+    parser.add_argument('--static', default=STATIC_DIR, help='папка static')
+    args = parser.parse_args()
+
+    try:
+        if args.fetch:
+            fetch(args.static)
+        build(args.static)
+    except BuildError as e:
+        print(f'❌ {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Проверка планов запросов blueprint'ов.
+
+Создаёт временную базу по схеме init_db.py, заполняет её данными, проходит
+по всем GET-маршрутам приложения через тестовый клиент Flask и для каждого
+выполненного SQL-запроса смотрит EXPLAIN QUERY PLAN. Если какой-либо запрос
+читает таблицу полным SCAN без индекса, скрипт завершается с кодом 1.
+
+    python check_query_plans.py
+"""
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+# Маленькие справочники, полный просмотр которых допустим
+SMALL_TABLES = {'levels', 'achievements', 'missions', 'table_versions', 'sqlite_master', 'sqlite_schema', 'sqlite_sequence'}
+
+# Дополнительные адреса с параметрами, которых нет в правилах маршрутов
+EXTRA_URLS = [
+    '/students?status=all',
+    '/students?status=inactive&limit=20',
+    '/journal?group_id=1',
+    '/journal/export?group_id=1&date_from=2024-01-01',
+    '/students/export?status=all',
+    '/students?q=Студент 12',
+    '/students?status=all&q=S000',
+    '/courses?q=курс',
+    '/groups?q=G01',
+    '/search?q=школа 3',
+]
+
+_ALIAS_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQL_KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'cross', 'group', 'order',
+                 'limit', 'using', 'natural', 'outer', 'union', 'set'}
+
+
+def seed_database(db_path, teachers=20, students=2000, groups=40, lessons_per_group=30, projects=1500):
+    """Заполнение базы данными, достаточными для реалистичных планов"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO users (username, password_hash, email, full_name, role) VALUES (?, ?, ?, ?, ?)',
+        [(f'teacher{i}', '-', f'teacher{i}@robotics-school.ru', f'Преподаватель {i}', 'teacher')
+         for i in range(teachers)]
+    )
+    conn.executemany(
+        'INSERT INTO courses (course_code, title, description, max_students) VALUES (?, ?, ?, ?)',
+        [(f'C{i:03d}', f'Курс {i}', 'Описание', 12) for i in range(20)]
+    )
+    conn.executemany(
+        'INSERT INTO groups (group_code, course_id, teacher_id, start_date, end_date, classroom, status) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(f'G{i:03d}', 1 + i % 20, 2 + i % teachers, '2024-09-01', '2025-05-31', f'Кабинет {i % 5}',
+          'active' if i % 4 else 'archived') for i in range(groups)]
+    )
+    conn.executemany(
+        'INSERT INTO students (student_code, full_name, school, status) VALUES (?, ?, ?, ?)',
+        [(f'S{i:05d}', f'Студент {i}', f'Школа {i % 12}', 'active' if i % 6 else 'inactive')
+         for i in range(students)]
+    )
+    conn.executemany(
+        'INSERT INTO student_groups (student_id, group_id, completion_status) VALUES (?, ?, ?)',
+        [(1 + i, 1 + i % groups, 'studying' if i % 3 else 'completed') for i in range(students)]
+    )
+    conn.executemany(
+        'INSERT INTO lessons (group_id, lesson_number, title, lesson_date, start_time) VALUES (?, ?, ?, ?, ?)',
+        [(1 + g, n + 1, f'Занятие {n + 1}', f'2024-{9 + n % 4:02d}-{1 + n % 28:02d}', '15:00')
+         for g in range(groups) for n in range(lessons_per_group)]
+    )
+    conn.executemany(
+        'INSERT INTO journal (lesson_id, student_id, grade, exp_earned) VALUES (?, ?, ?, ?)',
+        [(1 + (i % groups) * lessons_per_group + n, 1 + i, 5, 10)
+         for i in range(students) for n in range(0, lessons_per_group, 5)]
+    )
+    conn.executemany(
+        'INSERT INTO projects (student_id, group_id, title, project_type, rating) VALUES (?, ?, ?, ?, ?)',
+        [(1 + i % students, 1 + i % groups, f'Проект {i}', 'robot', i % 6 or None) for i in range(projects)]
+    )
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn, sql):
+    """Список полных просмотров таблиц в плане запроса"""
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+    aliases = table_aliases(sql)
+    # Просмотр материализованных CTE и подзапросов - не чтение таблицы
+    derived = {m.group(1) for row in plan
+               for m in [re.match(r'(?:MATERIALIZE|CO-ROUTINE) (\S+)', row[3])] if m}
+
+    problems = []
+    for row in plan:
+        detail = row[3]
+        match = re.match(r'SCAN (\S+)(.*)$', detail)
+        if not match:
+            continue
+        name, rest = match.groups()
+        if 'USING' in rest or 'VIRTUAL TABLE' in rest or name == 'CONSTANT':
+            continue
+        if name in derived or name.startswith('('):
+            continue
+        if aliases.get(name, name) in SMALL_TABLES:
+            continue
+        problems.append(detail)
+    return problems
+
+
+def collect_queries(app, urls):
+    from modules.db import add_connection_hook
+
+    statements = {}
+    current = {'url': None}
+
+    def trace(sql):
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        # Служебные запросы модулей виртуальных таблиц (FTS5) обращаются к 'main'.'...'
+        if "'main'." in sql:
+            return
+        if head in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+            statements.setdefault(sql, current['url'])
+
+    add_connection_hook(lambda conn: conn.set_trace_callback(trace))
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    for url in urls:
+        current['url'] = url
+        # Потоковые ответы (выгрузки) выполняют запросы при чтении тела
+        client.get(url).get_data()
+    return statements
+
+
+def route_urls(app):
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or 'GET' not in rule.methods or rule.endpoint == 'auth.logout':
+            continue
+        # Числовые параметры маршрутов подставляем как 1
+        urls.append(rule.build({arg: 1 for arg in rule.arguments}, append_unknown=False)[1])
+    return urls + EXTRA_URLS + keyset_urls()
+
+
+def keyset_urls():
+    # Страницы после курсора: условие keyset должно идти по индексу
+    from modules.pagination import encode_cursor
+    return [
+        '/students?limit=20&after=' + encode_cursor(['Студент 500', 501]),
+        '/students?status=all&limit=20&after=' + encode_cursor(['Студент 500', 501]),
+        '/lessons?limit=20&after=' + encode_cursor(['2024-10-15', '15:00', 300]),
+        '/projects?limit=20&after=' + encode_cursor([3, '2024-01-01 00:00:00', 700]),
+    ]
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='query_plans_')
+    db_path = os.path.join(workdir, 'school_robotics.db')
+    os.environ['DATABASE_PATH'] = db_path
+
+    try:
+        from config import Config
+        Config.DATABASE_PATH = db_path
+        from app import create_app
+        app = create_app()
+        app.config['TESTING'] = True
+        seed_database(db_path)
+
+        statements = collect_queries(app, route_urls(app))
+        conn = sqlite3.connect(db_path)
+        failed = 0
+        for sql, url in statements.items():
+            problems = full_scans(conn, sql)
+            if problems:
+                failed += 1
+                compact = ' '.join(sql.split())
+                print(f'❌ {url}: {compact[:200]}')
+                for detail in problems:
+                    print(f'      {detail}')
+        conn.close()
+
+        print(f'Проверено запросов: {len(statements)}, с полным SCAN: {failed}')
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,13 +7,130 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///school_robotics.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Настройки SQLite и пула соединений
+    DATABASE_PATH = os.environ.get('DATABASE_PATH') or 'instance/school_robotics.db'
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5.0))  # секунды ожидания свободного соединения
+    DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))
+    DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -8000))  # отрицательное значение - в КиБ
+    
+    # Бывшая база геймификации: источник для import_brainrot.py. С BRAINROT_ATTACH=1
+    # она подключается ко всем соединениям пула как схема brainrot (только чтение)
+    BRAINROT_DATABASE_PATH = os.environ.get('BRAINROT_DATABASE_PATH') or 'instance/brainrot.db'
+    DB_ATTACH = ({'brainrot': BRAINROT_DATABASE_PATH}
+                 if os.environ.get('BRAINROT_ATTACH', '').lower() in ('1', 'true', 'yes') else {})
+    
     # Настройки сессии
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
+    # Проверка паролей при входе: пул потоков, очередь ожидания и параметры хэша
+    # Новые хэши; более слабые хэши пересчитываются при входе, более сильные (scrypt) остаются
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:600000'
+    PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', 2))
+    PASSWORD_QUEUE_SIZE = int(os.environ.get('PASSWORD_QUEUE_SIZE', 16))  # сверх неё - 503
+    PASSWORD_VERIFY_TIMEOUT = 5.0  # секунды
+    
+    # Ограничение неудачных попыток входа за окно (секунды)
+    LOGIN_THROTTLE_WINDOW = 300
+    LOGIN_MAX_FAILURES_PER_USER = 5
+    LOGIN_MAX_FAILURES_PER_IP = 30
+    
+    # Число прокси перед приложением (nginx и т.п.), чьим заголовкам X-Forwarded-For /
+    # X-Forwarded-Proto можно доверять. Без этого за прокси у всех клиентов один IP,
+    # и ограничение попыток входа по IP блокирует всех сразу
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    PROXY_FIX_X_PROTO = int(os.environ.get('PROXY_FIX_X_PROTO', 0))
+    
     # Настройки загрузки файлов
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join('static', 'uploads')
     
+    # Срок кэширования собранных файлов static/dist (имя содержит хэш содержимого)
+    ASSET_MAX_AGE = 365 * 24 * 3600
+    # Без собранного static/dist/manifest.json приложение не запускается (gunicorn.conf.py
+    # включает это по умолчанию); иначе - исходные файлы, а сторонние без --fetch с CDN
+    ASSETS_REQUIRED = os.environ.get('ASSETS_REQUIRED', '').lower() in ('1', 'true', 'yes')
+    
+    # Постраничный вывод списков
+    PAGE_SIZE_DEFAULT = 50
+    PAGE_SIZE_MAX = 200
+    COUNT_CACHE_TTL = 60  # секунды жизни закэшированного COUNT(*)
+    
+    # Сверка счётчиков панели управления с таблицами (секунды, 0 - отключено)
+    DASHBOARD_RECONCILE_INTERVAL = int(os.environ.get('DASHBOARD_RECONCILE_INTERVAL', 600))
+    
+    # Как часто проверять изменения таблицы levels (секунды)
+    LEVELS_REFRESH_INTERVAL = 30
+    
+    # Каталог миссий (title, description, hint, level) и как часто проверять изменения файла (секунды)
+    MISSION_CATALOG_PATH = os.environ.get('MISSION_CATALOG_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'brainrots.json')
+    MISSION_CATALOG_CHECK_INTERVAL = 5
+    
+    # Кэш отрисованных страниц списков
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    PAGE_CACHE_TTL = 30  # секунды; ограничивает устаревание при записи из других процессов
+    
+    # Профили студентов: сколько держать в кэше процесса и сколько записей журнала показывать
+    PROFILE_CACHE_MAX_ENTRIES = 1000
+    PROFILE_JOURNAL_LIMIT = 50
+    
+    # Ведомости групп (студенты × занятия) в кэше процесса
+    GRADEBOOK_CACHE_MAX_ENTRIES = 200
+    
+    # Импорт студентов: строк в одном executemany
+    IMPORT_BATCH_SIZE = 500
+    # Выгрузки: строк за один fetchmany
+    EXPORT_CHUNK_ROWS = 500
+    
+    # Профилирование SQL (по умолчанию выключено): сводка по запросам и журнал медленных запросов
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+    SQL_N_PLUS_ONE_THRESHOLD = 10  # одинаковых запросов за один HTTP-запрос
+    SQL_SLOW_LOG_PATH = os.environ.get('SQL_SLOW_LOG_PATH') or 'instance/slow_queries.log'
+    SQL_SLOW_LOG_MAX_BYTES = 5 * 1024 * 1024
+    SQL_SLOW_LOG_BACKUPS = 3
+    
+    # Рейтинги: сколько последних записей журнала изменений опыта хранить
+    LEADERBOARD_CHANGES_KEEP = 100000
+    
+    # Проверка решений задач: тёплые процессы-песочницы и ограничения на одно решение
+    GRADING_ENABLED = os.environ.get('GRADING_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    GRADING_WORKERS = int(os.environ.get('GRADING_WORKERS', 2))
+    GRADING_BATCH_SIZE = 32
+    GRADING_POLL_INTERVAL = 2.0  # секунды между проверками очереди
+    GRADING_CPU_SECONDS = 2
+    GRADING_MEMORY_MB = 256
+    GRADING_WALL_SECONDS = 5
+    GRADING_WORKER_MAX_JOBS = 500  # решений до перезапуска процесса
+    GRADING_MAX_ATTEMPTS = 3  # попыток проверки, после которых решение получает status = 'failed'
+    GRADING_MAX_CODE_LENGTH = 20000
+    # Изоляция решений средствами ОС. Префикс команды внешней песочницы, в которой процесс
+    # проверки видит только интерпретатор и modules/grading_worker.py, без сети, например:
+    # bwrap --unshare-all --die-with-parent --new-session --clearenv --uid 65534 --gid 65534
+    #   --ro-bind /usr /usr --ro-bind /lib /lib --ro-bind /lib64 /lib64 --ro-bind <modules> <modules>
+    #   --proc /proc --dev /dev --tmpfs /tmp --chdir /tmp
+    # Без префикса приложение должно работать от root (Linux): процесс проверки сам
+    # изолирует каждое решение и запускает его от GRADING_SANDBOX_UID/GID. Иначе проверка отключена.
+    GRADING_SANDBOX_COMMAND = os.environ.get('GRADING_SANDBOX_COMMAND', '')
+    GRADING_SANDBOX_UID = int(os.environ.get('GRADING_SANDBOX_UID', 65534))
+    GRADING_SANDBOX_GID = int(os.environ.get('GRADING_SANDBOX_GID', 65534))
+    
+    # Фоновые задания (пересчёты, отчёты): потоки-исполнители и повторы с растущей паузой
+    JOBS_ENABLED = os.environ.get('JOBS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_POLL_INTERVAL = 2.0  # секунды между проверками очереди
+    JOBS_MAX_ATTEMPTS = 3
+    JOBS_RETRY_BACKOFF = 30  # секунды перед первым повтором, далее вдвое больше
+    JOBS_RETRY_BACKOFF_MAX = 3600
+    JOBS_STALE_SECONDS = 900  # задание в 'running' дольше - процесс упал, вернуть в очередь
+    JOBS_KEEP_DAYS = 7  # сколько хранить выполненные и неудачные задания
+    
+    # Длительность занятия, если в расписании группы не указано время окончания (минуты)
+    LESSON_DURATION_MINUTES = 90
+    
     # Другие настройки
     MAX_NAME_LENGTH = 100
     MAX_DESCRIPTION_LENGTH = 500
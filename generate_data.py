@@ -0,0 +1,242 @@
+"""Генератор синтетических данных для нагрузочных тестов.
+
+Заполняет базу по схеме init_db.py: преподаватели, курсы, группы, студенты,
+записи в группы, занятия, журнал, проекты. Строки отдаются генераторами
+и вставляются пачками executemany в одной транзакции. После загрузки
+опыт и уровни пересчитываются из журнала, счётчики достижений - через
+rebuild_all. Результат воспроизводим при одинаковом --seed.
+
+    python generate_data.py instance/bench.db --students 50000 --groups 2000 --journal 500000
+"""
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from init_db import init_database
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков', 'Соколов',
+              'Лебедев', 'Козлов', 'Новиков', 'Морозов', 'Ёлкин', 'Орлов', 'Павлов', 'Фёдоров']
+FIRST_NAMES = ['Александр', 'Михаил', 'Артём', 'Максим', 'Иван', 'Дмитрий', 'Лев', 'Матвей',
+               'София', 'Анна', 'Мария', 'Алиса', 'Ева', 'Полина', 'Варвара', 'Дарья']
+PROJECT_TYPES = ['robot', 'web', 'game', 'iot', 'team', 'innovative']
+TECHNOLOGIES = ['Lego Mindstorms', 'Arduino', 'Python', 'Scratch', 'Raspberry Pi', 'ESP32']
+
+# Масштабы по умолчанию для --scale
+SCALES = {
+    'small': {'students': 2000, 'groups': 80, 'journal': 20000, 'projects': 1000},
+    'medium': {'students': 10000, 'groups': 400, 'journal': 100000, 'projects': 5000},
+    'large': {'students': 50000, 'groups': 2000, 'journal': 500000, 'projects': 25000},
+}
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(conn, sql, rows, batch_size):
+    count = 0
+    for batch in _batches(rows, batch_size):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def _teachers(count):
+    for i in range(count):
+        yield (f'teacher{i:04d}', '-', f'teacher{i:04d}@robotics-school.ru',
+               f'{LAST_NAMES[i % len(LAST_NAMES)]} {FIRST_NAMES[i % len(FIRST_NAMES)]}', 'teacher')
+
+
+def _courses(count):
+    levels = ['beginner', 'intermediate', 'advanced']
+    for i in range(count):
+        yield (f'C{i:04d}', f'Курс робототехники {i}', 'Сгенерированный курс', levels[i % 3],
+               12 + i % 24, 12 + i % 6)
+
+
+def _groups(rnd, count, courses, first_teacher_id, teachers, term_start):
+    for i in range(count):
+        start = term_start + timedelta(days=7 * (i % 8))
+        yield (f'G{i:05d}', 1 + i % courses, first_teacher_id + i % teachers,
+               'Пн, Ср 15:00', start.isoformat(), (start + timedelta(weeks=30)).isoformat(),
+               f'Кабинет {1 + i % 20}', 'active' if rnd.random() < 0.85 else 'completed')
+
+
+def _students(rnd, count):
+    for i in range(count):
+        birth = date(2008, 1, 1) + timedelta(days=rnd.randrange(3650))
+        yield (f'S{i:06d}', f'{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)} {i}', birth.isoformat(),
+               f'Родитель {i}', f'+7900{i:07d}', f'parent{i}@example.ru',
+               str(1 + i % 11), f'Школа №{1 + i % 300}',
+               'active' if rnd.random() < 0.9 else 'inactive')
+
+
+def _enrollments(rnd, students, groups):
+    """Каждый студент - в одной группе, треть студентов - ещё в одной"""
+    for student_id in range(1, students + 1):
+        first = 1 + (student_id - 1) % groups
+        yield (student_id, first, 'studying' if rnd.random() < 0.9 else 'completed')
+        if groups > 1 and student_id % 3 == 0:
+            second = 1 + (first + rnd.randrange(1, groups)) % groups
+            if second != first:
+                yield (student_id, second, 'studying')
+
+
+def _lessons(groups, per_group, term_start):
+    for group_id in range(1, groups + 1):
+        start = term_start + timedelta(days=7 * ((group_id - 1) % 8))
+        for number in range(1, per_group + 1):
+            lesson_date = start + timedelta(days=7 * ((number - 1) // 2) + 2 * ((number - 1) % 2))
+            yield (group_id, number, f'Занятие {number}', lesson_date.isoformat(),
+                   f'{15 + group_id % 4}:00', f'{16 + group_id % 4}:30', f'Тема {number}',
+                   'completed' if lesson_date <= date.today() else 'planned')
+
+
+def _journal(rnd, conn, per_group, target):
+    """Оценки по прошедшим занятиям групп, пока не набрано target строк"""
+    enrollments = conn.execute('SELECT COUNT(*) FROM student_groups').fetchone()[0]
+    graded = min(per_group, max(1, math.ceil(target / max(enrollments, 1))))
+    members = {}
+    for student_id, group_id in conn.execute('SELECT student_id, group_id FROM student_groups ORDER BY group_id'):
+        members.setdefault(group_id, []).append(student_id)
+
+    produced = 0
+    for group_id, student_ids in members.items():
+        first_lesson = (group_id - 1) * per_group + 1
+        for lesson_id in range(first_lesson, first_lesson + graded):
+            for student_id in student_ids:
+                if produced >= target:
+                    return
+                grade = rnd.choices([None, 3, 4, 5], weights=[1, 2, 4, 6])[0]
+                yield (lesson_id, student_id, grade,
+                       rnd.choice(['excellent', 'good', 'good', 'satisfactory']),
+                       'absent' if grade is None else rnd.choice(['active', 'active', 'passive']),
+                       0 if grade is None else 10 * grade)
+                produced += 1
+
+
+def _projects(rnd, count, students, groups):
+    for i in range(count):
+        student_id = 1 + rnd.randrange(students)
+        yield (student_id, 1 + (student_id - 1) % groups, f'Проект {i}', 'Сгенерированный проект',
+               rnd.choice(PROJECT_TYPES), rnd.choice(TECHNOLOGIES), f'https://github.com/example/project-{i}',
+               rnd.choice(['completed', 'completed', 'in_progress']), rnd.choice([None, 3, 4, 5, 5]),
+               rnd.random() < 0.05)
+
+
+def generate(db_path, students, groups, journal, projects, teachers=None, courses=None,
+             lessons_per_group=24, batch_size=5000, seed=1, achievements=True, log=print):
+    """Заполнение базы db_path; возвращает число вставленных строк по таблицам"""
+    rnd = random.Random(seed)
+    teachers = teachers or max(5, groups // 10)
+    courses = courses or max(5, min(200, groups // 10))
+    term_start = date.today() - timedelta(weeks=12)
+
+    init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    # Данные генерируются заново при сбое, поэтому синхронизация с диском не нужна
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -65536')
+
+    counts = {}
+    started = time.perf_counter()
+
+    def step(name, sql, rows):
+        step_started = time.perf_counter()
+        counts[name] = _insert(conn, sql, rows, batch_size)
+        log(f'{name:<16} {counts[name]:>9} строк  {time.perf_counter() - step_started:7.2f} с')
+
+    try:
+        conn.execute('BEGIN')
+        first_teacher_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+        step('users', 'INSERT INTO users (username, password_hash, email, full_name, role) VALUES (?, ?, ?, ?, ?)',
+             _teachers(teachers))
+        step('courses', 'INSERT INTO courses (course_code, title, description, difficulty_level, duration_weeks, '
+                        'max_students) VALUES (?, ?, ?, ?, ?, ?)', _courses(courses))
+        step('groups', 'INSERT INTO groups (group_code, course_id, teacher_id, schedule, start_date, end_date, '
+                       'classroom, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+             _groups(rnd, groups, courses, first_teacher_id, teachers, term_start))
+        step('students', 'INSERT INTO students (student_code, full_name, birth_date, parent_name, parent_phone, '
+                         'parent_email, grade, school, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             _students(rnd, students))
+        step('student_groups', 'INSERT OR IGNORE INTO student_groups (student_id, group_id, completion_status) '
+                               'VALUES (?, ?, ?)', _enrollments(rnd, students, groups))
+        step('lessons', 'INSERT INTO lessons (group_id, lesson_number, title, lesson_date, start_time, end_time, '
+                        'topic, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+             _lessons(groups, lessons_per_group, term_start))
+        step('journal', 'INSERT INTO journal (lesson_id, student_id, grade, behavior, participation, exp_earned) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', _journal(rnd, conn, lessons_per_group, journal))
+        step('projects', 'INSERT INTO projects (student_id, group_id, title, description, project_type, '
+                         'technologies, github_url, status, rating, featured) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             _projects(rnd, projects, students, groups))
+
+        # Опыт из журнала: так же, как его накапливает сохранение оценок
+        conn.execute('''
+            UPDATE student_groups SET current_exp = totals.exp
+            FROM (SELECT j.student_id, l.group_id, SUM(j.exp_earned) AS exp
+                  FROM journal j JOIN lessons l ON l.id = j.lesson_id
+                  GROUP BY j.student_id, l.group_id) AS totals
+            WHERE student_groups.student_id = totals.student_id AND student_groups.group_id = totals.group_id
+        ''')
+        conn.execute('''
+            UPDATE students SET total_exp = totals.exp
+            FROM (SELECT student_id, SUM(current_exp) AS exp FROM student_groups GROUP BY student_id) AS totals
+            WHERE students.id = totals.student_id
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    from modules.levels import recalculate_levels
+    recalculate_levels(conn)
+    if achievements:
+        from modules.achievement_engine import rebuild_all
+        result = rebuild_all(conn)
+        log(f'{"achievements":<16} {result["awarded"]:>9} наград  {result["seconds"]:7.2f} с')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+    log(f'Готово за {time.perf_counter() - started:.1f} с')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('db_path')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--students', type=int)
+    parser.add_argument('--groups', type=int)
+    parser.add_argument('--journal', type=int)
+    parser.add_argument('--projects', type=int)
+    parser.add_argument('--lessons-per-group', type=int, default=24)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-achievements', action='store_true', help='не пересчитывать достижения')
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    generate(args.db_path, lessons_per_group=args.lessons_per_group, batch_size=args.batch_size,
+             seed=args.seed, achievements=not args.no_achievements, **sizes)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# Настройки gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Без собранных статических файлов (python build_assets.py --fetch) приложение
+# не запустится, а не станет молча грузить Bootstrap с CDN
+os.environ.setdefault('ASSETS_REQUIRED', '1')
+
+# Процессы и потоки: SQLite в режиме WAL допускает параллельное чтение,
+# запись сериализуется busy_timeout'ом пула соединений
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Приложение создаётся один раз в мастере до fork: схема проверяется
+# однократно, воркеры получают готовое приложение. Пул соединений сам
+# сбрасывается после fork. Фоновые потоки запускаются при первом запросе,
+# а не в мастере: исполнители заданий и проверка решений - в каждом
+# воркере, сверка счётчиков панели управления - в одном из них.
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.environ.get('MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    worker.log.info('Воркер %s готов к работе', worker.pid)
@@ -0,0 +1,86 @@
+"""Перенос instance/brainrot.db в общую базу school_robotics.db.
+
+Применяет миграции общей базы (таблицы missions, student_missions,
+challenges, challenge_submissions, brainrot_id_map), подключает
+brainrot.db через ATTACH и переносит её данные запросами INSERT ... SELECT
+(modules/brainrot_import.py). Повторный запуск переносит только новые строки.
+
+Затем сверяет перенос запросом по обеим базам и проверяет, что он
+выполняется одной SQL-командой, а не отдельными запросами к каждой базе.
+Код выхода 1 - не все строки источника сопоставлены.
+
+    python import_brainrot.py [--db instance/school_robotics.db] [--source instance/brainrot.db]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from config import Config
+from init_db import ensure_database
+from modules.brainrot_import import BrainrotImportError, import_brainrot, mapping_report
+from modules.db import attach_database
+
+
+def check_single_statement(conn, source_path):
+    """Сверка переноса; возвращает (строки отчёта, число выполненных SQL-команд)"""
+    statements = []
+    attach_database(conn, source_path, 'brainrot')
+    conn.set_trace_callback(statements.append)
+    try:
+        report = mapping_report(conn)
+    finally:
+        conn.set_trace_callback(None)
+        conn.execute('DETACH DATABASE brainrot')
+    return report, len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=Config.DATABASE_PATH)
+    parser.add_argument('--source', default=Config.BRAINROT_DATABASE_PATH)
+    parser.add_argument('--check-only', action='store_true', help='только сверка, без переноса')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f'Нет исходной базы: {args.source}')
+        return 1
+
+    ensure_database(args.db)
+    conn = sqlite3.connect(args.db, uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not args.check_only:
+            try:
+                result = import_brainrot(conn, args.source)
+            except BrainrotImportError as e:
+                print(f'❌ Перенос не выполнен: {e}')
+                return 1
+            warnings = result.pop('warnings')
+            print('Перенесено: ' + ', '.join(f'{name} {value}' for name, value in result.items()))
+            for warning in warnings:
+                print(f'⚠️  {warning}')
+
+        report, statements = check_single_statement(conn, args.source)
+    finally:
+        conn.close()
+
+    print(f'{"сущность":<12} {"в источнике":>12} {"сопоставлено":>13}')
+    for row in report:
+        print(f'{row["entity"]:<12} {row["source_rows"]:>12} {row["mapped_rows"]:>13}')
+
+    ok = True
+    if statements != 1:
+        print(f'❌ Сверка выполнена {statements} SQL-командами вместо одной')
+        ok = False
+    missing = [row['entity'] for row in report if row['mapped_rows'] != row['source_rows']]
+    if missing:
+        print('❌ Не сопоставлены строки: ' + ', '.join(missing))
+        ok = False
+    if ok:
+        print('✅ Все строки сопоставлены, сверка по двум базам - одна SQL-команда')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
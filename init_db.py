@@ -1,13 +1,519 @@
 import sqlite3
 import os
+import time
+from contextlib import contextmanager
 from werkzeug.security import generate_password_hash
 
-def init_database():
-    """Инициализация базы данных"""
-    db_path = 'instance/school_robotics.db'
+# Полнотекстовый поиск: таблица -> индексируемые столбцы
+FTS_TABLES = {
+    'students': ('full_name', 'student_code', 'school', 'parent_name'),
+    'courses': ('title', 'description'),
+    'groups': ('group_code',),
+}
+
+def _fts_normalize(expr):
+    # Ё и е при поиске не различаются: в индекс попадает текст с заменой ё -> е
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+def fts_statements(table, columns):
+    """FTS5-таблица без хранения текста и триггеры синхронизации с основной таблицей"""
+    fts = f'{table}_fts'
+    column_list = ', '.join(columns)
+    new_values = ', '.join(_fts_normalize(f'new.{column}') for column in columns)
+    old_values = ', '.join(_fts_normalize(f'old.{column}') for column in columns)
+    
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column_list}, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END""",
+        f"""INSERT INTO {fts} (rowid, {column_list})
+            SELECT id, {', '.join(_fts_normalize(column) for column in columns)} FROM {table}""",
+    ]
+
+# Счётчики панели управления: имя -> (таблица, столбец, значение)
+DASHBOARD_COUNTERS = {
+    'active_students': ('students', 'status', 'active'),
+    'active_courses': ('courses', 'status', 'active'),
+    'active_groups': ('groups', 'status', 'active'),
+    'teachers_count': ('users', 'role', 'teacher'),
+}
+
+def _counter_delta(name, delta):
+    return (f"UPDATE dashboard_stats SET value = value + ({delta}), updated_at = CURRENT_TIMESTAMP "
+            f"WHERE name = '{name}';")
+
+def _lessons_on_delta(date_expr, delta):
+    # Занятия считаются по датам: строка lessons_on:<дата> на каждую дату
+    return (f"INSERT INTO dashboard_stats (name, value, updated_at) "
+            f"VALUES ('lessons_on:' || {date_expr}, {delta}, CURRENT_TIMESTAMP) "
+            f"ON CONFLICT(name) DO UPDATE SET value = value + ({delta}), updated_at = CURRENT_TIMESTAMP;")
+
+def dashboard_stats_statements():
+    """Таблица dashboard_stats, триггеры её поддержки и начальное заполнение"""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS dashboard_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reconciled_at TIMESTAMP,
+            drift INTEGER DEFAULT 0
+        )
+    ''']
+    
+    for name, (table, column, value) in DASHBOARD_COUNTERS.items():
+        is_new = f"(new.{column} IS '{value}')"
+        is_old = f"(old.{column} IS '{value}')"
+        statements += [
+            f'''CREATE TRIGGER IF NOT EXISTS stats_{name}_ai AFTER INSERT ON {table}
+                WHEN {is_new} BEGIN {_counter_delta(name, 1)} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS stats_{name}_ad AFTER DELETE ON {table}
+                WHEN {is_old} BEGIN {_counter_delta(name, -1)} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS stats_{name}_au AFTER UPDATE OF {column} ON {table}
+                WHEN {is_new} != {is_old} BEGIN {_counter_delta(name, f'{is_new} - {is_old}')} END''',
+            f'''INSERT OR REPLACE INTO dashboard_stats (name, value, updated_at, reconciled_at)
+                VALUES ('{name}', (SELECT COUNT(*) FROM {table} WHERE {column} = '{value}'),
+                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)''',
+        ]
     
+    statements += [
+        f'''CREATE TRIGGER IF NOT EXISTS stats_lessons_ai AFTER INSERT ON lessons
+            BEGIN {_lessons_on_delta('new.lesson_date', 1)} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_lessons_ad AFTER DELETE ON lessons
+            BEGIN {_lessons_on_delta('old.lesson_date', -1)} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_lessons_au AFTER UPDATE OF lesson_date ON lessons
+            WHEN new.lesson_date IS NOT old.lesson_date
+            BEGIN {_lessons_on_delta('old.lesson_date', -1)} {_lessons_on_delta('new.lesson_date', 1)} END''',
+        '''INSERT OR REPLACE INTO dashboard_stats (name, value, updated_at, reconciled_at)
+            SELECT 'lessons_on:' || lesson_date, COUNT(*), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            FROM lessons GROUP BY lesson_date''',
+    ]
+    return statements
+
+def table_version_statements(tables):
+    """Счётчик версий таблиц: любое изменение таблицы увеличивает её version"""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''']
+    bump = ("INSERT INTO table_versions (name, version) VALUES ('{table}', 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1;")
+    for table in tables:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(
+                f'''CREATE TRIGGER IF NOT EXISTS version_{table}_{event.lower()} AFTER {event} ON {table}
+                    BEGIN {bump.format(table=table)} END'''
+            )
+        statements.append(f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 1)")
+    return statements
+
+def leaderboard_change_statements():
+    """Журнал изменений опыта для рейтингов: триггеры пишут id студента"""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS leaderboard_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL
+        )
+    ''']
+    log = 'INSERT INTO leaderboard_changes (student_id) VALUES ({row}.{column});'
+    sources = {
+        'students': ('id', 'total_exp, school, status'),
+        'student_groups': ('student_id', 'current_exp, group_id, completion_status'),
+    }
+    for table, (column, watched) in sources.items():
+        statements += [
+            f'''CREATE TRIGGER IF NOT EXISTS leaderboard_{table}_ai AFTER INSERT ON {table}
+                BEGIN {log.format(row='new', column=column)} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS leaderboard_{table}_ad AFTER DELETE ON {table}
+                BEGIN {log.format(row='old', column=column)} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS leaderboard_{table}_au AFTER UPDATE OF {watched} ON {table}
+                WHEN {' OR '.join(f'new.{name} IS NOT old.{name}' for name in watched.split(', '))}
+                BEGIN {log.format(row='new', column=column)} END''',
+        ]
+    return statements
+
+def student_profile_version_statements():
+    """Версии профилей студентов: любое изменение строк студента увеличивает его version"""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS student_profile_versions (
+            student_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''']
+    bump = ('INSERT INTO student_profile_versions (student_id, version) SELECT {row}.{column}, 1 {where}'
+            'ON CONFLICT(student_id) DO UPDATE SET version = version + 1;')
+    sources = {'students': 'id', 'student_groups': 'student_id', 'journal': 'student_id',
+               'projects': 'student_id', 'student_achievements': 'student_id'}
+    for table, column in sources.items():
+        old = bump.format(row='old', column=column, where='WHERE true ')
+        # Строка, перенесённая к другому студенту, меняет оба профиля
+        moved = bump.format(row='new', column=column, where=f'WHERE new.{column} IS NOT old.{column} ')
+        statements += [
+            f'''CREATE TRIGGER IF NOT EXISTS profile_{table}_ai AFTER INSERT ON {table}
+                BEGIN {bump.format(row='new', column=column, where='WHERE true ')} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS profile_{table}_ad AFTER DELETE ON {table}
+                BEGIN {old} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS profile_{table}_au AFTER UPDATE ON {table}
+                BEGIN {old} {moved} END''',
+        ]
+    return statements
+
+def gradebook_version_statements():
+    """Версии журналов групп: изменения оценок, занятий и состава группы увеличивают version"""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS gradebook_versions (
+            group_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''']
+    bump = ('INSERT INTO gradebook_versions (group_id, version) {select} '
+            'ON CONFLICT(group_id) DO UPDATE SET version = version + 1;')
+    by_lesson = 'SELECT group_id, 1 FROM lessons WHERE id = {row}.lesson_id'
+    by_group = 'SELECT {row}.group_id, 1 WHERE true'
+    for table, source in (('journal', by_lesson), ('lessons', by_group), ('student_groups', by_group)):
+        new = bump.format(select=source.format(row='new'))
+        old = bump.format(select=source.format(row='old'))
+        statements += [
+            f'''CREATE TRIGGER IF NOT EXISTS gradebook_{table}_ai AFTER INSERT ON {table}
+                BEGIN {new} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS gradebook_{table}_ad AFTER DELETE ON {table}
+                BEGIN {old} END''',
+            f'''CREATE TRIGGER IF NOT EXISTS gradebook_{table}_au AFTER UPDATE ON {table}
+                BEGIN {old} {new} END''',
+        ]
+    # Имя и код студента показываются в журналах всех его групп
+    statements.append(f'''CREATE TRIGGER IF NOT EXISTS gradebook_students_au AFTER UPDATE OF full_name, student_code ON students
+        BEGIN {bump.format(select='SELECT group_id, 1 FROM student_groups WHERE student_id = new.id')} END''')
+    return statements
+
+def waitlist_promotion_statements(group_filter):
+    """Перевод студентов из листа ожидания на свободные места групп, выбранных group_filter.
+
+    group_filter - условие на w.group_id. Места - courses.max_students минус
+    студенты со статусом 'studying' (NULL - без ограничения). Очередь - по id
+    листа ожидания. Ранее выбывший студент возвращается в группу обновлением строки.
+    """
+    return [
+        f'''INSERT INTO student_groups (student_id, group_id, completion_status)
+            SELECT w.student_id, w.group_id, 'studying'
+            FROM (SELECT student_id, group_id,
+                         ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY id) AS queue_position
+                  FROM group_waitlist w
+                  WHERE {group_filter}) w
+            JOIN groups g ON g.id = w.group_id
+            JOIN courses c ON c.id = g.course_id
+            WHERE c.max_students IS NULL
+               OR w.queue_position <= c.max_students - (
+                   SELECT COUNT(*) FROM student_groups sg
+                   WHERE sg.group_id = w.group_id AND sg.completion_status = 'studying')
+            ON CONFLICT(student_id, group_id) DO UPDATE SET
+                completion_status = 'studying', enrolled_date = CURRENT_DATE;''',
+        f'''DELETE FROM group_waitlist
+            WHERE id IN (SELECT w.id FROM group_waitlist w
+                         JOIN student_groups sg ON sg.student_id = w.student_id AND sg.group_id = w.group_id
+                         WHERE {group_filter} AND sg.completion_status = 'studying');''',
+    ]
+
+def enrollment_statements():
+    """Лист ожидания групп и его автоматическое продвижение при освобождении мест"""
+    statements = [
+        '''CREATE TABLE IF NOT EXISTS group_waitlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            requested_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (group_id) REFERENCES groups (id),
+            FOREIGN KEY (student_id) REFERENCES students (id),
+            UNIQUE(group_id, student_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_group_waitlist_queue ON group_waitlist (group_id, id)',
+    ]
+    triggers = {
+        # Студент закончил обучение или выбыл
+        'waitlist_student_groups_au': (
+            "AFTER UPDATE OF completion_status ON student_groups "
+            "WHEN old.completion_status = 'studying' AND new.completion_status IS NOT 'studying'",
+            'w.group_id = old.group_id'),
+        'waitlist_student_groups_ad': (
+            "AFTER DELETE ON student_groups WHEN old.completion_status = 'studying'",
+            'w.group_id = old.group_id'),
+        # Вместимость курса изменилась - пересчёт мест во всех его группах
+        'waitlist_courses_au': (
+            'AFTER UPDATE OF max_students ON courses WHEN new.max_students IS NOT old.max_students',
+            'w.group_id IN (SELECT id FROM groups WHERE course_id = new.id)'),
+    }
+    for name, (event, group_filter) in triggers.items():
+        statements.append(f'''CREATE TRIGGER IF NOT EXISTS {name} {event}
+            BEGIN {' '.join(waitlist_promotion_statements(group_filter))} END''')
+    return statements
+
+def gamification_statements():
+    """Таблицы геймификации в общей схеме: миссии, прогресс, задачи и решения"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS missions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            hint TEXT,
+            difficulty TEXT,
+            category TEXT,
+            exp_reward INTEGER DEFAULT 0,
+            level INTEGER UNIQUE NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS student_missions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            mission_id INTEGER NOT NULL,
+            completed INTEGER DEFAULT 0,
+            completed_at TIMESTAMP,
+            score INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students (id),
+            FOREIGN KEY (mission_id) REFERENCES missions (id),
+            UNIQUE(student_id, mission_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_student_missions_mission ON student_missions (mission_id, completed)',
+        '''CREATE TABLE IF NOT EXISTS challenges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            difficulty TEXT,
+            category TEXT,
+            exp_reward INTEGER DEFAULT 0,
+            test_cases TEXT,
+            solution_template TEXT,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS challenge_submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            challenge_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            passed INTEGER DEFAULT 0,
+            score INTEGER,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students (id),
+            FOREIGN KEY (challenge_id) REFERENCES challenges (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_challenge_submissions_student ON challenge_submissions (student_id, challenge_id)',
+        'CREATE INDEX IF NOT EXISTS idx_challenge_submissions_challenge ON challenge_submissions (challenge_id, submitted_at)',
+        # Перенос данных: (сущность, id в исходной базе) -> id в этой базе
+        '''CREATE TABLE IF NOT EXISTS brainrot_id_map (
+            entity TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            PRIMARY KEY (entity, source_id)
+        ) WITHOUT ROWID''',
+    ]
+
+# Версионированные миграции схемы. Номер последней применённой хранится в
+# PRAGMA user_version, каждая миграция применяется ровно один раз.
+SCHEMA_MIGRATIONS = [
+    # 1: индексы под WHERE/JOIN/ORDER BY запросов из modules/*.py
+    (1, [
+        'CREATE INDEX IF NOT EXISTS idx_students_status_name ON students (status, full_name)',
+        'CREATE INDEX IF NOT EXISTS idx_students_full_name ON students (full_name)',
+        'CREATE INDEX IF NOT EXISTS idx_students_status_created ON students (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_courses_status_title ON courses (status, title)',
+        'CREATE INDEX IF NOT EXISTS idx_groups_course_status ON groups (course_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_groups_status_start ON groups (status, start_date)',
+        'CREATE INDEX IF NOT EXISTS idx_student_groups_group_status ON student_groups (group_id, completion_status)',
+        'CREATE INDEX IF NOT EXISTS idx_student_groups_student_status ON student_groups (student_id, completion_status)',
+        'CREATE INDEX IF NOT EXISTS idx_lessons_group_date ON lessons (group_id, lesson_date)',
+        'CREATE INDEX IF NOT EXISTS idx_lessons_date_start ON lessons (lesson_date, start_time)',
+        "CREATE INDEX IF NOT EXISTS idx_lessons_list_order ON lessons (lesson_date DESC, COALESCE(start_time, ''), id)",
+        'CREATE INDEX IF NOT EXISTS idx_journal_student ON journal (student_id, lesson_id)',
+        'CREATE INDEX IF NOT EXISTS idx_projects_student ON projects (student_id)',
+        'CREATE INDEX IF NOT EXISTS idx_projects_group ON projects (group_id)',
+        "CREATE INDEX IF NOT EXISTS idx_projects_list_order ON projects (COALESCE(rating, -1), COALESCE(created_at, ''), id)",
+        'CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)',
+        'CREATE INDEX IF NOT EXISTS idx_achievements_rarity_reward ON achievements (rarity, exp_reward DESC)',
+    ]),
+    # 2: полнотекстовый поиск по студентам, курсам и группам
+    (2, [statement for table, columns in FTS_TABLES.items()
+         for statement in fts_statements(table, columns)]),
+    # 3: счётчики панели управления, поддерживаемые триггерами
+    (3, dashboard_stats_statements()),
+    # 4: версия таблицы уровней для сброса кэша порогов опыта
+    (4, table_version_statements(['levels'])),
+    # 5: счётчики и серии студентов для выдачи достижений
+    (5, ['''
+        CREATE TABLE IF NOT EXISTS achievement_counters (
+            student_id INTEGER PRIMARY KEY,
+            projects_count INTEGER NOT NULL DEFAULT 0,
+            robot_projects INTEGER NOT NULL DEFAULT 0,
+            team_projects INTEGER NOT NULL DEFAULT 0,
+            innovative_projects INTEGER NOT NULL DEFAULT 0,
+            attendance_streak INTEGER NOT NULL DEFAULT 0,
+            best_attendance_streak INTEGER NOT NULL DEFAULT 0,
+            high_grades_streak INTEGER NOT NULL DEFAULT 0,
+            best_high_grades_streak INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        )
+    ''',
+        'CREATE INDEX IF NOT EXISTS idx_student_achievements_achievement ON student_achievements (achievement_id, student_id)',
+        'CREATE INDEX IF NOT EXISTS idx_achievements_criteria ON achievements (criteria_type, criteria_value)',
+        # Раньше достижения по умолчанию записывались со сдвигом столбцов
+        # (name = служебный ключ, criteria_value = тип критерия) - удаляем их
+        """DELETE FROM achievements
+           WHERE typeof(criteria_value) = 'text'
+             AND id NOT IN (SELECT achievement_id FROM student_achievements)""",
+    ]),
+    # 6: журнал изменений опыта для инкрементального обновления рейтингов
+    (6, leaderboard_change_statements()),
+    # 7: миссии и задачи по программированию (бывшая instance/brainrot.db)
+    # и соответствие id перенесённых из неё строк
+    (7, gamification_statements()),
+    # 8: очередь проверки решений задач (modules/grading.py)
+    (8, [
+        "ALTER TABLE challenge_submissions ADD COLUMN status TEXT NOT NULL DEFAULT 'queued'",
+        'ALTER TABLE challenge_submissions ADD COLUMN result TEXT',
+        'ALTER TABLE challenge_submissions ADD COLUMN started_at TIMESTAMP',
+        'ALTER TABLE challenge_submissions ADD COLUMN graded_at TIMESTAMP',
+        # Перенесённые из brainrot.db решения уже проверены
+        "UPDATE challenge_submissions SET status = 'graded'",
+        'CREATE INDEX IF NOT EXISTS idx_challenge_submissions_status ON challenge_submissions (status, id)',
+    ]),
+    # 9: версии профилей студентов и справочников, которые в них показываются
+    # (modules/student_profile.py)
+    (9, student_profile_version_statements() + table_version_statements(['groups', 'courses', 'achievements'])),
+    # 10: очередь фоновых заданий (modules/jobs.py)
+    (10, [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedup_key TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            result TEXT,
+            error TEXT
+        )''',
+        # Одинаковое задание ждёт в очереди не больше одного раза
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key) WHERE status = 'queued'",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (priority DESC, run_after, id) WHERE status = 'queued'",
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, finished_at)',
+    ]),
+    # 11: версии журналов групп для кэша ведомости (modules/gradebook.py)
+    (11, gradebook_version_statements()),
+    # 12: лист ожидания записи в группы (modules/enrollment.py)
+    (12, enrollment_statements()),
+    # 13: число попыток проверки решения (modules/grading.py)
+    (13, ['ALTER TABLE challenge_submissions ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0']),
+    # 14: неудачные попытки входа, общие для всех процессов (modules/passwords.py);
+    # failed_at - секунды time.time()
+    (14, [
+        '''CREATE TABLE IF NOT EXISTS login_failures (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            failed_at REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_login_failures_key ON login_failures (scope, key, failed_at)',
+        'CREATE INDEX IF NOT EXISTS idx_login_failures_time ON login_failures (failed_at)',
+    ]),
+]
+
+def apply_migrations(conn):
+    """Применение миграций схемы, которых ещё нет в базе"""
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    
+    for version, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+        current = version
+    
+    return current
+
+def schema_version():
+    """Версия схемы, которую создаёт этот код"""
+    return SCHEMA_MIGRATIONS[-1][0]
+
+@contextmanager
+def _file_lock(path):
+    # Межпроцессная блокировка: схему инициализирует только один процесс
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _current_version(db_path):
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+def ensure_database(db_path='instance/school_robotics.db'):
+    """Инициализация базы только при необходимости.
+
+    Если версия схемы в базе уже актуальна (тёплый старт), создание таблиц,
+    хэширование пароля администратора и начальные данные пропускаются.
+    Иначе инициализация выполняется под файловой блокировкой, чтобы при
+    запуске нескольких воркеров её выполнил один процесс.
+    Возвращает ('warm' | 'cold', время в секундах).
+    """
+    started = time.perf_counter()
+    if _current_version(db_path) >= schema_version():
+        return 'warm', time.perf_counter() - started
+    
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    with _file_lock(db_path + '.init.lock'):
+        # Пока ждали блокировку, базу мог инициализировать другой процесс
+        if _current_version(db_path) >= schema_version():
+            return 'warm', time.perf_counter() - started
+        init_database(db_path)
+    return 'cold', time.perf_counter() - started
+
+def init_database(db_path='instance/school_robotics.db'):
+    """Инициализация базы данных"""
     # Создаем папку instance если не существует
-    os.makedirs('instance', exist_ok=True)
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
     
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
@@ -223,7 +729,7 @@ def init_database():
                 INSERT OR IGNORE INTO achievements 
                 (name, description, icon, exp_reward, criteria_type, criteria_value, rarity)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', achievement[:7])  # Берем только 7 значений, так как rarity уже есть в таблице по умолчанию
+            ''', achievement[1:])  # Первое значение - служебный ключ, в таблице его нет
         
         # Добавляем уровни
         levels = [
@@ -245,6 +751,8 @@ def init_database():
                 VALUES (?, ?, ?)
             ''', level)
         
+        apply_migrations(conn)
+        
         conn.commit()
         print("✅ База данных успешно инициализирована!")
         
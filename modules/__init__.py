@@ -1,2 +1,2 @@
 # Инициализация модулей
-from . import auth, students, courses, groups, lessons, journal, projects, achievements
\ No newline at end of file
+from . import auth, students, courses, groups, lessons, journal, projects, achievements, search, leaderboard, challenges, missions, jobs, enrollment
\ No newline at end of file
@@ -0,0 +1,289 @@
+import json
+import threading
+import time
+
+from .levels import recalculate_levels
+
+# Признаки проектов для счётчиков (SQL по строке projects без псевдонима).
+# LIKE в SQLite не сравнивает кириллицу без учёта регистра, поэтому оба варианта.
+PROJECT_FLAGS = {
+    'robot_projects': "(project_type LIKE '%robot%' OR project_type LIKE '%робот%' OR project_type LIKE '%Робот%')",
+    'team_projects': "(project_type LIKE '%team%' OR project_type LIKE '%команд%' OR project_type LIKE '%Команд%')",
+    'innovative_projects': '(COALESCE(featured, 0) != 0)',
+}
+
+# Тип критерия -> столбец achievement_counters (для серий - лучшая серия)
+CRITERIA_COLUMNS = {
+    'projects_count': 'projects_count',
+    'robot_projects': 'robot_projects',
+    'team_projects': 'team_projects',
+    'innovative_projects': 'innovative_projects',
+    'attendance_streak': 'best_attendance_streak',
+    'high_grades_streak': 'best_high_grades_streak',
+}
+
+# Сколько раз повторять выдачу: награда опытом может поднять уровень,
+# а уровень сам является критерием
+MAX_AWARD_ROUNDS = 3
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _record_metric(criteria_type, seconds, evaluated, awarded):
+    with _metrics_lock:
+        item = _metrics.setdefault(criteria_type, {'runs': 0, 'evaluated': 0, 'awarded': 0, 'seconds': 0.0})
+        item['runs'] += 1
+        item['evaluated'] += evaluated
+        item['awarded'] += awarded
+        item['seconds'] += seconds
+
+
+def engine_metrics():
+    """Время и количество проверок/выдач по типам критериев"""
+    with _metrics_lock:
+        return {
+            criteria_type: {**item,
+                            'seconds': round(item['seconds'], 6),
+                            'avg_ms': round(item['seconds'] * 1000 / item['runs'], 3) if item['runs'] else 0.0}
+            for criteria_type, item in _metrics.items()
+        }
+
+
+def _streaks_sql(student_filter=''):
+    """Текущие и лучшие серии посещаемости и пятёрок по журналу (gaps and islands)"""
+    return f'''
+        WITH ordered AS (
+            SELECT j.student_id, j.grade,
+                   CASE WHEN j.participation IS NOT 'absent' THEN 1 ELSE 0 END AS attended,
+                   ROW_NUMBER() OVER (PARTITION BY j.student_id
+                                      ORDER BY l.lesson_date, l.start_time, j.lesson_id) AS rn
+            FROM journal j
+            JOIN lessons l ON l.id = j.lesson_id
+            {student_filter}
+        ),
+        att AS (
+            SELECT student_id, attended,
+                   SUM(1 - attended) OVER (PARTITION BY student_id ORDER BY rn) AS grp
+            FROM ordered
+        ),
+        att_runs AS (
+            SELECT student_id, grp, SUM(attended) AS run FROM att GROUP BY student_id, grp
+        ),
+        att_last AS (
+            SELECT student_id, MAX(run) AS best, MAX(grp) AS last_grp FROM att_runs GROUP BY student_id
+        ),
+        att_stats AS (
+            SELECT l.student_id, l.best, r.run AS current
+            FROM att_last l
+            JOIN att_runs r ON r.student_id = l.student_id AND r.grp = l.last_grp
+        ),
+        graded AS (
+            SELECT student_id, CASE WHEN grade = 5 THEN 1 ELSE 0 END AS high,
+                   SUM(CASE WHEN grade = 5 THEN 0 ELSE 1 END)
+                       OVER (PARTITION BY student_id ORDER BY rn) AS grp
+            FROM ordered
+            WHERE grade IS NOT NULL
+        ),
+        grade_runs AS (
+            SELECT student_id, grp, SUM(high) AS run FROM graded GROUP BY student_id, grp
+        ),
+        grade_last AS (
+            SELECT student_id, MAX(run) AS best, MAX(grp) AS last_grp FROM grade_runs GROUP BY student_id
+        ),
+        grade_stats AS (
+            SELECT l.student_id, l.best, r.run AS current
+            FROM grade_last l
+            JOIN grade_runs r ON r.student_id = l.student_id AND r.grp = l.last_grp
+        )
+        SELECT a.student_id,
+               a.current AS attendance_streak, a.best AS best_attendance_streak,
+               COALESCE(g.current, 0) AS high_grades_streak, COALESCE(g.best, 0) AS best_high_grades_streak
+        FROM att_stats a
+        LEFT JOIN grade_stats g ON g.student_id = a.student_id
+    '''
+
+
+def _award(conn, criteria_type, student_ids=None):
+    """Выдача достижений одного типа студентам, выполнившим критерий"""
+    started = time.perf_counter()
+    if criteria_type == 'level':
+        source = 'students c'
+        key = 'c.id'
+        value = 'c.level'
+    else:
+        source = 'achievement_counters c'
+        key = 'c.student_id'
+        value = f'c.{CRITERIA_COLUMNS[criteria_type]}'
+
+    params = [criteria_type]
+    student_filter = ''
+    if student_ids is not None:
+        student_filter = f'AND {key} IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(list(student_ids)))
+
+    awarded = conn.execute(f'''
+        INSERT INTO student_achievements (student_id, achievement_id)
+        SELECT {key}, a.id
+        FROM achievements a
+        JOIN {source} ON {value} >= a.criteria_value
+        WHERE a.criteria_type = ? {student_filter}
+          AND NOT EXISTS (SELECT 1 FROM student_achievements sa
+                          WHERE sa.student_id = {key} AND sa.achievement_id = a.id)
+        RETURNING student_id, achievement_id
+    ''', params).fetchall()
+
+    evaluated = len(student_ids) if student_ids is not None else None
+    _record_metric(criteria_type, time.perf_counter() - started, evaluated or 0, len(awarded))
+    return [(row['student_id'], row['achievement_id']) for row in awarded]
+
+
+def evaluate_students(conn, student_ids=None, criteria_types=None):
+    """Проверка критериев по накопленным счётчикам и выдача достижений.
+
+    Опыт за полученные достижения добавляется к students.total_exp, после
+    чего уровни пересчитываются. student_ids=None - все студенты.
+    """
+    if student_ids is not None:
+        student_ids = list(set(student_ids))
+        if not student_ids:
+            return []
+
+    types = list(criteria_types or CRITERIA_COLUMNS)
+    awarded = []
+    for _ in range(MAX_AWARD_ROUNDS):
+        new = []
+        for criteria_type in types:
+            if criteria_type in CRITERIA_COLUMNS:
+                new += _award(conn, criteria_type, student_ids)
+        new += _award(conn, 'level', student_ids)
+        if not new:
+            break
+        awarded += new
+
+        # Награды суммируются по студенту один раз, а не подзапросом на каждую строку
+        conn.execute('''
+            WITH rewards AS (
+                SELECT json_extract(pair.value, '$[0]') AS student_id, SUM(a.exp_reward) AS exp
+                FROM json_each(?) pair
+                JOIN achievements a ON a.id = json_extract(pair.value, '$[1]')
+                GROUP BY 1
+            )
+            UPDATE students
+            SET total_exp = COALESCE(total_exp, 0) + rewards.exp,
+                updated_at = CURRENT_TIMESTAMP
+            FROM rewards
+            WHERE students.id = rewards.student_id
+        ''', (json.dumps(new),))
+        conn.commit()
+        recalculate_levels(conn, {student_id for student_id, _ in new})
+        # Дальше проверяется только уровень - остальные счётчики не менялись
+        types = []
+
+    conn.commit()
+    return awarded
+
+
+def _backdated_students(conn, lesson_id, student_ids):
+    """Студенты, у которых в журнале есть занятие позже lesson_id (порядок как в _streaks_sql)"""
+    if not student_ids:
+        return set()
+    return {row[0] for row in conn.execute('''
+        SELECT DISTINCT j.student_id
+        FROM lessons cur
+        JOIN journal j ON j.student_id IN (SELECT value FROM json_each(?)) AND j.lesson_id != cur.id
+        JOIN lessons l ON l.id = j.lesson_id
+        WHERE cur.id = ?
+          AND (l.lesson_date, COALESCE(l.start_time, ''), l.id)
+              > (cur.lesson_date, COALESCE(cur.start_time, ''), cur.id)
+    ''', (json.dumps(list(student_ids)), lesson_id))}
+
+
+def record_journal(conn, result):
+    """Обновление серий после сохранения оценок занятия (save_lesson_grades).
+
+    Новые записи журнала продолжают или обрывают серии без чтения истории.
+    Для переоценённых записей и для занятий, которые у студента идут раньше
+    уже оценённых (оценки внесены задним числом), серии пересчитываются по
+    журналу этих студентов.
+    """
+    started = time.perf_counter()
+    new_entries = result.get('new_entries', [])
+    backdated = _backdated_students(conn, result['lesson_id'], [entry[0] for entry in new_entries])
+    rebuild = list(result.get('regraded', [])) + [entry[0] for entry in new_entries if entry[0] in backdated]
+    conn.executemany('''
+        INSERT INTO achievement_counters
+            (student_id, attendance_streak, best_attendance_streak, high_grades_streak, best_high_grades_streak)
+        VALUES (:student_id, :attended, :attended, :high, :high)
+        ON CONFLICT(student_id) DO UPDATE SET
+            attendance_streak = CASE WHEN :attended THEN attendance_streak + 1 ELSE 0 END,
+            best_attendance_streak = MAX(best_attendance_streak,
+                                         CASE WHEN :attended THEN attendance_streak + 1 ELSE 0 END),
+            high_grades_streak = CASE WHEN :graded IS NULL THEN high_grades_streak
+                                      WHEN :high THEN high_grades_streak + 1 ELSE 0 END,
+            best_high_grades_streak = MAX(best_high_grades_streak,
+                                          CASE WHEN :graded IS NULL THEN high_grades_streak
+                                               WHEN :high THEN high_grades_streak + 1 ELSE 0 END),
+            updated_at = CURRENT_TIMESTAMP
+    ''', [{'student_id': student_id,
+           'attended': int(participation != 'absent'),
+           'graded': grade,
+           'high': int(grade == 5)}
+          for student_id, grade, participation in new_entries if student_id not in backdated])
+
+    if rebuild:
+        rebuild_streaks(conn, rebuild)
+
+    conn.commit()
+    _record_metric('journal_counters', time.perf_counter() - started, len(new_entries), 0)
+
+    student_ids = [entry[0] for entry in new_entries] + list(result.get('regraded', []))
+    return evaluate_students(conn, student_ids, ['attendance_streak', 'high_grades_streak'])
+
+
+def rebuild_streaks(conn, student_ids):
+    """Пересчёт серий отдельных студентов по их журналу"""
+    conn.execute(f'''
+        INSERT INTO achievement_counters
+            (student_id, attendance_streak, best_attendance_streak, high_grades_streak, best_high_grades_streak)
+        {_streaks_sql('WHERE j.student_id IN (SELECT value FROM json_each(?))')}
+        ON CONFLICT(student_id) DO UPDATE SET
+            attendance_streak = excluded.attendance_streak,
+            best_attendance_streak = excluded.best_attendance_streak,
+            high_grades_streak = excluded.high_grades_streak,
+            best_high_grades_streak = excluded.best_high_grades_streak,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (json.dumps(list(student_ids)),))
+
+
+def rebuild_all(conn):
+    """Полный пересчёт счётчиков всех студентов одним проходом по journal и projects"""
+    started = time.perf_counter()
+    project_columns = ',\n'.join(f'SUM({sql}) AS {name}' for name, sql in PROJECT_FLAGS.items())
+
+    conn.execute('DELETE FROM achievement_counters')
+    conn.execute(f'''
+        INSERT INTO achievement_counters
+            (student_id, projects_count, robot_projects, team_projects, innovative_projects,
+             attendance_streak, best_attendance_streak, high_grades_streak, best_high_grades_streak)
+        WITH project_stats AS (
+            SELECT student_id, COUNT(*) AS projects_count, {project_columns}
+            FROM projects
+            GROUP BY student_id
+        ),
+        streaks AS ({_streaks_sql()})
+        SELECT s.id,
+               COALESCE(p.projects_count, 0), COALESCE(p.robot_projects, 0),
+               COALESCE(p.team_projects, 0), COALESCE(p.innovative_projects, 0),
+               COALESCE(st.attendance_streak, 0), COALESCE(st.best_attendance_streak, 0),
+               COALESCE(st.high_grades_streak, 0), COALESCE(st.best_high_grades_streak, 0)
+        FROM students s
+        LEFT JOIN project_stats p ON p.student_id = s.id
+        LEFT JOIN streaks st ON st.student_id = s.id
+    ''')
+    conn.commit()
+    counted = conn.execute('SELECT COUNT(*) FROM achievement_counters').fetchone()[0]
+    _record_metric('rebuild_counters', time.perf_counter() - started, counted, 0)
+
+    awarded = evaluate_students(conn)
+    return {'students': counted, 'awarded': len(awarded), 'seconds': round(time.perf_counter() - started, 3)}
@@ -1,18 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
-from contextlib import contextmanager
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from .db import get_db_connection
+from .achievement_engine import engine_metrics, rebuild_all
+from .page_cache import cached_page, bump
+from .jobs import job_handler, submit
 
 achievements_bp = Blueprint('achievements', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -25,6 +18,7 @@ def login_required(f):
 
 @achievements_bp.route('/achievements')
 @login_required
+@cached_page('achievements')
 def list_achievements():
     try:
         with get_db_connection() as conn:
@@ -34,4 +28,26 @@ def list_achievements():
         
     except Exception as e:
         flash('Ошибка загрузки достижений', 'error')
-        return render_template('achievements/list.html', achievements=[])
\ No newline at end of file
+        return render_template('achievements/list.html', achievements=[])
+
+@achievements_bp.route('/achievements/metrics')
+@login_required
+def achievement_metrics():
+    return jsonify(engine_metrics())
+
+@achievements_bp.route('/achievements/rebuild', methods=['POST'])
+@login_required
+def rebuild_achievements():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    # Полный пересчёт - фоновое задание; статус по /jobs/<id>
+    with get_db_connection() as conn:
+        job_id, created = submit(conn, 'rebuild_achievements', priority=10)
+    return jsonify({'job_id': job_id, 'created': created}), 202
+
+@job_handler('rebuild_achievements')
+def rebuild_achievements_job(conn, payload):
+    result = rebuild_all(conn)
+    bump('students', 'student_achievements')
+    return result
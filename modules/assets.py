@@ -0,0 +1,107 @@
+import json
+import mimetypes
+import os
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+assets_bp = Blueprint('assets', __name__)
+
+# Сборки: имя сборки -> исходные файлы в static/ в порядке подключения
+ASSET_BUNDLES = {
+    'css/app.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/bootstrap-icons/bootstrap-icons.css',
+        'css/style.css',
+    ],
+    'js/app.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+        'js/main.js',
+    ],
+}
+
+# Сторонние файлы, которые build_assets.py --fetch кладёт в static/vendor
+VENDOR_ASSETS = {
+    'vendor/bootstrap/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff',
+}
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Предсжатые варианты в порядке предпочтения: (Content-Encoding, расширение)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def load_manifest(static_folder):
+    """Соответствие исходных имён и имён с хэшем из static/dist/manifest.json"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _source_url(filename):
+    # Без сборки сторонние файлы берутся из static/vendor, а если их не скачивали - с CDN
+    if filename in VENDOR_ASSETS and not os.path.exists(os.path.join(current_app.static_folder, filename)):
+        return VENDOR_ASSETS[filename]
+    return url_for('static', filename=filename)
+
+
+def asset_url(filename):
+    """Аналог url_for('static', filename=...), отдающий имя с хэшем после сборки"""
+    hashed = current_app.extensions.get('asset_manifest', {}).get(filename)
+    if hashed:
+        return url_for('static', filename=hashed)
+    return _source_url(filename)
+
+
+def asset_urls(bundle):
+    """Адреса для подключения сборки: один файл с хэшем или исходные файлы по отдельности"""
+    if bundle in current_app.extensions.get('asset_manifest', {}):
+        return [asset_url(bundle)]
+    return [_source_url(filename) for filename in ASSET_BUNDLES.get(bundle, [bundle])]
+
+
+@assets_bp.route('/static/dist/<path:filename>')
+def dist_file(filename):
+    """Собранные файлы: имя содержит хэш, поэтому кэшируются навсегда"""
+    directory = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(tuple(ext for _, ext in ENCODINGS)):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    max_age = current_app.config.get('ASSET_MAX_AGE', 365 * 24 * 3600)
+    for encoding, ext in ENCODINGS:
+        if (encoding in request.accept_encodings
+                and os.path.isfile(os.path.join(directory, filename + ext))):
+            response = send_from_directory(directory, filename + ext, mimetype=mimetype, max_age=max_age)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age)
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """Манифест сборки и функции asset_url/asset_urls для шаблонов"""
+    manifest = load_manifest(app.static_folder)
+    missing = [bundle for bundle in ASSET_BUNDLES if bundle not in manifest]
+    if missing and app.config.get('ASSETS_REQUIRED'):
+        raise RuntimeError('Статические файлы не собраны (нет в static/dist/manifest.json: '
+                           + ', '.join(missing) + '). Выполните: python build_assets.py --fetch')
+    app.extensions['asset_manifest'] = manifest
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+    app.register_blueprint(assets_bp)
@@ -1,18 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import check_password_hash
-import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .passwords import VerifierBusy, get_throttle, get_verifier, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+def _update_password_hash(user_id, old_hash, new_hash):
+    """Замена устаревшего хэша, если пароль не сменили за время пересчёта"""
+    with get_db_connection() as conn:
+        conn.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                     (new_hash, user_id, old_hash))
+        conn.commit()
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -20,23 +17,40 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
+        throttle = get_throttle()
+        retry_after = throttle.retry_after(username, request.remote_addr)
+        if retry_after:
+            flash(f'Слишком много неудачных попыток входа. Повторите через {retry_after} с', 'error')
+            return render_template('auth/login.html'), 429, {'Retry-After': str(retry_after)}
+        
         try:
             with get_db_connection() as conn:
                 user = conn.execute(
                     'SELECT * FROM users WHERE username = ?', (username,)
                 ).fetchone()
+            
+            # Хэш проверяется в пуле потоков, соединение с базой к этому времени уже возвращено
+            verifier = get_verifier()
+            if password and verifier.verify(user['password_hash'] if user else None, password):
+                throttle.succeeded(username)
+                if needs_rehash(user['password_hash'], verifier.method):
+                    verifier.rehash_later(password, lambda new_hash: _update_password_hash(
+                        user['id'], user['password_hash'], new_hash))
+                
+                session['user_id'] = user['id']
+                session['username'] = user['username']
+                session['role'] = user['role']
+                session['full_name'] = user['full_name']
+                
+                flash(f'Добро пожаловать, {user["full_name"]}!', 'success')
+                return redirect(url_for('dashboard.dashboard'))
+            else:
+                throttle.failed(username, request.remote_addr)
+                flash('Неверное имя пользователя или пароль', 'error')
                 
-                if user and check_password_hash(user['password_hash'], password):
-                    session['user_id'] = user['id']
-                    session['username'] = user['username']
-                    session['role'] = user['role']
-                    session['full_name'] = user['full_name']
-                    
-                    flash(f'Добро пожаловать, {user["full_name"]}!', 'success')
-                    return redirect(url_for('dashboard.dashboard'))
-                else:
-                    flash('Неверное имя пользователя или пароль', 'error')
-                    
+        except VerifierBusy:
+            flash('Сервер перегружен, повторите вход через несколько секунд', 'error')
+            return render_template('auth/login.html'), 503, {'Retry-After': '2'}
         except Exception as e:
             flash('Ошибка входа в систему', 'error')
     
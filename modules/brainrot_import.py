@@ -0,0 +1,317 @@
+import json
+import time
+
+from .db import attach_database
+
+# Сущности бывшей базы brainrot.db в порядке переноса: (сущность, таблица-источник)
+ENTITIES = [
+    ('group', 'group'),
+    ('student', 'student'),
+    ('achievement', 'achievement'),
+    ('mission', 'mission'),
+    ('challenge', 'challenge'),
+]
+
+# Курс, к которому относятся перенесённые группы (в brainrot.db курсов нет)
+IMPORT_COURSE_CODE = 'BRAINROT'
+IMPORT_COURSE_TITLE = 'Геймификация (перенос из brainrot)'
+
+# Оценка поведения 2..5 -> journal.behavior
+_BEHAVIOR_SQL = '''CASE WHEN g.behavior_grade IS NULL OR g.behavior_grade = 4 THEN 'good'
+                        WHEN g.behavior_grade >= 5 THEN 'excellent'
+                        WHEN g.behavior_grade = 3 THEN 'satisfactory' ELSE 'poor' END'''
+
+
+class BrainrotImportError(Exception):
+    """Перенос невозможен без вмешательства (например, в базе нет пользователей)"""
+
+
+def _map(column, entity):
+    """Подзапрос: новый id для старого id из column"""
+    return f"(SELECT target_id FROM brainrot_id_map WHERE entity = '{entity}' AND source_id = {column})"
+
+
+def _map_rows(conn, entity, rows):
+    conn.executemany('INSERT INTO brainrot_id_map (entity, source_id, target_id) VALUES (?, ?, ?)',
+                     [(entity, source_id, target_id) for source_id, target_id in rows])
+    return len(rows)
+
+
+def _unmapped(conn, schema, entity, table, columns='*'):
+    return conn.execute(f'''
+        SELECT {columns} FROM {schema}."{table}" AS src
+        WHERE NOT EXISTS (SELECT 1 FROM brainrot_id_map m WHERE m.entity = '{entity}' AND m.source_id = src.id)
+        ORDER BY src.id
+    ''').fetchall()
+
+
+def _import_teacher(conn, warnings):
+    """Преподаватель перенесённых групп: первый администратор, без них - первый преподаватель"""
+    row = conn.execute("SELECT MIN(id) FROM users WHERE role = 'admin'").fetchone()
+    if row[0] is not None:
+        return row[0]
+    row = conn.execute("SELECT MIN(id) FROM users WHERE role = 'teacher'").fetchone()
+    if row[0] is None:
+        raise BrainrotImportError('Нет администратора или преподавателя, к которому привязать перенесённые группы')
+    warnings.append(f'Нет администратора: группы привязаны к преподавателю id={row[0]}')
+    return row[0]
+
+
+def _import_groups(conn, schema, warnings):
+    """Группы brainrot.db - группы курса BRAINROT; преподаватель - см. _import_teacher"""
+    groups = _unmapped(conn, schema, 'group', 'group')
+    if not groups:
+        return 0
+    conn.execute('''
+        INSERT INTO courses (course_code, title, description, status)
+        VALUES (?, ?, 'Группы и прогресс, перенесённые из brainrot.db', 'active')
+        ON CONFLICT(course_code) DO NOTHING
+    ''', (IMPORT_COURSE_CODE, IMPORT_COURSE_TITLE))
+    course_id = conn.execute('SELECT id FROM courses WHERE course_code = ?', (IMPORT_COURSE_CODE,)).fetchone()[0]
+    teacher_id = _import_teacher(conn, warnings)
+
+    mapped = []
+    for group in groups:
+        # Название становится кодом группы, если он свободен
+        code = group['name']
+        if conn.execute('SELECT 1 FROM groups WHERE group_code = ?', (code,)).fetchone():
+            code = f'{code} (BR-{group["id"]})'
+        cursor = conn.execute('''
+            INSERT INTO groups (group_code, course_id, teacher_id, start_date, status)
+            VALUES (?, ?, ?, DATE(?), 'active')
+        ''', (code, course_id, teacher_id, group['created_at']))
+        mapped.append((group['id'], cursor.lastrowid))
+    return _map_rows(conn, 'group', mapped)
+
+
+def _import_students(conn, schema, warnings):
+    """Студенты одним INSERT ... SELECT; соответствие id - по коду BR-<id>.
+
+    Если код BR-<id> уже занят студентом, не перенесённым из brainrot.db,
+    источник не сопоставляется с ним: студент пропускается и попадает в
+    warnings, чтобы после переименования кода его можно было перенести повторным запуском.
+    """
+    conflicts = conn.execute(f'''
+        SELECT s.id AS source_id, st.id AS student_id, st.student_code
+        FROM {schema}.student s
+        JOIN students st ON st.student_code = 'BR-' || s.id
+        WHERE NOT EXISTS (SELECT 1 FROM brainrot_id_map m WHERE m.entity = 'student' AND m.source_id = s.id)
+    ''').fetchall()
+    for row in conflicts:
+        warnings.append(f'Студент {row["source_id"]} не перенесён: код {row["student_code"]} '
+                        f'уже у студента id={row["student_id"]}')
+    skipped = json.dumps([row['source_id'] for row in conflicts])
+
+    conn.execute(f'''
+        INSERT INTO students (student_code, full_name, notes, total_exp, level, status, created_at)
+        SELECT 'BR-' || s.id, TRIM(s.last_name || ' ' || s.first_name),
+               'Перенесено из brainrot.db' || COALESCE('; email: ' || s.email, '') || COALESCE('; телефон: ' || s.phone, ''),
+               COALESCE(s.experience_points, 0), COALESCE(s.level, 1), 'active', COALESCE(s.created_at, CURRENT_TIMESTAMP)
+        FROM {schema}.student s
+        WHERE NOT EXISTS (SELECT 1 FROM brainrot_id_map m WHERE m.entity = 'student' AND m.source_id = s.id)
+          AND s.id NOT IN (SELECT value FROM json_each(:skipped))
+        ORDER BY s.id
+    ''', {'skipped': skipped})
+    mapped = conn.execute(f'''
+        INSERT INTO brainrot_id_map (entity, source_id, target_id)
+        SELECT 'student', s.id, st.id
+        FROM {schema}.student s
+        JOIN students st ON st.student_code = 'BR-' || s.id
+        WHERE NOT EXISTS (SELECT 1 FROM brainrot_id_map m WHERE m.entity = 'student' AND m.source_id = s.id)
+          AND s.id NOT IN (SELECT value FROM json_each(:skipped))
+    ''', {'skipped': skipped}).rowcount
+    # Опыт студента в brainrot.db - опыт в его группе
+    conn.execute(f'''
+        INSERT INTO student_groups (student_id, group_id, enrolled_date, current_exp)
+        SELECT {_map('s.id', 'student')}, {_map('s.group_id', 'group')}, DATE(s.created_at), COALESCE(s.experience_points, 0)
+        FROM {schema}.student s
+        WHERE {_map('s.id', 'student')} IS NOT NULL AND {_map('s.group_id', 'group')} IS NOT NULL
+        ON CONFLICT(student_id, group_id) DO NOTHING
+    ''')
+    return mapped
+
+
+def _import_achievements(conn, schema):
+    """Достижения сопоставляются по названию, недостающие добавляются"""
+    mapped = []
+    for achievement in _unmapped(conn, schema, 'achievement', 'achievement'):
+        row = conn.execute('SELECT id FROM achievements WHERE name = ?', (achievement['name'],)).fetchone()
+        if row:
+            mapped.append((achievement['id'], row[0]))
+            continue
+        cursor = conn.execute('''
+            INSERT INTO achievements (name, description, icon, exp_reward, criteria_type, criteria_value, rarity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (achievement['name'], achievement['description'], achievement['icon'],
+              achievement['points_reward'] or 0, achievement['criteria_type'], achievement['criteria_value'],
+              'legendary' if achievement['is_secret'] else 'common'))
+        mapped.append((achievement['id'], cursor.lastrowid))
+    _map_rows(conn, 'achievement', mapped)
+
+    conn.execute(f'''
+        INSERT INTO student_achievements (student_id, achievement_id, earned_date)
+        SELECT {_map('sa.student_id', 'student')}, {_map('sa.achievement_id', 'achievement')},
+               COALESCE(sa.earned_at, CURRENT_TIMESTAMP)
+        FROM {schema}.student_achievement sa
+        WHERE {_map('sa.student_id', 'student')} IS NOT NULL
+          AND {_map('sa.achievement_id', 'achievement')} IS NOT NULL
+          AND NOT EXISTS (
+            SELECT 1 FROM student_achievements x
+            WHERE x.student_id = {_map('sa.student_id', 'student')}
+              AND x.achievement_id = {_map('sa.achievement_id', 'achievement')}
+        )
+    ''')
+    return len(mapped)
+
+
+def _import_missions(conn, schema):
+    """Миссии сопоставляются по уровню (он уникален в обеих базах)"""
+    conn.execute(f'''
+        INSERT INTO missions (title, description, difficulty, category, exp_reward, level, is_active, created_at)
+        SELECT title, description, difficulty, category, COALESCE(points_reward, 0), level,
+               COALESCE(is_active, 1), COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM {schema}.mission
+        WHERE true
+        ON CONFLICT(level) DO NOTHING
+    ''')
+    mapped = conn.execute(f'''
+        INSERT INTO brainrot_id_map (entity, source_id, target_id)
+        SELECT 'mission', src.id, m.id
+        FROM {schema}.mission src
+        JOIN missions m ON m.level = src.level
+        WHERE NOT EXISTS (SELECT 1 FROM brainrot_id_map x WHERE x.entity = 'mission' AND x.source_id = src.id)
+    ''').rowcount
+    conn.execute(f'''
+        INSERT INTO student_missions (student_id, mission_id, completed, completed_at, score, created_at)
+        SELECT {_map('p.student_id', 'student')}, {_map('p.mission_id', 'mission')},
+               COALESCE(p.completed, 0), p.completed_at, p.score, COALESCE(p.created_at, CURRENT_TIMESTAMP)
+        FROM {schema}.student_progress p
+        WHERE {_map('p.student_id', 'student')} IS NOT NULL AND {_map('p.mission_id', 'mission')} IS NOT NULL
+        ON CONFLICT(student_id, mission_id) DO NOTHING
+    ''')
+    return mapped
+
+
+def _import_challenges(conn, schema):
+    """Задачи сопоставляются по названию и условию, решения - по времени отправки"""
+    mapped = []
+    for challenge in _unmapped(conn, schema, 'challenge', 'challenge'):
+        row = conn.execute('SELECT id FROM challenges WHERE title = ? AND description = ?',
+                           (challenge['title'], challenge['description'])).fetchone()
+        if row:
+            mapped.append((challenge['id'], row[0]))
+            continue
+        cursor = conn.execute('''
+            INSERT INTO challenges (title, description, difficulty, category, exp_reward, test_cases,
+                                    solution_template, is_active, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', (challenge['title'], challenge['description'], challenge['difficulty'], challenge['category'],
+              challenge['points_reward'] or 0, challenge['test_cases'], challenge['solution_template'],
+              1 if challenge['is_active'] is None else challenge['is_active'], challenge['created_at']))
+        mapped.append((challenge['id'], cursor.lastrowid))
+    _map_rows(conn, 'challenge', mapped)
+
+    # Решения из brainrot.db уже проверены: в очередь проверки они не попадают
+    conn.execute(f'''
+        INSERT INTO challenge_submissions (student_id, challenge_id, code, passed, score, submitted_at,
+                                           status, graded_at)
+        SELECT {_map('cs.student_id', 'student')}, {_map('cs.challenge_id', 'challenge')},
+               cs.code, COALESCE(cs.passed, 0), cs.score, COALESCE(cs.submitted_at, CURRENT_TIMESTAMP),
+               'graded', COALESCE(cs.submitted_at, CURRENT_TIMESTAMP)
+        FROM {schema}.challenge_submission cs
+        WHERE {_map('cs.student_id', 'student')} IS NOT NULL
+          AND {_map('cs.challenge_id', 'challenge')} IS NOT NULL
+          AND NOT EXISTS (
+            SELECT 1 FROM challenge_submissions x
+            WHERE x.student_id = {_map('cs.student_id', 'student')}
+              AND x.challenge_id = {_map('cs.challenge_id', 'challenge')}
+              AND x.submitted_at IS cs.submitted_at
+        )
+    ''')
+    return len(mapped)
+
+
+def _import_grades(conn, schema):
+    """Оценки по датам - занятия группы на эти даты (создаются при отсутствии) и журнал"""
+    grades = f'''
+        SELECT g.*, {_map('g.student_id', 'student')} AS student_id_new, {_map('s.group_id', 'group')} AS group_id_new
+        FROM {schema}.grade g
+        JOIN {schema}.student s ON s.id = g.student_id
+    '''
+    conn.execute(f'''
+        INSERT INTO lessons (group_id, lesson_number, title, lesson_date, status)
+        SELECT group_id_new, base + ROW_NUMBER() OVER (PARTITION BY group_id_new ORDER BY lesson_date),
+               'Занятие ' || (base + ROW_NUMBER() OVER (PARTITION BY group_id_new ORDER BY lesson_date)),
+               lesson_date, 'completed'
+        FROM (
+            SELECT DISTINCT gr.group_id_new, DATE(gr.lesson_date) AS lesson_date,
+                   (SELECT COALESCE(MAX(l.lesson_number), 0) FROM lessons l WHERE l.group_id = gr.group_id_new) AS base
+            FROM ({grades}) gr
+            WHERE gr.group_id_new IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM lessons l
+                              WHERE l.group_id = gr.group_id_new AND l.lesson_date = DATE(gr.lesson_date))
+        )
+    ''')
+    return conn.execute(f'''
+        INSERT INTO journal (lesson_id, student_id, grade, behavior, participation, comments, exp_earned, created_at)
+        SELECT (SELECT MIN(l.id) FROM lessons l WHERE l.group_id = g.group_id_new AND l.lesson_date = DATE(g.lesson_date)),
+               g.student_id_new, g.task_grade, {_BEHAVIOR_SQL}, 'active', g.notes, 0,
+               COALESCE(g.created_at, CURRENT_TIMESTAMP)
+        FROM ({grades}) g
+        WHERE g.group_id_new IS NOT NULL AND g.student_id_new IS NOT NULL
+        ON CONFLICT(lesson_id, student_id) DO NOTHING
+    ''').rowcount
+
+
+def import_brainrot(conn, source_path, schema='brainrot'):
+    """Перенос данных brainrot.db в эту базу одной транзакцией.
+
+    Исходная база подключается через ATTACH (только чтение), строки
+    переносятся запросами INSERT ... SELECT между базами. Соответствие
+    старых и новых id сохраняется в brainrot_id_map, поэтому повторный
+    запуск переносит только новые строки. Пользователи brainrot.db не
+    переносятся: у них нет обязательных здесь email и ФИО.
+    Соединение должно быть создано с uri=True. Пропущенные строки и
+    замены (занятый код студента, нет администратора) перечисляются
+    в report['warnings'].
+    """
+    started = time.perf_counter()
+    attach_database(conn, source_path, schema)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            warnings = []
+            report = {
+                'groups': _import_groups(conn, schema, warnings),
+                'students': _import_students(conn, schema, warnings),
+                'achievements': _import_achievements(conn, schema),
+                'missions': _import_missions(conn, schema),
+                'challenges': _import_challenges(conn, schema),
+                'journal': _import_grades(conn, schema),
+            }
+            student_ids = [row[0] for row in conn.execute(
+                "SELECT target_id FROM brainrot_id_map WHERE entity = 'student'")]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        from .levels import recalculate_levels
+        recalculate_levels(conn, student_ids)
+        conn.commit()
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        report['warnings'] = warnings
+        return report
+    finally:
+        conn.execute(f'DETACH DATABASE {schema}')
+
+
+def mapping_report(conn, schema='brainrot'):
+    """Сверка переноса одним запросом по обеим базам: строк в источнике и сопоставлено"""
+    parts = ' UNION ALL '.join(f'''
+        SELECT '{entity}' AS entity,
+               (SELECT COUNT(*) FROM {schema}."{table}") AS source_rows,
+               (SELECT COUNT(*) FROM {schema}."{table}" src
+                JOIN brainrot_id_map m ON m.entity = '{entity}' AND m.source_id = src.id) AS mapped_rows
+    ''' for entity, table in ENTITIES)
+    return [dict(row) for row in conn.execute(parts)]
@@ -0,0 +1,113 @@
+import json
+import sqlite3
+
+from flask import Blueprint, current_app, flash, jsonify, redirect, request, session, url_for
+
+from .db import get_db_connection
+from .grading import get_service, wake_grader
+
+challenges_bp = Blueprint('challenges', __name__)
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _submission_items():
+    """Решения из запроса: JSON-объект, JSON-список (вся группа) или форма"""
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        return payload if isinstance(payload, list) else [payload or {}]
+    return [{'student_id': request.form.get('student_id'), 'code': request.form.get('code')}]
+
+
+@challenges_bp.route('/challenges/<int:challenge_id>/submissions', methods=['POST'])
+@login_required
+def submit_solutions(challenge_id):
+    max_length = current_app.config.get('GRADING_MAX_CODE_LENGTH', 20000)
+    if get_service() is None:
+        return jsonify({'error': 'Проверка решений отключена'}), 503
+
+    items = _submission_items()
+    if not items:
+        return jsonify({'error': 'Не переданы решения'}), 400
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            student_id = int(item.get('student_id'))
+        except (TypeError, ValueError, AttributeError):
+            errors.append({'index': index, 'error': 'Не указан студент'})
+            continue
+        code = item.get('code') or ''
+        if not isinstance(code, str):
+            errors.append({'index': index, 'student_id': student_id, 'error': 'Решение должно быть строкой'})
+        elif not code.strip():
+            errors.append({'index': index, 'student_id': student_id, 'error': 'Пустое решение'})
+        elif len(code) > max_length:
+            errors.append({'index': index, 'student_id': student_id,
+                           'error': f'Решение длиннее {max_length} символов'})
+        else:
+            rows.append((student_id, challenge_id, code))
+    if errors:
+        return jsonify({'error': 'Некорректные решения', 'errors': errors}), 400
+
+    try:
+        with get_db_connection() as conn:
+            challenge = conn.execute('SELECT is_active FROM challenges WHERE id = ?', (challenge_id,)).fetchone()
+            if not challenge or not challenge['is_active']:
+                return jsonify({'error': 'Задача не найдена'}), 404
+
+            student_ids = json.dumps(sorted({row[0] for row in rows}))
+            known = {row[0] for row in conn.execute(
+                'SELECT id FROM students WHERE id IN (SELECT value FROM json_each(?))', (student_ids,))}
+            unknown = sorted({row[0] for row in rows} - known)
+            if unknown:
+                return jsonify({'error': 'Студенты не найдены', 'student_ids': unknown}), 400
+
+            conn.execute('BEGIN IMMEDIATE')
+            ids = [conn.execute('''
+                INSERT INTO challenge_submissions (student_id, challenge_id, code) VALUES (?, ?, ?)
+                RETURNING id
+            ''', row).fetchone()[0] for row in rows]
+            conn.commit()
+    except sqlite3.Error:
+        return jsonify({'error': 'Ошибка сохранения решений'}), 500
+
+    wake_grader()
+    return jsonify({'status': 'queued', 'submission_ids': ids}), 202
+
+
+@challenges_bp.route('/challenges/submissions/<int:submission_id>')
+@login_required
+def submission_status(submission_id):
+    with get_db_connection() as conn:
+        row = conn.execute('''
+            SELECT id, student_id, challenge_id, status, passed, score, result, submitted_at, graded_at
+            FROM challenge_submissions WHERE id = ?
+        ''', (submission_id,)).fetchone()
+    if not row:
+        return jsonify({'error': 'Решение не найдено'}), 404
+
+    submission = dict(row)
+    submission['passed'] = bool(submission['passed']) if submission['status'] in ('graded', 'failed') else None
+    submission['result'] = json.loads(submission['result']) if submission['result'] else None
+    return jsonify(submission)
+
+
+@challenges_bp.route('/challenges/grading/stats')
+@login_required
+def grading_stats():
+    service = get_service()
+    with get_db_connection() as conn:
+        queue = {row['status']: row['count'] for row in conn.execute('''
+            SELECT status, COUNT(*) AS count FROM challenge_submissions
+            WHERE status IN ('queued', 'running', 'failed') GROUP BY status
+        ''')}
+    return jsonify({'enabled': service is not None, 'queue': queue,
+                    'service': service.stats() if service else None})
@@ -1,18 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .search import fts_query, match_ids
+from .page_cache import cached_page, bump
 
 courses_bp = Blueprint('courses', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -25,19 +18,33 @@ def login_required(f):
 
 @courses_bp.route('/courses')
 @login_required
+@cached_page('courses', 'groups')
 def list_courses():
+    search = request.args.get('q', '').strip()
+    query = fts_query(search)
+    
     try:
         with get_db_connection() as conn:
-            courses = conn.execute('''
-                SELECT c.*, COUNT(g.id) as group_count
-                FROM courses c
-                LEFT JOIN groups g ON c.id = g.course_id AND g.status = 'active'
-                WHERE c.status = 'active'
-                GROUP BY c.id
-                ORDER BY c.title
-            ''').fetchall()
+            if query:
+                courses = conn.execute(f'''
+                    SELECT c.*,
+                           (SELECT COUNT(*) FROM groups g
+                            WHERE g.course_id = c.id AND g.status = 'active') as group_count
+                    FROM courses c
+                    WHERE c.status = 'active' AND c.id IN ({match_ids('courses')})
+                    ORDER BY c.title
+                ''', (query,)).fetchall()
+            else:
+                courses = conn.execute('''
+                    SELECT c.*,
+                           (SELECT COUNT(*) FROM groups g
+                            WHERE g.course_id = c.id AND g.status = 'active') as group_count
+                    FROM courses c
+                    WHERE c.status = 'active'
+                    ORDER BY c.title
+                ''').fetchall()
             
-        return render_template('courses/list.html', courses=courses)
+        return render_template('courses/list.html', courses=courses, search=search)
         
     except Exception as e:
         flash('Ошибка загрузки списка курсов', 'error')
@@ -65,6 +72,7 @@ def add_course():
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', tuple(course_data.values()))
                 conn.commit()
+            bump('courses')
                 
             flash('Курс успешно добавлен', 'success')
             return redirect(url_for('courses.list_courses'))
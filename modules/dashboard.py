@@ -1,19 +1,10 @@
-from flask import Blueprint, render_template, session
-import sqlite3
-from contextlib import contextmanager
+from flask import Blueprint, render_template, session, redirect, url_for
+from .db import get_db_connection
+from .stats import read_dashboard_stats
 from datetime import date
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 @dashboard_bp.route('/')
 @dashboard_bp.route('/dashboard')
 def dashboard():
@@ -22,14 +13,8 @@ def dashboard():
     
     try:
         with get_db_connection() as conn:
-            stats = conn.execute('''
-                SELECT 
-                    (SELECT COUNT(*) FROM students WHERE status = 'active') as active_students,
-                    (SELECT COUNT(*) FROM courses WHERE status = 'active') as active_courses,
-                    (SELECT COUNT(*) FROM groups WHERE status = 'active') as active_groups,
-                    (SELECT COUNT(*) FROM users WHERE role = 'teacher') as teachers_count,
-                    (SELECT COUNT(*) FROM lessons WHERE lesson_date = date('now')) as today_lessons
-            ''').fetchone()
+            # Счётчики поддерживаются триггерами в dashboard_stats
+            stats, stats_staleness = read_dashboard_stats(conn)
             
             recent_students = conn.execute('''
                 SELECT * FROM students 
@@ -50,8 +35,9 @@ def dashboard():
             
         return render_template('dashboard/dashboard.html', 
                              stats=stats, 
+                             stats_staleness=stats_staleness,
                              recent_students=recent_students,
                              upcoming_lessons=upcoming_lessons)
                              
     except Exception as e:
-        return render_template('dashboard/dashboard.html', stats=None, recent_students=[], upcoming_lessons=[])
\ No newline at end of file
+        return render_template('dashboard/dashboard.html', stats=None, stats_staleness={}, recent_students=[], upcoming_lessons=[])
\ No newline at end of file
@@ -0,0 +1,230 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+
+from config import Config
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+def attach_database(conn, path, schema, readonly=True):
+    """ATTACH ещё одной базы: её таблицы доступны как schema.table в тех же запросах.
+
+    readonly=True открывает базу только для чтения (URI mode=ro), для этого
+    соединение должно быть создано с uri=True.
+    """
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', schema):
+        raise ValueError(f'Некорректное имя схемы: {schema}')
+    if readonly:
+        # ATTACH с mode=ro не создаёт файл, а сообщает, что базы нет
+        target = 'file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro'
+    else:
+        target = path
+    conn.execute(f'ATTACH DATABASE ? AS {schema}', (target,))
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений SQLite для одного процесса.
+
+    Соединения настраиваются один раз при создании (WAL, synchronous,
+    busy_timeout, mmap_size, cache_size) и переиспользуются между потоками.
+    После fork пул пересоздаётся, чтобы не делить дескрипторы с родителем.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=5.0, busy_timeout_ms=5000,
+                 mmap_size=64 * 1024 * 1024, cache_size=-8000, attach=None):
+        self.db_path = db_path
+        self.attach = dict(attach or {})
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+
+        # Счётчики для подбора размера пула
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, factory=_connection_factory, uri=bool(self.attach))
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        # Подключённые базы (DB_ATTACH): соединения между базами - одним запросом
+        for schema, path in self.attach.items():
+            attach_database(conn, path, schema)
+        for hook in _connection_hooks:
+            hook(conn)
+        return conn
+
+    def _check_fork(self):
+        # Соединения SQLite нельзя переносить через fork: начинаем с пустого пула
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._created = 0
+
+    def acquire(self):
+        with self._cond:
+            self._check_fork()
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            if self._created < self.max_size:
+                self._created += 1
+                self.misses += 1
+                new_connection = True
+            else:
+                new_connection = False
+                self.waits += 1
+                started = time.perf_counter()
+                deadline = started + self.timeout
+                while not self._idle:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if self._idle:
+                            break
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'Нет свободных соединений за {self.timeout} с (размер пула {self.max_size})'
+                        )
+                waited = time.perf_counter() - started
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+                self.hits += 1
+                return self._idle.pop()
+
+        if new_connection:
+            try:
+                return self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+    def release(self, conn, discard=False):
+        # Незакоммиченные изменения откатываются, как при закрытии соединения
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            discard = True
+
+        with self._cond:
+            if discard or self._pid != os.getpid():
+                self._created = max(0, self._created - 1)
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+    def stats(self):
+        with self._cond:
+            requests = self.hits + self.misses
+            return {
+                'db_path': self.db_path,
+                'attached': sorted(self.attach),
+                'max_size': self.max_size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else None,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_total': round(self.wait_time, 6),
+                'wait_time_avg': round(self.wait_time / self.waits, 6) if self.waits else 0.0,
+                'wait_time_max': round(self.max_wait_time, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Функции, вызываемые для каждого нового соединения пула (трассировка, профилирование)
+_connection_hooks = []
+_connection_factory = sqlite3.Connection
+
+
+def add_connection_hook(hook):
+    if hook not in _connection_hooks:
+        _connection_hooks.append(hook)
+
+
+def set_connection_factory(factory):
+    """Класс соединений пула (подкласс sqlite3.Connection); действует на новые соединения"""
+    global _connection_factory
+    _connection_factory = factory
+
+
+def _pool_from_config(config):
+    return ConnectionPool(
+        config.get('DATABASE_PATH', Config.DATABASE_PATH),
+        max_size=config.get('DB_POOL_SIZE', Config.DB_POOL_SIZE),
+        timeout=config.get('DB_POOL_TIMEOUT', Config.DB_POOL_TIMEOUT),
+        busy_timeout_ms=config.get('DB_BUSY_TIMEOUT_MS', Config.DB_BUSY_TIMEOUT_MS),
+        mmap_size=config.get('DB_MMAP_SIZE', Config.DB_MMAP_SIZE),
+        cache_size=config.get('DB_CACHE_SIZE', Config.DB_CACHE_SIZE),
+        attach=config.get('DB_ATTACH', Config.DB_ATTACH),
+    )
+
+
+def init_app(app):
+    """Создание пула по настройкам приложения"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = _pool_from_config(app.config)
+    app.extensions['db_pool'] = _pool
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _pool_from_config(vars(Config))
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+@contextmanager
+def get_db_connection():
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
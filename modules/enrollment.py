@@ -0,0 +1,283 @@
+import json
+import sqlite3
+
+from flask import Blueprint, flash, jsonify, redirect, request, session, url_for
+
+from init_db import waitlist_promotion_statements
+from .db import get_db_connection
+from .page_cache import bump
+
+enrollment_bp = Blueprint('enrollment', __name__)
+
+COMPLETION_STATUSES = ('studying', 'completed', 'dropped')
+
+
+class EnrollmentError(Exception):
+    """Запись невозможна целиком: группа не найдена или закрыта"""
+
+
+class GroupNotFound(EnrollmentError):
+    pass
+
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _group_capacity(conn, group_id):
+    return conn.execute('''
+        SELECT g.id, g.status, c.max_students,
+               (SELECT COUNT(*) FROM student_groups sg
+                WHERE sg.group_id = g.id AND sg.completion_status = 'studying') AS occupied,
+               (SELECT COUNT(*) FROM group_waitlist w WHERE w.group_id = g.id) AS waiting
+        FROM groups g
+        JOIN courses c ON c.id = g.course_id
+        WHERE g.id = ?
+    ''', (group_id,)).fetchone()
+
+
+def enroll_students(conn, group_id, student_ids, waitlist=True, requested_by=None):
+    """Запись списка студентов в группу с учётом courses.max_students.
+
+    Проверка мест и вставка выполняются в одной транзакции BEGIN IMMEDIATE:
+    параллельные записи в группу выстраиваются друг за другом и не
+    переполняют её. Студенты сверх вместимости попадают в лист ожидания
+    (waitlist=False - отклоняются). Пока кто-то ждёт, новые студенты встают
+    в конец очереди, даже если место освободилось.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    ids_json = json.dumps(student_ids)
+    result = {'group_id': group_id, 'enrolled': [], 'waitlisted': [], 'already_enrolled': [],
+              'already_waitlisted': [], 'rejected': [], 'errors': []}
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        group = _group_capacity(conn, group_id)
+        if not group:
+            raise GroupNotFound('Группа не найдена')
+        if group['status'] != 'active':
+            raise EnrollmentError('Группа не принимает студентов')
+        if group['waiting'] and (group['max_students'] is None or group['occupied'] < group['max_students']):
+            # Места освободились в обход триггеров (правка данных вручную) - сначала очередь
+            for statement in waitlist_promotion_statements('w.group_id = ?'):
+                conn.execute(statement, (group_id,))
+            group = _group_capacity(conn, group_id)
+
+        known = {row[0] for row in conn.execute(
+            'SELECT id FROM students WHERE id IN (SELECT value FROM json_each(?))', (ids_json,))}
+        studying = {row[0] for row in conn.execute('''
+            SELECT student_id FROM student_groups
+            WHERE group_id = ? AND completion_status = 'studying'
+              AND student_id IN (SELECT value FROM json_each(?))
+        ''', (group_id, ids_json))}
+        waiting = {row[0] for row in conn.execute('''
+            SELECT student_id FROM group_waitlist
+            WHERE group_id = ? AND student_id IN (SELECT value FROM json_each(?))
+        ''', (group_id, ids_json))}
+
+        if group['max_students'] is None:
+            free = len(student_ids)
+        else:
+            free = 0 if group['waiting'] else max(0, group['max_students'] - group['occupied'])
+        position = group['waiting']
+        enroll_rows, waitlist_rows = [], []
+        for student_id in student_ids:
+            if student_id not in known:
+                result['errors'].append({'student_id': student_id, 'error': 'Студент не найден'})
+            elif student_id in studying:
+                result['already_enrolled'].append(student_id)
+            elif student_id in waiting:
+                result['already_waitlisted'].append(student_id)
+            elif free > 0:
+                free -= 1
+                enroll_rows.append((student_id, group_id))
+                result['enrolled'].append(student_id)
+            elif waitlist:
+                position += 1
+                waitlist_rows.append((group_id, student_id, requested_by))
+                result['waitlisted'].append({'student_id': student_id, 'position': position})
+            else:
+                result['rejected'].append(student_id)
+
+        # Выбывший или закончивший студент возвращается в группу обновлением строки
+        conn.executemany('''
+            INSERT INTO student_groups (student_id, group_id, completion_status) VALUES (?, ?, 'studying')
+            ON CONFLICT(student_id, group_id) DO UPDATE SET
+                completion_status = 'studying', enrolled_date = CURRENT_DATE
+        ''', enroll_rows)
+        conn.executemany(
+            'INSERT INTO group_waitlist (group_id, student_id, requested_by) VALUES (?, ?, ?)', waitlist_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    result['capacity'] = group['max_students']
+    result['occupied'] = group['occupied'] + len(enroll_rows)
+    result['waiting'] = position
+    return result
+
+
+def set_completion_status(conn, group_id, student_id, status, requested_by=None):
+    """Смена статуса студента в группе; освободившиеся места занимает лист ожидания.
+
+    Продвижение очереди выполняют триггеры (миграция 12), поэтому оно
+    срабатывает при любом изменении статуса. Возврат в 'studying' проверяет
+    вместимость так же, как enroll_students: в заполненную группу (или при
+    непустой очереди) студент встаёт в лист ожидания, а статус не меняется.
+    Возвращает {'promoted': [...], 'waitlisted': позиция или None};
+    None - студент не записан в группу.
+    """
+    result = {'promoted': [], 'waitlisted': None}
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = conn.execute('''
+            SELECT completion_status FROM student_groups WHERE group_id = ? AND student_id = ?
+        ''', (group_id, student_id)).fetchone()
+        if current is None:
+            conn.rollback()
+            return None
+
+        if status == 'studying' and current['completion_status'] != 'studying':
+            group = _group_capacity(conn, group_id)
+            if group['max_students'] is not None and (
+                    group['waiting'] or group['occupied'] >= group['max_students']):
+                conn.execute('''
+                    INSERT INTO group_waitlist (group_id, student_id, requested_by) VALUES (?, ?, ?)
+                    ON CONFLICT(group_id, student_id) DO NOTHING
+                ''', (group_id, student_id, requested_by))
+                result['waitlisted'] = waitlist_ids(conn, group_id).index(student_id) + 1
+                conn.commit()
+                return result
+
+        before = waitlist_ids(conn, group_id)
+        conn.execute('''
+            UPDATE student_groups SET completion_status = ? WHERE group_id = ? AND student_id = ?
+        ''', (status, group_id, student_id))
+        remaining = set(waitlist_ids(conn, group_id))
+        result['promoted'] = [student for student in before if student not in remaining]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def waitlist_ids(conn, group_id):
+    return [row[0] for row in conn.execute(
+        'SELECT student_id FROM group_waitlist WHERE group_id = ? ORDER BY id', (group_id,))]
+
+
+def _wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+
+def _requested_student_ids():
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        if not isinstance(payload, dict):
+            raise ValueError('Ожидается JSON-объект со списком student_ids')
+        values = payload.get('student_ids', [payload.get('student_id')] if 'student_id' in payload else [])
+    else:
+        values = request.form.getlist('student_ids') or request.form.getlist('student_id')
+    student_ids = []
+    for value in values if isinstance(values, list) else [values]:
+        try:
+            student_ids.append(int(value))
+        except (TypeError, ValueError):
+            raise ValueError(f'Некорректный id студента: {value}')
+    return student_ids
+
+
+@enrollment_bp.route('/groups/<int:group_id>/enroll', methods=['POST'])
+@login_required
+def enroll(group_id):
+    """Запись одного или нескольких студентов: JSON {"student_ids": [...]} или форма student_ids"""
+    wants_json = _wants_json()
+    try:
+        student_ids = _requested_student_ids()
+        if not student_ids:
+            raise ValueError('Не выбраны студенты')
+        waitlist = request.args.get('waitlist', '1') != '0'
+        with get_db_connection() as conn:
+            result = enroll_students(conn, group_id, student_ids, waitlist, session.get('user_id'))
+    except (ValueError, EnrollmentError) as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 404 if isinstance(e, GroupNotFound) else 400
+        flash(f'Запись не выполнена: {e}', 'error')
+        return redirect(url_for('groups.list_groups'))
+    except sqlite3.Error:
+        if wants_json:
+            return jsonify({'error': 'Ошибка записи в группу'}), 500
+        flash('Ошибка записи в группу', 'error')
+        return redirect(url_for('groups.list_groups'))
+
+    if result['enrolled']:
+        bump('student_groups')
+    if wants_json:
+        return jsonify(result)
+    flash(f'Записано: {len(result["enrolled"])}, в листе ожидания: {len(result["waitlisted"])}', 'success')
+    for error in result['errors']:
+        flash(f'Студент {error["student_id"]}: {error["error"]}', 'error')
+    return redirect(url_for('groups.list_groups'))
+
+
+@enrollment_bp.route('/groups/<int:group_id>/students/<int:student_id>/status', methods=['POST'])
+@login_required
+def change_status(group_id, student_id):
+    data = request.get_json(silent=True) if request.is_json else request.form
+    status = data.get('completion_status') if isinstance(data, dict) else None
+    if status not in COMPLETION_STATUSES:
+        return jsonify({'error': 'Некорректный статус', 'statuses': COMPLETION_STATUSES}), 400
+    try:
+        with get_db_connection() as conn:
+            result = set_completion_status(conn, group_id, student_id, status, session.get('user_id'))
+    except sqlite3.Error:
+        return jsonify({'error': 'Ошибка изменения статуса'}), 500
+    if result is None:
+        return jsonify({'error': 'Студент не записан в группу'}), 404
+    if result['waitlisted'] is not None:
+        # Мест нет: статус прежний, студент ждёт в листе ожидания
+        return jsonify({'group_id': group_id, 'student_id': student_id, 'completion_status': None,
+                        'waitlisted': result['waitlisted'], 'promoted': []}), 202
+    bump('student_groups')
+    return jsonify({'group_id': group_id, 'student_id': student_id, 'completion_status': status,
+                    'promoted': result['promoted']})
+
+
+@enrollment_bp.route('/groups/<int:group_id>/waitlist')
+@login_required
+def group_waitlist(group_id):
+    with get_db_connection() as conn:
+        group = _group_capacity(conn, group_id)
+        if not group:
+            return jsonify({'error': 'Группа не найдена'}), 404
+        waiting = conn.execute('''
+            SELECT w.student_id, s.student_code, s.full_name, w.created_at,
+                   ROW_NUMBER() OVER (ORDER BY w.id) AS position
+            FROM group_waitlist w
+            JOIN students s ON s.id = w.student_id
+            WHERE w.group_id = ?
+            ORDER BY w.id
+        ''', (group_id,)).fetchall()
+    return jsonify({'group_id': group_id, 'capacity': group['max_students'], 'occupied': group['occupied'],
+                    'waitlist': [dict(row) for row in waiting]})
+
+
+@enrollment_bp.route('/groups/<int:group_id>/waitlist/<int:student_id>', methods=['DELETE'])
+@login_required
+def leave_waitlist(group_id, student_id):
+    with get_db_connection() as conn:
+        removed = conn.execute('DELETE FROM group_waitlist WHERE group_id = ? AND student_id = ?',
+                               (group_id, student_id)).rowcount
+        conn.commit()
+    if not removed:
+        return jsonify({'error': 'Студента нет в листе ожидания'}), 404
+    return jsonify({'group_id': group_id, 'student_id': student_id, 'removed': True})
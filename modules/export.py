@@ -0,0 +1,97 @@
+import csv
+import io
+import tempfile
+from urllib.parse import quote
+
+from flask import Response, current_app, stream_with_context
+
+from .db import get_db_connection
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+class ExportError(Exception):
+    """Выгрузку в запрошенном формате сделать нельзя"""
+
+
+def _query_rows(sql, params, chunk_rows):
+    """Строки запроса порциями fetchmany: результат не загружается целиком"""
+    with get_db_connection() as conn:
+        cursor = conn.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def _csv_chunks(columns, sql, params, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    # BOM - чтобы Excel открыл UTF-8 с кириллицей; заголовок уходит до выполнения запроса
+    writer.writerow([title for title, _ in columns])
+    yield '﻿' + buffer.getvalue()
+
+    for rows in _query_rows(sql, params, chunk_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([row[key] for _, key in columns] for row in rows)
+        yield buffer.getvalue()
+
+
+def _xlsx_chunks(columns, sql, params, chunk_rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportError('Для выгрузки в XLSX установите пакет openpyxl')
+
+    # XLSX - zip-архив с оглавлением в конце, поэтому книга пишется в режиме
+    # write_only во временный файл (на диск при большом объёме) и затем отдаётся частями
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([title for title, _ in columns])
+
+    def generate():
+        with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as output:
+            for rows in _query_rows(sql, params, chunk_rows):
+                for row in rows:
+                    sheet.append([row[key] for _, key in columns])
+            workbook.save(output)
+            output.seek(0)
+            while True:
+                data = output.read(64 * 1024)
+                if not data:
+                    break
+                yield data
+
+    return generate()
+
+
+def export_response(export_format, filename, columns, sql, params=()):
+    """Потоковая выгрузка результата запроса.
+
+    columns - список (заголовок, ключ строки). Строки читаются из курсора
+    порциями EXPORT_CHUNK_ROWS и сразу отправляются клиенту; соединение
+    из пула занято, пока идёт выгрузка.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError('Поддерживаются форматы CSV и XLSX')
+
+    chunk_rows = current_app.config.get('EXPORT_CHUNK_ROWS', 500)
+    if export_format == 'csv':
+        body = _csv_chunks(columns, sql, params, chunk_rows)
+        mimetype = 'text/csv'
+    else:
+        body = _xlsx_chunks(columns, sql, params, chunk_rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    filename = f'{filename}.{export_format}'
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    response.headers['Cache-Control'] = 'no-store'
+    # Отключаем буферизацию ответа в nginx, чтобы строки уходили клиенту сразу
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,231 @@
+import threading
+from array import array
+from collections import OrderedDict
+
+from flask import current_app
+
+# Пустая клетка ведомости в массивах оценок и кодов
+MISSING = -1
+
+BEHAVIORS = ('excellent', 'good', 'satisfactory', 'poor')
+PARTICIPATIONS = ('active', 'passive', 'absent')
+
+
+class Gradebook:
+    """Ведомость группы: студенты × занятия в плотных массивах.
+
+    Клетка (i, j) хранится по индексу i * len(lessons) + j: оценка, опыт,
+    коды поведения и участия (индексы в BEHAVIORS/PARTICIPATIONS, значения
+    вне словаря - в extra_values). Комментарии редки и лежат в словаре.
+    Средние и посещаемость по строкам и столбцам считаются за один проход
+    при построении. Ведомость не меняется после создания.
+    """
+
+    def __init__(self, group_id, version, students, lessons, rows):
+        self.group_id = group_id
+        self.version = version
+        self.students = tuple(students)
+        self.lessons = tuple(lessons)
+        width = len(self.lessons)
+        size = len(self.students) * width
+        self.grades = array('h', [MISSING]) * size
+        self.exp = array('i', [0]) * size
+        self.behavior = array('b', [MISSING]) * size
+        self.participation = array('b', [MISSING]) * size
+        self.comments = {}
+        self.extra_values = {}
+
+        row_of = {student['id']: i for i, student in enumerate(self.students)}
+        col_of = {lesson['id']: j for j, lesson in enumerate(self.lessons)}
+        behaviors = {value: code for code, value in enumerate(BEHAVIORS)}
+        participations = {value: code for code, value in enumerate(PARTICIPATIONS)}
+        absent = participations['absent']
+
+        # Суммы для средних и посещаемости: [сумма оценок, число оценок, посещено, записей, опыт];
+        # у столбцов - без опыта
+        row_sums = [[0, 0, 0, 0, 0] for _ in self.students]
+        col_sums = [[0, 0, 0, 0] for _ in self.lessons]
+        held = set()
+
+        for lesson_id, student_id, grade, behavior, participation, comments, exp_earned in rows:
+            i, j = row_of.get(student_id), col_of.get(lesson_id)
+            if i is None or j is None:
+                continue
+            index = i * width + j
+            participation_code = participations.get(participation or 'active', MISSING)
+            behavior_code = behaviors.get(behavior or 'good', MISSING)
+            if participation_code == MISSING or behavior_code == MISSING:
+                self.extra_values[index] = (behavior, participation)
+            self.participation[index] = participation_code
+            self.behavior[index] = behavior_code
+            self.exp[index] = exp_earned or 0
+            if comments:
+                self.comments[index] = comments
+            held.add(j)
+
+            attended = participation_code != absent
+            row, col = row_sums[i], col_sums[j]
+            row[2] += attended
+            row[3] += 1
+            row[4] += exp_earned or 0
+            col[2] += attended
+            col[3] += 1
+            if grade is not None:
+                self.grades[index] = grade
+                row[0] += grade
+                row[1] += 1
+                col[0] += grade
+                col[1] += 1
+
+        self.held_lessons = len(held)
+        self.row_stats = tuple({
+            'average_grade': round(total / count, 2) if count else None,
+            'grades': count,
+            'attended': attended,
+            'attendance_rate': round(attended / self.held_lessons, 3) if self.held_lessons else None,
+            'exp_earned': exp,
+        } for total, count, attended, _, exp in row_sums)
+        self.column_stats = tuple({
+            'average_grade': round(total / count, 2) if count else None,
+            'grades': count,
+            'attended': attended,
+            'attendance_rate': round(attended / entries, 3) if entries else None,
+        } for total, count, attended, entries in col_sums)
+        grades_total = sum(row[0] for row in row_sums)
+        grades_count = sum(row[1] for row in row_sums)
+        self.average_grade = round(grades_total / grades_count, 2) if grades_count else None
+
+    def cell(self, i, j):
+        """Клетка (студент i, занятие j) словарём; None - записи в журнале нет"""
+        index = i * len(self.lessons) + j
+        participation = self.participation[index]
+        if participation == MISSING and index not in self.extra_values:
+            return None
+        behavior = self.behavior[index]
+        if index in self.extra_values:
+            behavior_value, participation_value = self.extra_values[index]
+        else:
+            behavior_value, participation_value = BEHAVIORS[behavior], PARTICIPATIONS[participation]
+        grade = self.grades[index]
+        return {
+            'grade': None if grade == MISSING else grade,
+            'behavior': behavior_value,
+            'participation': participation_value,
+            'exp_earned': self.exp[index],
+            'comments': self.comments.get(index),
+        }
+
+    def rows(self):
+        """Строки ведомости для шаблона: (студент, клетки, итоги строки)"""
+        for i, student in enumerate(self.students):
+            yield student, [self.cell(i, j) for j in range(len(self.lessons))], self.row_stats[i]
+
+    def to_dict(self):
+        return {
+            'group_id': self.group_id,
+            'version': self.version,
+            'lessons': [dict(lesson, **stats) for lesson, stats in zip(self.lessons, self.column_stats)],
+            'students': [dict(student, **stats, cells=cells) for student, cells, stats in self.rows()],
+            'held_lessons': self.held_lessons,
+            'average_grade': self.average_grade,
+        }
+
+
+class GradebookCache:
+    """LRU-кэш ведомостей по группе; запись верна, пока совпадает версия журнала группы"""
+
+    def __init__(self, max_entries=200):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group_id, version):
+        with self._lock:
+            gradebook = self._entries.get(group_id)
+            if gradebook is None or gradebook.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(group_id)
+            self.hits += 1
+            return gradebook
+
+    def put(self, gradebook):
+        with self._lock:
+            self._entries[gradebook.group_id] = gradebook
+            self._entries.move_to_end(gradebook.group_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GradebookCache(current_app.config.get('GRADEBOOK_CACHE_MAX_ENTRIES', 200))
+    return _cache
+
+
+def gradebook_version(conn, group_id):
+    """Версия журнала группы (gradebook_versions, поддерживается триггерами)"""
+    row = conn.execute('SELECT version FROM gradebook_versions WHERE group_id = ?', (group_id,)).fetchone()
+    return row['version'] if row else 0
+
+
+def build_gradebook(conn, group_id, version=None):
+    """Ведомость группы: состав группы и занятия с журналом одним запросом"""
+    if version is None:
+        version = gradebook_version(conn, group_id)
+    students = [dict(row) for row in conn.execute('''
+        SELECT s.id, s.student_code, s.full_name, sg.completion_status
+        FROM student_groups sg
+        JOIN students s ON sg.student_id = s.id
+        WHERE sg.group_id = ?
+        ORDER BY s.full_name, s.id
+    ''', (group_id,))]
+
+    # Занятия без записей тоже попадают в выборку (LEFT JOIN) - это столбцы ведомости
+    lessons, rows, seen = [], [], set()
+    for row in conn.execute('''
+        SELECT l.id, l.lesson_number, l.lesson_date, l.start_time, l.title, l.status,
+               j.student_id, j.grade, j.behavior, j.participation, j.comments, j.exp_earned
+        FROM lessons l
+        LEFT JOIN journal j ON j.lesson_id = l.id
+        WHERE l.group_id = ?
+        ORDER BY l.lesson_date, l.start_time, l.id
+    ''', (group_id,)):
+        if row['id'] not in seen:
+            seen.add(row['id'])
+            lessons.append({'id': row['id'], 'lesson_number': row['lesson_number'],
+                            'lesson_date': row['lesson_date'], 'start_time': row['start_time'],
+                            'title': row['title'], 'status': row['status']})
+        if row['student_id'] is not None:
+            rows.append((row['id'], row['student_id'], row['grade'], row['behavior'],
+                         row['participation'], row['comments'], row['exp_earned']))
+    return Gradebook(group_id, version, students, lessons, rows)
+
+
+def load_gradebook(conn, group_id):
+    """Ведомость из кэша процесса или построенная заново, если журнал группы менялся"""
+    version = gradebook_version(conn, group_id)
+    cache = get_cache()
+    gradebook = cache.get(group_id, version)
+    if gradebook is None:
+        gradebook = build_gradebook(conn, group_id, version)
+        cache.put(gradebook)
+    return gradebook
+
+
+def gradebook_cache_stats():
+    return get_cache().stats()
@@ -0,0 +1,424 @@
+import json
+import os
+import re
+import select
+import shlex
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+from config import Config
+from .db import get_db_connection
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grading_worker.py')
+
+# Песочница использует fork, resource и select по каналам - только POSIX
+GRADING_SUPPORTED = os.name == 'posix'
+
+_DEF_RE = re.compile(r'^def\s+([A-Za-z_]\w*)\s*\(', re.M)
+
+
+class GradingError(Exception):
+    """Тесты задачи не удаётся разобрать или процесс проверки не ответил"""
+
+
+def parse_test_cases(test_cases, solution_template=None):
+    """Тесты задачи из challenges.test_cases: (имя функции, список тестов).
+
+    Формат - JSON-список тестов двух видов:
+    {"args": [1, 2], "expected": 3} - вызов функции решения,
+    {"input": "1 2", "output": "3"} - решение как программа: stdin -> stdout.
+    Имя функции берётся из {"function": ..., "cases": [...]}, иначе из
+    первого def в solution_template, иначе solve. "hidden": true скрывает
+    ожидаемый ответ в результате.
+    """
+    try:
+        data = json.loads(test_cases or '[]')
+    except ValueError:
+        raise GradingError('Тесты задачи - некорректный JSON')
+
+    function = None
+    if isinstance(data, dict):
+        function = data.get('function')
+        data = data.get('cases', [])
+    if not isinstance(data, list) or not data:
+        raise GradingError('У задачи нет тестов')
+
+    for number, case in enumerate(data, 1):
+        if not isinstance(case, dict):
+            raise GradingError(f'Тест {number}: ожидается объект')
+        if 'args' in case:
+            if not isinstance(case['args'], list) or 'expected' not in case:
+                raise GradingError(f'Тест {number}: нужны список args и expected')
+        elif 'output' not in case:
+            raise GradingError(f'Тест {number}: нужны args и expected либо input и output')
+
+    if function is None and any('args' in case for case in data):
+        match = _DEF_RE.search(solution_template or '')
+        function = match.group(1) if match else 'solve'
+    return function, data
+
+
+def _normalize_output(text):
+    return '\n'.join(line.rstrip() for line in str(text).strip().splitlines())
+
+
+def _equal(actual, expected):
+    if isinstance(expected, float) and isinstance(actual, (int, float)) and not isinstance(actual, bool):
+        return abs(actual - expected) <= 1e-6 * max(1.0, abs(expected))
+    return actual == expected
+
+
+def _short(value, limit=200):
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= limit else text[:limit] + '…'
+
+
+def _check_outcome(outcome):
+    """Ответ процесса проверки без доверия к содержимому: решение может само писать в канал результата.
+
+    Возвращает сообщение об ошибке, если форма ответа не та, которую пишет grading_worker.py.
+    """
+    if not isinstance(outcome, dict):
+        return 'Некорректный ответ процесса проверки'
+    if 'error' in outcome:
+        return None if isinstance(outcome['error'], str) else 'Некорректный ответ процесса проверки'
+    tests = outcome.get('tests')
+    if not isinstance(tests, list):
+        return 'Некорректный ответ процесса проверки'
+    for result in tests:
+        if not isinstance(result, dict):
+            return 'Некорректный ответ процесса проверки'
+        if any(key in result and not isinstance(result[key], str) for key in ('stdout', 'error')):
+            return 'Некорректный ответ процесса проверки'
+        if 'ms' in result and (not isinstance(result['ms'], (int, float)) or isinstance(result['ms'], bool)):
+            return 'Некорректный ответ процесса проверки'
+    return None
+
+
+def score_outcome(outcome, cases):
+    """Сравнение ответов решения с ожидаемыми: (прошло ли, баллы 0-100, подробности)"""
+    problem = _check_outcome(outcome)
+    if problem:
+        return False, 0, {'error': problem}
+    if 'error' in outcome:
+        return False, 0, {'error': outcome['error']}
+
+    tests = []
+    for result, case in zip(outcome.get('tests', []), cases):
+        message = result.get('error')
+        if message is None:
+            if 'args' in case:
+                ok = _equal(result.get('value'), case['expected'])
+                actual, expected = result.get('value'), case['expected']
+            else:
+                ok = _normalize_output(result.get('stdout', '')) == _normalize_output(case['output'])
+                actual, expected = result.get('stdout', '').strip(), case['output']
+            if not ok:
+                message = ('Неверный ответ' if case.get('hidden')
+                           else f'Ожидалось {_short(expected)}, получено {_short(actual)}')
+        tests.append({'test': result.get('test'), 'ok': message is None, 'message': message,
+                      'ms': result.get('ms')})
+
+    passed_count = sum(test['ok'] for test in tests)
+    score = round(100 * passed_count / len(cases))
+    return passed_count == len(cases), score, {'tests': tests}
+
+
+def worker_command(config):
+    """Команда запуска grading_worker.py с изоляцией решений средствами ОС.
+
+    GRADING_SANDBOX_COMMAND - префикс внешней песочницы (bwrap, nsjail), в
+    которой процесс видит только интерпретатор и свой скрипт. Без неё процесс
+    запущенного от root приложения сам изолирует каждое решение (Linux):
+    пространства имён, chroot и пользователь GRADING_SANDBOX_UID/GID.
+    Возвращает (команда, None) или (None, причина, по которой проверка невозможна).
+    """
+    command = [sys.executable, '-I', WORKER_SCRIPT]
+    prefix = config.get('GRADING_SANDBOX_COMMAND', Config.GRADING_SANDBOX_COMMAND)
+    if prefix:
+        return shlex.split(prefix) + command, None
+    if not sys.platform.startswith('linux'):
+        return None, 'встроенная изоляция есть только в Linux, задайте GRADING_SANDBOX_COMMAND'
+    if os.geteuid() != 0:
+        return None, ('приложение запущено не от root: нельзя сменить пользователя и сделать chroot, '
+                      'задайте GRADING_SANDBOX_COMMAND')
+    uid = config.get('GRADING_SANDBOX_UID', Config.GRADING_SANDBOX_UID)
+    gid = config.get('GRADING_SANDBOX_GID', Config.GRADING_SANDBOX_GID)
+    if not uid or not gid:
+        return None, 'GRADING_SANDBOX_UID/GID не могут быть 0'
+    return command + ['--uid', str(uid), '--gid', str(gid)], None
+
+
+class WarmWorker:
+    """Долгоживущий процесс grading_worker.py; перезапускается после max_jobs решений"""
+
+    def __init__(self, command, max_jobs=500):
+        self.command = command
+        self.max_jobs = max_jobs
+        self.jobs = 0
+        self._process = None
+
+    def _start(self):
+        self.close()
+        self._process = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True, encoding='utf-8', bufsize=1)
+        self.jobs = 0
+
+    def run(self, job, timeout):
+        if self._process is None or self._process.poll() is not None or self.jobs >= self.max_jobs:
+            self._start()
+        try:
+            self._process.stdin.write(json.dumps(job, ensure_ascii=False) + '\n')
+            self._process.stdin.flush()
+            # Ответ на предыдущее задание уже прочитан, буфер пуст - select по дескриптору корректен
+            ready, _, _ = select.select([self._process.stdout], [], [], timeout)
+            line = self._process.stdout.readline() if ready else ''
+        except (OSError, ValueError):
+            line = ''
+        if not line:
+            self.close()
+            raise GradingError('Процесс проверки не ответил')
+        self.jobs += 1
+        return json.loads(line)
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+
+class GraderPool:
+    """workers тёплых процессов проверки; решения пачки проверяются параллельно"""
+
+    def __init__(self, command, workers=2, cpu_seconds=2, memory_mb=256, wall_seconds=5, max_jobs=500):
+        self.command = command
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.limits = {'cpu_seconds': cpu_seconds, 'memory_mb': memory_mb, 'wall_seconds': wall_seconds}
+        self._pid = None
+        self._lock = threading.Lock()
+        self.graded = 0
+        self.errors = 0
+
+    def _check_fork(self):
+        # Процессы и потоки пула не переживают fork - в новом процессе создаются заново
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = Queue()
+                for _ in range(self.workers):
+                    self._idle.put(WarmWorker(self.command, self.max_jobs))
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='grader')
+
+    def grade(self, submission):
+        """Проверка одного решения: (прошло ли, баллы, подробности).
+
+        Сбой проверки одного решения не прерывает пачку: решение получает
+        результат с ошибкой, остальные проверяются как обычно.
+        """
+        try:
+            return self._grade(submission)
+        except Exception as e:
+            self.errors += 1
+            return False, 0, {'error': _short(f'Ошибка проверки: {type(e).__name__}: {e}')}
+
+    def _grade(self, submission):
+        try:
+            function, cases = parse_test_cases(submission['test_cases'], submission['solution_template'])
+        except GradingError as e:
+            self.errors += 1
+            return False, 0, {'error': str(e)}
+
+        # Ожидаемые ответы в процесс с решением не передаются
+        job = {'id': submission['id'], 'code': submission['code'], 'function': function,
+               'cases': [{'args': case['args']} if 'args' in case else {'input': str(case.get('input', ''))}
+                         for case in cases],
+               **self.limits}
+        self._check_fork()
+        worker = self._idle.get()
+        try:
+            outcome = worker.run(job, timeout=self.limits['wall_seconds'] + 5)
+        except GradingError as e:
+            self.errors += 1
+            outcome = {'error': str(e)}
+        finally:
+            self._idle.put(worker)
+        self.graded += 1
+        return score_outcome(outcome, cases)
+
+    def grade_many(self, submissions):
+        self._check_fork()
+        return list(self._executor.map(self.grade, submissions))
+
+    def stats(self):
+        return {'workers': self.workers, 'graded': self.graded, 'errors': self.errors, **self.limits}
+
+
+class GradingService:
+    """Фоновая проверка решений из очереди challenge_submissions (status = 'queued').
+
+    Пачка до batch_size решений забирается одним UPDATE ... RETURNING, так что
+    несколько процессов приложения не проверяют одно решение дважды.
+    Результаты записываются одним executemany. Соединение с базой на время
+    проверки не удерживается.
+    """
+
+    def __init__(self, pool, batch_size=32, poll_interval=2.0, stale_seconds=300, max_attempts=3, logger=None):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.logger = logger
+        self._event = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._checked_pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def _claim(self, conn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Решения, оставшиеся в 'running' после сбоя процесса, возвращаются в очередь.
+            # Решение, на котором проверка падала max_attempts раз, больше не берётся:
+            # иначе оно возвращалось бы в начало очереди и задерживало остальные
+            stale = (f'-{int(self.stale_seconds)} seconds',)
+            conn.execute('''
+                UPDATE challenge_submissions
+                SET status = 'failed', passed = 0, score = 0, graded_at = CURRENT_TIMESTAMP,
+                    result = json_object('error', 'Проверка решения не завершилась')
+                WHERE status = 'running' AND started_at < datetime('now', ?) AND attempts >= ?
+            ''', stale + (self.max_attempts,))
+            conn.execute('''
+                UPDATE challenge_submissions SET status = 'queued'
+                WHERE status = 'running' AND started_at < datetime('now', ?)
+            ''', stale)
+            ids = [row[0] for row in conn.execute('''
+                UPDATE challenge_submissions
+                SET status = 'running', started_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+                WHERE id IN (SELECT id FROM challenge_submissions WHERE status = 'queued' ORDER BY id LIMIT ?)
+                RETURNING id
+            ''', (self.batch_size,))]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if not ids:
+            return []
+        return [dict(row) for row in conn.execute('''
+            SELECT s.id, s.code, c.test_cases, c.solution_template
+            FROM challenge_submissions s
+            JOIN challenges c ON c.id = s.challenge_id
+            WHERE s.id IN (SELECT value FROM json_each(?))
+            ORDER BY s.id
+        ''', (json.dumps(ids),))]
+
+    def run_once(self):
+        """Одна пачка: забрать, проверить, записать. Возвращает число проверенных решений"""
+        with get_db_connection() as conn:
+            batch = self._claim(conn)
+        if not batch:
+            return 0
+
+        results = self.pool.grade_many(batch)
+        rows = [(1 if passed else 0, score, json.dumps(details, ensure_ascii=False), submission['id'])
+                for submission, (passed, score, details) in zip(batch, results)]
+        with get_db_connection() as conn:
+            conn.executemany('''
+                UPDATE challenge_submissions
+                SET status = 'graded', passed = ?, score = ?, result = ?, graded_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', rows)
+            conn.commit()
+        self.batches += 1
+        return len(rows)
+
+    def _run(self):
+        while True:
+            try:
+                if self.run_once() >= self.batch_size:
+                    continue
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Ошибка проверки решений')
+            self._event.wait(self.poll_interval)
+            self._event.clear()
+
+    def wake(self):
+        """Разбудить проверку (после новых решений); поток запускается в каждом процессе при первом вызове"""
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread_pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='challenge-grader', daemon=True)
+                self._thread.start()
+        self._event.set()
+
+    def ensure(self):
+        """Проверка очереди при первом запросе в процессе (before_request).
+
+        Как и исполнители заданий (modules/jobs.py), поток не запускается при
+        создании приложения, чтобы не оказаться в мастере gunicorn, а воркер,
+        перезапущенный по max_requests, подхватывает оставшиеся решения.
+        """
+        if self._checked_pid == os.getpid():
+            return
+        with get_db_connection() as conn:
+            pending = conn.execute(
+                "SELECT 1 FROM challenge_submissions WHERE status IN ('queued', 'running') LIMIT 1").fetchone()
+        self._checked_pid = os.getpid()
+        if pending:
+            self.wake()
+
+    def stats(self):
+        return {'batches': self.batches, **self.pool.stats()}
+
+
+_service = None
+
+
+def init_app(app):
+    """Служба проверки решений по настройкам приложения (GRADING_ENABLED)"""
+    global _service
+    if not app.config.get('GRADING_ENABLED', Config.GRADING_ENABLED) or not GRADING_SUPPORTED:
+        _service = None
+        return None
+    # Без изоляции средствами ОС решения не выполняются: отправка отвечает 503
+    command, problem = worker_command(app.config)
+    if command is None:
+        app.logger.error('Проверка решений отключена: %s', problem)
+        _service = None
+        return None
+    pool = GraderPool(
+        command,
+        workers=app.config.get('GRADING_WORKERS', Config.GRADING_WORKERS),
+        cpu_seconds=app.config.get('GRADING_CPU_SECONDS', Config.GRADING_CPU_SECONDS),
+        memory_mb=app.config.get('GRADING_MEMORY_MB', Config.GRADING_MEMORY_MB),
+        wall_seconds=app.config.get('GRADING_WALL_SECONDS', Config.GRADING_WALL_SECONDS),
+        max_jobs=app.config.get('GRADING_WORKER_MAX_JOBS', Config.GRADING_WORKER_MAX_JOBS),
+    )
+    _service = GradingService(
+        pool,
+        batch_size=app.config.get('GRADING_BATCH_SIZE', Config.GRADING_BATCH_SIZE),
+        poll_interval=app.config.get('GRADING_POLL_INTERVAL', Config.GRADING_POLL_INTERVAL),
+        max_attempts=app.config.get('GRADING_MAX_ATTEMPTS', Config.GRADING_MAX_ATTEMPTS),
+        logger=app.logger,
+    )
+    app.extensions['grading'] = _service
+    # Решения, оставшиеся в очереди после перезапуска, подхватываются с первым запросом в процессе
+    app.before_request(_service.ensure)
+    return _service
+
+
+def get_service():
+    return _service
+
+
+def wake_grader():
+    if _service is not None:
+        _service.wake()
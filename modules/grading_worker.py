@@ -0,0 +1,290 @@
+"""Процесс проверки решений задач (запускается modules/grading.py).
+
+Читает задания из stdin по одному JSON в строке и отвечает JSON-строкой
+в stdout: результат и вывод решения на каждом тесте. Процесс живёт долго
+("тёплый"): интерпретатор и стандартные модули загружены один раз, а
+каждое решение выполняется в дочернем процессе (fork).
+
+Граница безопасности - изоляция средствами ОС. С --uid/--gid (процесс
+запущен от root, Linux) дочерний процесс до запуска решения:
+
+- получает собственные сетевое и IPC-пространства имён - сети нет;
+- делает chroot в пустую удалённую папку - файлы приложения и база не видны;
+- закрывает все дескрипторы, кроме канала результата;
+- становится непривилегированным пользователем без возможности вернуть
+  права (setgroups/setgid/setuid и PR_SET_NO_NEW_PRIVS).
+
+Без --uid процесс должен быть уже запущен во внешней песочнице
+(GRADING_SANDBOX_COMMAND, например bwrap или nsjail). Сверх этого:
+
+- RLIMIT_CPU, RLIMIT_AS - время процессора и память;
+- RLIMIT_NPROC, RLIMIT_FSIZE - нельзя запускать процессы и писать в файлы;
+- audit-хук (PEP 578) запрещает сокеты, открытие файлов, запуск программ,
+  ctypes и импорт модулей, не загруженных заранее. Это второй рубеж, а не
+  граница: хук не отключается, но обходится кодом на уровне интерпретатора;
+- время по часам ограничивает родитель: по истечении дочерний процесс убивается.
+
+Запускается как python -I: без переменных окружения, user site и текущей
+папки в sys.path.
+"""
+import io
+import json
+import os
+import resource
+import select
+import signal
+import sys
+import time
+import traceback
+
+# Модули, доступные решениям: загружаются до fork, новые импорты запрещены
+PRELOADED_MODULES = ['math', 'cmath', 'itertools', 'functools', 'collections', 'heapq', 'bisect',
+                     'string', 're', 'random', 'statistics', 'decimal', 'fractions', 'datetime',
+                     'json', 'copy', 'operator', 'array', 'typing', 'dataclasses', 'enum']
+for _name in PRELOADED_MODULES:
+    __import__(_name)
+
+# События аудита, запрещённые внутри решения (точное имя или префикс с точкой)
+BLOCKED_EVENTS = ('open', 'socket.', 'subprocess.', 'os.system', 'os.exec', 'os.posix_spawn', 'os.spawn',
+                  'os.fork', 'os.forkpty', 'os.kill', 'os.killpg', 'os.remove', 'os.rename', 'os.rmdir',
+                  'os.mkdir', 'os.chmod', 'os.chown', 'os.link', 'os.symlink', 'os.truncate', 'os.listdir',
+                  'os.scandir', 'os.chdir', 'os.putenv', 'os.unsetenv', 'ctypes.', 'mmap.', 'shutil.',
+                  'sys.addaudithook', 'code.__new__',
+                  'sqlite3.', 'urllib.', 'ftplib.', 'smtplib.', 'http.', 'webbrowser.', 'signal.')
+
+MAX_OUTPUT = 64 * 1024  # символов вывода решения на один тест
+MAX_MESSAGE = 500  # символов сообщения об ошибке в результате
+
+
+class SandboxViolation(Exception):
+    pass
+
+
+class _LimitedOutput(io.StringIO):
+    def write(self, text):
+        if self.tell() + len(text) > MAX_OUTPUT:
+            raise SandboxViolation('Слишком большой вывод')
+        return super().write(text)
+
+
+def _audit_hook():
+    # Списки копируются в замыкание: глобальные имена модуля решению доступны через кадры
+    blocked = frozenset(BLOCKED_EVENTS)
+    prefixes = tuple(event for event in BLOCKED_EVENTS if event.endswith('.'))
+    modules = sys.modules
+
+    def hook(event, args):
+        if event == 'import' and args[0] not in modules:
+            raise SandboxViolation(f'Импорт модуля {args[0]} запрещён')
+        if event in blocked or event.startswith(prefixes):
+            raise SandboxViolation(f'Операция запрещена: {event}')
+    return hook
+
+
+# Изоляция дочерних процессов средствами ОС (main с --uid/--gid); None - внешняя песочница
+_sandbox = None
+
+CLONE_NEWNET = 0x40000000
+CLONE_NEWIPC = 0x08000000
+PR_SET_NO_NEW_PRIVS = 38
+
+
+def _prepare_sandbox(uid, gid):
+    """Пустой корень для chroot и libc для unshare/prctl - до первого fork.
+
+    Папка сразу удаляется, остаётся только открытый дескриптор: в удалённой
+    папке нельзя создать файлы, а после завершения процесса убирать нечего.
+    """
+    import ctypes
+    import tempfile
+    root = tempfile.mkdtemp(prefix='grading-root-')
+    root_fd = os.open(root, os.O_RDONLY | os.O_DIRECTORY)
+    os.rmdir(root)
+    return {'uid': uid, 'gid': gid, 'root_fd': root_fd,
+            'libc': ctypes.CDLL(None, use_errno=True), 'get_errno': ctypes.get_errno}
+
+
+def _isolate(sandbox):
+    libc = sandbox['libc']
+    if libc.unshare(CLONE_NEWNET | CLONE_NEWIPC) != 0:
+        raise OSError(sandbox['get_errno'](), 'unshare: нет отдельного сетевого пространства имён')
+    os.fchdir(sandbox['root_fd'])
+    os.chroot('.')
+    os.chdir('/')
+    os.close(sandbox['root_fd'])
+    os.setgroups([])
+    os.setgid(sandbox['gid'])
+    os.setuid(sandbox['uid'])
+    if libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0:
+        raise OSError(sandbox['get_errno'](), 'prctl(PR_SET_NO_NEW_PRIVS)')
+    if os.getuid() == 0 or os.geteuid() == 0:
+        raise OSError('Права root не сброшены')
+
+
+def _close_fds(keep):
+    # Наследованные дескрипторы (каналы с приложением и т.п.) решению недоступны
+    start = 3
+    for fd in sorted(keep):
+        os.closerange(start, fd)
+        start = fd + 1
+    os.closerange(start, os.sysconf('SC_OPEN_MAX'))
+
+
+def _apply_limits(job):
+    cpu = max(1, int(job['cpu_seconds']))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    memory = int(job['memory_mb']) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _short(value):
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_MESSAGE else text[:MAX_MESSAGE] + '…'
+
+
+def _jsonable(value):
+    # Кортежи и множества сравниваются со списками из JSON; прочее - через repr
+    if isinstance(value, (tuple, set, frozenset)):
+        value = list(value) if isinstance(value, tuple) else sorted(value, key=repr)
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return {'repr': _short(value)}
+
+
+def _run_tests(job, code):
+    """Выполнение тестов в дочернем процессе (ограничения уже действуют).
+
+    Ожидаемые ответы сюда не передаются: решение могло бы их прочитать,
+    поэтому сравнение выполняет modules/grading.py.
+    """
+    results = []
+    namespace = None
+    for index, case in enumerate(job['cases']):
+        started = time.perf_counter()
+        stdout = _LimitedOutput()
+        sys.stdout = stdout
+        sys.stdin = io.StringIO(case.get('input', ''))
+        result = {'test': index + 1}
+        try:
+            if 'args' in case:
+                # Решение с функцией выполняется один раз, функция вызывается на каждый тест
+                if namespace is None:
+                    namespace = {'__name__': '__solution__', '__builtins__': __builtins__}
+                    try:
+                        exec(code, namespace)
+                    except BaseException as e:
+                        # Ошибка при загрузке решения - одна и та же для всех тестов
+                        namespace = e
+                if isinstance(namespace, BaseException):
+                    raise namespace
+                function = namespace.get(job['function'])
+                if not callable(function):
+                    raise SandboxViolation(f'Функция {job["function"]} не найдена')
+                result['value'] = _jsonable(function(*case['args']))
+            else:
+                exec(code, {'__name__': '__main__', '__builtins__': __builtins__})
+                result['stdout'] = stdout.getvalue()
+        except SandboxViolation as e:
+            result['error'] = str(e)
+        except MemoryError:
+            result['error'] = 'Превышен лимит памяти'
+        except RecursionError:
+            result['error'] = 'Слишком глубокая рекурсия'
+        except BaseException as e:
+            result['error'] = _short(''.join(traceback.format_exception_only(type(e), e)).strip())
+        result['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        results.append(result)
+    return results
+
+
+def _child(job, write_fd):
+    # Дескрипторы протокола с родителем решению недоступны
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:
+        code = compile(job['code'], '<solution>', 'exec')
+        if _sandbox is not None:
+            _close_fds({write_fd, _sandbox['root_fd']})
+            try:
+                _isolate(_sandbox)
+            except OSError as e:
+                # Без изоляции решение не запускается
+                raise SandboxViolation(f'Песочница недоступна: {e}')
+        _apply_limits(job)
+        # Хук не снимается до конца процесса: результат пишется через os.write, не аудируемый
+        sys.addaudithook(_audit_hook())
+        outcome = {'tests': _run_tests(job, code)}
+    except SyntaxError as e:
+        outcome = {'error': f'Синтаксическая ошибка: строка {e.lineno}: {e.msg}'}
+    except BaseException as e:
+        outcome = {'error': _short(f'{type(e).__name__}: {e}')}
+    data = json.dumps(outcome, ensure_ascii=False).encode('utf-8')
+    while data:
+        data = data[os.write(write_fd, data):]
+    os._exit(0)
+
+
+def grade(job):
+    """Одно решение: fork, выполнение тестов, ожидание с ограничением по часам"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _child(job, write_fd)
+    os.close(write_fd)
+
+    deadline = time.monotonic() + float(job['wall_seconds'])
+    chunks, timed_out = [], False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+
+    if timed_out:
+        return {'error': 'Превышено время выполнения'}
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        if signum in (signal.SIGXCPU, signal.SIGKILL):
+            return {'error': 'Превышено время процессора'}
+        return {'error': f'Процесс решения завершён сигналом {signal.Signals(signum).name}'}
+    try:
+        return json.loads(b''.join(chunks).decode('utf-8'))
+    except ValueError:
+        return {'error': 'Решение завершилось без результата (возможно, превышен лимит памяти)'}
+
+
+def main():
+    global _sandbox
+    # --uid N --gid N: изоляция дочерних процессов средствами ОС (нужны root и Linux)
+    options = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    if '--uid' in options:
+        _sandbox = _prepare_sandbox(int(options['--uid']), int(options.get('--gid', options['--uid'])))
+    for line in sys.stdin:
+        job = json.loads(line)
+        result = grade(job)
+        result['id'] = job['id']
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
 import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .search import fts_query, match_ids
+from .page_cache import cached_page, bump
+from .schedule import ScheduleError, parse_schedule, format_schedule
 
 groups_bp = Blueprint('groups', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -25,22 +19,37 @@ def login_required(f):
 
 @groups_bp.route('/groups')
 @login_required
+@cached_page('groups', 'courses', 'users', 'student_groups')
 def list_groups():
+    search = request.args.get('q', '').strip()
+    query = fts_query(search)
+    
     try:
         with get_db_connection() as conn:
-            groups = conn.execute('''
-                SELECT g.*, c.title as course_title, u.full_name as teacher_name,
-                       COUNT(sg.id) as student_count
-                FROM groups g
-                JOIN courses c ON g.course_id = c.id
-                JOIN users u ON g.teacher_id = u.id
-                LEFT JOIN student_groups sg ON g.id = sg.group_id AND sg.completion_status = 'studying'
-                WHERE g.status = 'active'
-                GROUP BY g.id
-                ORDER BY g.start_date DESC
-            ''').fetchall()
+            if query:
+                groups = conn.execute(f'''
+                    SELECT g.*, c.title as course_title, u.full_name as teacher_name,
+                           (SELECT COUNT(*) FROM student_groups sg
+                            WHERE sg.group_id = g.id AND sg.completion_status = 'studying') as student_count
+                    FROM groups g
+                    JOIN courses c ON g.course_id = c.id
+                    JOIN users u ON g.teacher_id = u.id
+                    WHERE g.status = 'active' AND g.id IN ({match_ids('groups')})
+                    ORDER BY g.start_date DESC
+                ''', (query,)).fetchall()
+            else:
+                groups = conn.execute('''
+                    SELECT g.*, c.title as course_title, u.full_name as teacher_name,
+                           (SELECT COUNT(*) FROM student_groups sg
+                            WHERE sg.group_id = g.id AND sg.completion_status = 'studying') as student_count
+                    FROM groups g
+                    JOIN courses c ON g.course_id = c.id
+                    JOIN users u ON g.teacher_id = u.id
+                    WHERE g.status = 'active'
+                    ORDER BY g.start_date DESC
+                ''').fetchall()
             
-        return render_template('groups/list.html', groups=groups)
+        return render_template('groups/list.html', groups=groups, search=search)
         
     except Exception as e:
         flash('Ошибка загрузки списка групп', 'error')
@@ -60,6 +69,10 @@ def add_group():
                 'end_date': request.form.get('end_date'),
                 'classroom': request.form.get('classroom')
             }
+            # Расписание хранится в канонической записи, пригодной для создания занятий
+            if group_data['schedule']:
+                group_data['schedule'] = format_schedule(parse_schedule(
+                    group_data['schedule'], current_app.config.get('LESSON_DURATION_MINUTES', 90)))
             
             with get_db_connection() as conn:
                 conn.execute('''
@@ -68,10 +81,13 @@ def add_group():
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', tuple(group_data.values()))
                 conn.commit()
+            bump('groups')
                 
             flash('Группа успешно создана', 'success')
             return redirect(url_for('groups.list_groups'))
             
+        except ScheduleError as e:
+            flash(f'Некорректное расписание: {e}', 'error')
         except sqlite3.IntegrityError:
             flash('Группа с таким кодом уже существует', 'error')
         except Exception as e:
@@ -0,0 +1,368 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from flask import Blueprint, flash, jsonify, redirect, request, session, url_for
+
+from config import Config
+from .db import get_db_connection
+
+jobs_bp = Blueprint('jobs', __name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+# Обработчики заданий по типу: handler(conn, payload) -> результат, сериализуемый в JSON
+_handlers = {}
+
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def job_handler(kind):
+    """Регистрация обработчика заданий типа kind"""
+    def decorator(f):
+        _handlers[kind] = f
+        return f
+    return decorator
+
+
+def job_kinds():
+    return sorted(_handlers)
+
+
+def dedup_key_for(kind, payload):
+    return f'{kind}:{json.dumps(payload, sort_keys=True, ensure_ascii=False)}'
+
+
+def enqueue(conn, kind, payload=None, priority=0, delay=0, dedup=True, max_attempts=None):
+    """Добавить задание в очередь; возвращает (id задания, создано ли новое).
+
+    Если такое же задание (тип и параметры) уже ждёт в очереди, новое не
+    создаётся: у ожидающего повышается приоритет и срок запуска сдвигается
+    на более ранний. Соединение не должно быть внутри транзакции.
+    """
+    payload = payload or {}
+    dedup_key = dedup_key_for(kind, payload) if dedup else None
+    run_after = f'+{max(0, int(delay))} seconds'
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        existing = conn.execute(
+            "SELECT id FROM jobs WHERE dedup_key = ? AND status = 'queued'", (dedup_key,)
+        ).fetchone() if dedup_key else None
+        if existing:
+            conn.execute('''
+                UPDATE jobs SET priority = MAX(priority, ?), run_after = MIN(run_after, datetime('now', ?))
+                WHERE id = ?
+            ''', (priority, run_after, existing['id']))
+            job_id, created = existing['id'], False
+        else:
+            job_id = conn.execute('''
+                INSERT INTO jobs (kind, payload, dedup_key, priority, max_attempts, run_after)
+                VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+                RETURNING id
+            ''', (kind, json.dumps(payload, ensure_ascii=False), dedup_key, priority,
+                  max_attempts or Config.JOBS_MAX_ATTEMPTS, run_after)).fetchone()[0]
+            created = True
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return job_id, created
+
+
+def _requeue(conn, job_id, delay, error):
+    try:
+        conn.execute('''
+            UPDATE jobs SET status = 'queued', run_after = datetime('now', ?), error = ? WHERE id = ?
+        ''', (f'+{int(delay)} seconds', error, job_id))
+    except sqlite3.IntegrityError:
+        # Такое же задание уже ждёт в очереди - повтор выполнит оно
+        conn.execute('''
+            UPDATE jobs SET status = 'failed', finished_at = CURRENT_TIMESTAMP, error = ? WHERE id = ?
+        ''', (f'{error} (повтор объединён с заданием в очереди)', job_id))
+
+
+class JobRunner:
+    """Потоки-исполнители заданий из таблицы jobs.
+
+    Каждый поток забирает одно задание с наибольшим приоритетом одним
+    UPDATE ... RETURNING, поэтому несколько процессов приложения не выполняют
+    его дважды. Ошибка возвращает задание в очередь с паузой, растущей вдвое
+    с каждой попыткой, до max_attempts; затем оно помечается 'failed'.
+    Задания, оставшиеся в 'running' после падения процесса, через
+    stale_seconds возвращаются в очередь.
+    """
+
+    def __init__(self, workers=2, poll_interval=2.0, retry_backoff=30, retry_backoff_max=3600,
+                 stale_seconds=900, logger=None):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.stale_seconds = stale_seconds
+        self.logger = logger
+        self._event = threading.Event()
+        self._threads = []
+        self._threads_pid = None
+        self._checked_pid = None
+        self._lock = threading.Lock()
+        self._stale_checked = 0.0
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+
+    def backoff(self, attempts):
+        return min(self.retry_backoff_max, self.retry_backoff * 2 ** max(0, attempts - 1))
+
+    def _requeue_stale(self, conn):
+        if time.monotonic() - self._stale_checked < min(60, self.stale_seconds):
+            return
+        self._stale_checked = time.monotonic()
+        stale = conn.execute('''
+            SELECT id, attempts, max_attempts FROM jobs
+            WHERE status = 'running' AND started_at < datetime('now', ?)
+        ''', (f'-{int(self.stale_seconds)} seconds',)).fetchall()
+        for job in stale:
+            if job['attempts'] < job['max_attempts']:
+                _requeue(conn, job['id'], 0, 'Процесс-исполнитель не завершил задание')
+            else:
+                conn.execute('''
+                    UPDATE jobs SET status = 'failed', finished_at = CURRENT_TIMESTAMP,
+                                    error = 'Процесс-исполнитель не завершил задание'
+                    WHERE id = ?
+                ''', (job['id'],))
+
+    def _claim(self, conn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._requeue_stale(conn)
+            job = conn.execute('''
+                UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+                WHERE id = (SELECT id FROM jobs
+                            WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+                            ORDER BY priority DESC, run_after, id LIMIT 1)
+                RETURNING id, kind, payload, attempts, max_attempts
+            ''').fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return dict(job) if job else None
+
+    def _execute(self, job):
+        handler = _handlers.get(job['kind'])
+        try:
+            if handler is None:
+                raise LookupError(f'Неизвестный тип задания: {job["kind"]}')
+            with get_db_connection() as conn:
+                result = handler(conn, json.loads(job['payload']))
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            if self.logger:
+                self.logger.warning('Задание %s (%s) завершилось ошибкой: %s', job['id'], job['kind'], error)
+            with get_db_connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                if handler is not None and job['attempts'] < job['max_attempts']:
+                    _requeue(conn, job['id'], self.backoff(job['attempts']), error)
+                    self.retried += 1
+                else:
+                    conn.execute('''
+                        UPDATE jobs SET status = 'failed', finished_at = CURRENT_TIMESTAMP, error = ? WHERE id = ?
+                    ''', (error, job['id']))
+                    self.failed += 1
+                conn.commit()
+            return False
+
+        with get_db_connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP, result = ?, error = NULL
+                WHERE id = ?
+            ''', (json.dumps(result, ensure_ascii=False, default=str), job['id']))
+            conn.commit()
+        self.done += 1
+        return True
+
+    def run_once(self):
+        """Выполнить одно задание из очереди; False - очередь пуста"""
+        with get_db_connection() as conn:
+            job = self._claim(conn)
+        if job is None:
+            return False
+        self._execute(job)
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self.run_once():
+                    continue
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Ошибка выполнения фоновых заданий')
+            self._event.wait(self.poll_interval)
+            self._event.clear()
+
+    def wake(self):
+        """Разбудить исполнителей; потоки запускаются в каждом процессе при первом вызове"""
+        with self._lock:
+            if self._threads_pid != os.getpid() or not all(thread.is_alive() for thread in self._threads):
+                self._threads_pid = os.getpid()
+                self._threads = [threading.Thread(target=self._run, name=f'job-runner-{number}', daemon=True)
+                                 for number in range(self.workers)]
+                for thread in self._threads:
+                    thread.start()
+        self._event.set()
+
+    def ensure(self):
+        """Проверка очереди при первом запросе в процессе (before_request).
+
+        Потоки не запускаются при создании приложения: с preload_app оно
+        создаётся в мастере gunicorn, где запросы не обрабатываются. Каждый
+        воркер, в том числе перезапущенный по max_requests, сам подхватывает
+        задания, оставшиеся в очереди.
+        """
+        if self._checked_pid == os.getpid():
+            return
+        with get_db_connection() as conn:
+            pending = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone()
+        self._checked_pid = os.getpid()
+        if pending:
+            self.wake()
+
+    def stats(self):
+        return {'workers': self.workers, 'done': self.done, 'failed': self.failed, 'retried': self.retried,
+                'kinds': job_kinds()}
+
+
+def prune_jobs(conn, keep_days):
+    """Удаление выполненных и неудачных заданий старше keep_days дней"""
+    deleted = conn.execute('''
+        DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)
+    ''', (f'-{int(keep_days)} days',)).rowcount
+    conn.commit()
+    return deleted
+
+
+_runner = None
+
+
+def init_app(app):
+    """Исполнители фоновых заданий по настройкам приложения (JOBS_ENABLED)"""
+    global _runner
+    if not app.config.get('JOBS_ENABLED', Config.JOBS_ENABLED):
+        _runner = None
+        return None
+    _runner = JobRunner(
+        workers=app.config.get('JOBS_WORKERS', Config.JOBS_WORKERS),
+        poll_interval=app.config.get('JOBS_POLL_INTERVAL', Config.JOBS_POLL_INTERVAL),
+        retry_backoff=app.config.get('JOBS_RETRY_BACKOFF', Config.JOBS_RETRY_BACKOFF),
+        retry_backoff_max=app.config.get('JOBS_RETRY_BACKOFF_MAX', Config.JOBS_RETRY_BACKOFF_MAX),
+        stale_seconds=app.config.get('JOBS_STALE_SECONDS', Config.JOBS_STALE_SECONDS),
+        logger=app.logger,
+    )
+    app.extensions['jobs'] = _runner
+    # Задания, оставшиеся после перезапуска, подхватываются с первым запросом в процессе
+    app.before_request(_runner.ensure)
+    return _runner
+
+
+def get_runner():
+    return _runner
+
+
+def submit(conn, kind, payload=None, priority=0, **kwargs):
+    """enqueue и пробуждение исполнителей этого процесса"""
+    job_id, created = enqueue(conn, kind, payload, priority, **kwargs)
+    if _runner is not None:
+        _runner.wake()
+    return job_id, created
+
+
+def _job_dict(row):
+    job = dict(row)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    if 'result' in job:
+        job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+@jobs_bp.route('/jobs')
+@login_required
+def list_jobs():
+    statuses = [status for status in request.args.get('status', 'queued,running,failed').split(',')
+                if status in JOB_STATUSES]
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    with get_db_connection() as conn:
+        counts = {row['status']: row['count'] for row in conn.execute(
+            'SELECT status, COUNT(*) AS count FROM jobs GROUP BY status')}
+        jobs = conn.execute('''
+            SELECT id, kind, payload, priority, status, attempts, max_attempts, run_after,
+                   created_at, started_at, finished_at, error
+            FROM jobs
+            WHERE status IN (SELECT value FROM json_each(?))
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (json.dumps(statuses), limit)).fetchall()
+    return jsonify({'counts': {status: counts.get(status, 0) for status in JOB_STATUSES},
+                    'jobs': [_job_dict(job) for job in jobs],
+                    'runner': _runner.stats() if _runner else None})
+
+
+@jobs_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(_job_dict(job))
+
+
+@jobs_bp.route('/jobs', methods=['POST'])
+@login_required
+def create_job():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    payload = data.get('payload') or {}
+    if kind not in _handlers:
+        return jsonify({'error': 'Неизвестный тип задания', 'kinds': job_kinds()}), 400
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'payload должен быть объектом'}), 400
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority должен быть целым числом'}), 400
+
+    with get_db_connection() as conn:
+        job_id, created = submit(conn, kind, payload, priority)
+    return jsonify({'job_id': job_id, 'created': created}), 202
+
+
+@jobs_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_job(job_id):
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT kind, payload, priority, dedup_key, status FROM jobs WHERE id = ?',
+                           (job_id,)).fetchone()
+        if not job:
+            return jsonify({'error': 'Задание не найдено'}), 404
+        if job['status'] != 'failed':
+            return jsonify({'error': 'Повторить можно только неудачное задание'}), 400
+        new_id, created = submit(conn, job['kind'], json.loads(job['payload']), job['priority'],
+                                 dedup=job['dedup_key'] is not None)
+    return jsonify({'job_id': new_id, 'created': created}), 202
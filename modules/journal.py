@@ -1,17 +1,26 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify
+import re
 import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .levels import recalculate_levels
+from .achievement_engine import record_journal
+from .page_cache import bump
+from .export import ExportError, export_response
+from .gradebook import BEHAVIORS, PARTICIPATIONS, load_gradebook
+from .jobs import submit
 
 journal_bp = Blueprint('journal', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+GRADE_FIELDS = ('grade', 'behavior', 'participation', 'comments', 'exp_earned')
+_FORM_FIELD_RE = re.compile(r'^grades-(\d+)-(\w+)$')
+
+
+class GradesError(Exception):
+    """Ошибки в переданных оценках: errors - список {'student_id', 'error'}"""
+
+    def __init__(self, errors):
+        super().__init__('Некорректные данные оценок')
+        self.errors = errors
 
 def login_required(f):
     from functools import wraps
@@ -45,17 +54,289 @@ def journal_main():
                     WHERE sg.group_id = ? AND sg.completion_status = 'studying'
                     ORDER BY s.full_name
                 ''', (group_id,)).fetchall()
+                # Ведомость студенты × занятия из кэша по версии журнала группы
+                gradebook = load_gradebook(conn, group_id)
                 
                 return render_template('journal/journal.html', 
                                      groups=groups, 
                                      selected_group=group_id,
-                                     students=students)
+                                     students=students,
+                                     gradebook=gradebook)
             else:
                 return render_template('journal/journal.html', 
                                      groups=groups, 
                                      selected_group=None,
-                                     students=[])
+                                     students=[],
+                                     gradebook=None)
                              
     except Exception as e:
         flash('Ошибка загрузки журнала', 'error')
-        return render_template('journal/journal.html', groups=[], students=[])
\ No newline at end of file
+        return render_template('journal/journal.html', groups=[], students=[], gradebook=None)
+
+@journal_bp.route('/journal/groups/<int:group_id>/gradebook')
+@login_required
+def group_gradebook(group_id):
+    """Ведомость группы в JSON; ETag - версия журнала группы"""
+    with get_db_connection() as conn:
+        if not conn.execute('SELECT 1 FROM groups WHERE id = ?', (group_id,)).fetchone():
+            return jsonify({'error': 'Группа не найдена'}), 404
+        gradebook = load_gradebook(conn, group_id)
+    etag = f'gradebook-{group_id}-{gradebook.version}'
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    response = jsonify(gradebook.to_dict())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+JOURNAL_EXPORT_COLUMNS = [
+    ('Дата', 'lesson_date'), ('Время', 'start_time'), ('Занятие', 'lesson_number'), ('Тема', 'lesson_title'),
+    ('Код', 'student_code'), ('Студент', 'student_name'), ('Оценка', 'grade'), ('Поведение', 'behavior'),
+    ('Участие', 'participation'), ('Опыт', 'exp_earned'), ('Комментарий', 'comments'),
+]
+
+@journal_bp.route('/journal/export')
+@login_required
+def export_journal():
+    """Журнал группы за период, построчно по занятиям и студентам"""
+    group_id = request.args.get('group_id', type=int)
+    if not group_id:
+        flash('Выберите группу для выгрузки журнала', 'error')
+        return redirect(url_for('journal.journal_main'))
+    
+    conditions, params = ['l.group_id = ?'], [group_id]
+    if request.args.get('date_from'):
+        conditions.append('l.lesson_date >= ?')
+        params.append(request.args['date_from'])
+    if request.args.get('date_to'):
+        conditions.append('l.lesson_date <= ?')
+        params.append(request.args['date_to'])
+    
+    try:
+        return export_response(request.args.get('format', 'csv'), f'journal_group_{group_id}',
+                               JOURNAL_EXPORT_COLUMNS, f'''
+            SELECT l.lesson_date, l.start_time, l.lesson_number, l.title as lesson_title,
+                   s.student_code, s.full_name as student_name,
+                   j.grade, j.behavior, j.participation, j.exp_earned, j.comments
+            FROM lessons l
+            JOIN journal j ON j.lesson_id = l.id
+            JOIN students s ON s.id = j.student_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY l.lesson_date, l.start_time, l.id, s.full_name
+        ''', params)
+    except ExportError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('journal.journal_main', group_id=group_id))
+
+def parse_grades_payload():
+    """Оценки занятия из JSON ({"grades": [...]}) или формы (grades-<student_id>-<поле>)"""
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        entries = payload.get('grades', payload) if isinstance(payload, dict) else payload
+        return entries if isinstance(entries, list) else []
+
+    entries = {}
+    for key, value in request.form.items():
+        match = _FORM_FIELD_RE.match(key)
+        if match and match.group(2) in GRADE_FIELDS:
+            student_id = int(match.group(1))
+            entries.setdefault(student_id, {'student_id': student_id})[match.group(2)] = value
+    return list(entries.values())
+
+
+def _clean_entry(entry):
+    def optional_int(value):
+        if value is None or value == '':
+            return None
+        # int() молча превратил бы true в 1, а 4.7 в 4
+        if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+            raise ValueError(f'Некорректное число: {value}')
+        try:
+            number = int(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f'Некорректное число: {value}')
+        if not -2 ** 63 <= number < 2 ** 63:
+            raise ValueError(f'Некорректное число: {value}')
+        return number
+
+    def choice(field, allowed, default):
+        value = entry.get(field)
+        if value is None or value == '':
+            return default
+        if value not in allowed:
+            raise ValueError(f'Некорректное значение {field}: {value}')
+        return value
+
+    if not isinstance(entry, dict) or entry.get('student_id') in (None, ''):
+        raise ValueError('Не указан студент')
+    grade = optional_int(entry.get('grade'))
+    if grade is not None and not 1 <= grade <= 5:
+        raise ValueError('Оценка должна быть от 1 до 5')
+    exp_earned = optional_int(entry.get('exp_earned')) or 0
+    if exp_earned < 0:
+        raise ValueError('Опыт не может быть отрицательным')
+
+    comments = entry.get('comments')
+    if comments is not None and not isinstance(comments, str):
+        raise ValueError('Комментарий должен быть строкой')
+
+    return (optional_int(entry['student_id']), grade,
+            choice('behavior', BEHAVIORS, 'good'),
+            choice('participation', PARTICIPATIONS, 'active'),
+            comments or None,
+            exp_earned)
+
+
+def save_lesson_grades(conn, lesson_id, entries):
+    """Сохранение оценок всего занятия одной транзакцией.
+
+    Строки journal вставляются или обновляются через executemany, изменения
+    exp_earned сразу переносятся в student_groups.current_exp и
+    students.total_exp. Возвращает сводку с id студентов, чей опыт изменился.
+    """
+    rows, errors = [], []
+    for index, entry in enumerate(entries):
+        try:
+            rows.append(_clean_entry(entry))
+        except ValueError as e:
+            errors.append({'index': index,
+                           'student_id': entry.get('student_id') if isinstance(entry, dict) else None,
+                           'error': str(e)})
+    if errors:
+        raise GradesError(errors)
+    if not rows:
+        raise GradesError([{'error': 'Нет оценок для сохранения'}])
+    # Повтор студента дважды применил бы разницу опыта
+    seen, duplicates = set(), []
+    for row in rows:
+        if row[0] in seen and row[0] not in duplicates:
+            duplicates.append(row[0])
+        seen.add(row[0])
+    if duplicates:
+        raise GradesError([{'student_id': student_id, 'error': 'Студент указан несколько раз'}
+                           for student_id in duplicates])
+
+    # Блокировка на запись до чтения старых значений: параллельное
+    # сохранение того же занятия не потеряет изменения опыта
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        lesson = conn.execute('SELECT id, group_id FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+        if not lesson:
+            raise GradesError([{'error': 'Занятие не найдено'}])
+
+        enrolled = {row['student_id'] for row in conn.execute(
+            'SELECT student_id FROM student_groups WHERE group_id = ?', (lesson['group_id'],)
+        )}
+        errors = [{'student_id': row[0], 'error': 'Студент не записан в группу'}
+                  for row in rows if row[0] not in enrolled]
+        if errors:
+            raise GradesError(errors)
+
+        previous = {row['student_id']: row['exp_earned'] or 0 for row in conn.execute(
+            'SELECT student_id, exp_earned FROM journal WHERE lesson_id = ?', (lesson_id,)
+        )}
+        deltas = [(row[5] - previous.get(row[0], 0), row[0]) for row in rows]
+        deltas = [delta for delta in deltas if delta[0]]
+
+        conn.executemany('''
+            INSERT INTO journal (lesson_id, student_id, grade, behavior, participation, comments, exp_earned)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(lesson_id, student_id) DO UPDATE SET
+                grade = excluded.grade,
+                behavior = excluded.behavior,
+                participation = excluded.participation,
+                comments = excluded.comments,
+                exp_earned = excluded.exp_earned
+        ''', [(lesson_id, *row) for row in rows])
+
+        if deltas:
+            conn.executemany(
+                'UPDATE student_groups SET current_exp = COALESCE(current_exp, 0) + ? WHERE student_id = ? AND group_id = ?',
+                [(delta, student_id, lesson['group_id']) for delta, student_id in deltas]
+            )
+            conn.executemany(
+                'UPDATE students SET total_exp = COALESCE(total_exp, 0) + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                deltas
+            )
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'lesson_id': lesson_id,
+        'group_id': lesson['group_id'],
+        'saved': len(rows),
+        'new_entries': [(row[0], row[1], row[3]) for row in rows if row[0] not in previous],
+        'regraded': [row[0] for row in rows if row[0] in previous],
+        'exp_changed': [student_id for _, student_id in deltas],
+        'exp_delta_total': sum(delta for delta, _ in deltas),
+    }
+
+
+def _update_after_grades(conn, result):
+    """Уровни и достижения после сохранения оценок.
+
+    Оценки к этому моменту уже зафиксированы, поэтому сбой здесь не
+    отменяет сохранение: он попадает в result['warnings'], а пересчёт
+    ставится в очередь заданий.
+    """
+    result['warnings'] = []
+    try:
+        # Уровни пересчитываются только для студентов с изменившимся опытом
+        result['levels_moved'] = recalculate_levels(conn, result['exp_changed'])['moved']
+        bump('students')
+    except sqlite3.Error:
+        conn.rollback()
+        current_app.logger.exception('Уровни после оценок занятия %s не пересчитаны', result['lesson_id'])
+        result['levels_moved'] = None
+        result['warnings'].append(_queue_repair(conn, 'recalculate_levels', {'student_ids': result['exp_changed']},
+                                                'Уровни студентов не пересчитаны'))
+    try:
+        result['achievements_awarded'] = len(record_journal(conn, result))
+        bump('students', 'student_achievements')
+    except sqlite3.Error:
+        conn.rollback()
+        current_app.logger.exception('Достижения после оценок занятия %s не начислены', result['lesson_id'])
+        result['achievements_awarded'] = None
+        result['warnings'].append(_queue_repair(conn, 'rebuild_achievements', {},
+                                                'Достижения не начислены'))
+
+
+def _queue_repair(conn, kind, payload, message):
+    try:
+        submit(conn, kind, payload)
+    except sqlite3.Error:
+        return message
+    return message + ', пересчёт поставлен в очередь'
+
+
+@journal_bp.route('/journal/lessons/<int:lesson_id>/grades', methods=['POST'])
+@login_required
+def save_grades(lesson_id):
+    entries = parse_grades_payload()
+    
+    try:
+        with get_db_connection() as conn:
+            result = save_lesson_grades(conn, lesson_id, entries)
+            bump('journal', 'students', 'student_groups')
+            _update_after_grades(conn, result)
+            
+    except GradesError as e:
+        if request.is_json:
+            return jsonify({'lesson_id': lesson_id, 'errors': e.errors}), 400
+        flash('Оценки не сохранены: ' + '; '.join(error['error'] for error in e.errors), 'error')
+        return redirect(url_for('journal.journal_main', group_id=request.form.get('group_id', type=int)))
+    except sqlite3.Error:
+        if request.is_json:
+            return jsonify({'lesson_id': lesson_id, 'errors': [{'error': 'Ошибка сохранения оценок'}]}), 500
+        flash('Ошибка сохранения оценок', 'error')
+        return redirect(url_for('journal.journal_main', group_id=request.form.get('group_id', type=int)))
+    
+    if request.is_json:
+        return jsonify(result)
+    flash(f'Оценки сохранены: {result["saved"]}', 'success')
+    for warning in result['warnings']:
+        flash(warning, 'error')
+    return redirect(url_for('journal.journal_main', group_id=result['group_id']))
@@ -0,0 +1,306 @@
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import Blueprint, current_app, flash, jsonify, redirect, request, session, url_for
+
+from .db import get_db_connection
+
+leaderboard_bp = Blueprint('leaderboard', __name__)
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class Ranking:
+    """Один рейтинг: ключи (-опыт, id студента) в отсортированном списке.
+
+    Место студента, его соседи и первые N ищутся bisect за O(log n).
+    Места выдаются "спортивно": при равном опыте место одно.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._exp = {}
+
+    @classmethod
+    def from_items(cls, exp_by_student):
+        ranking = cls()
+        ranking._exp = exp_by_student
+        ranking._keys = sorted((-exp, student_id) for student_id, exp in exp_by_student.items())
+        return ranking
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, student_id, exp):
+        if self._exp.get(student_id) == exp:
+            return
+        self.remove(student_id)
+        self._exp[student_id] = exp
+        insort(self._keys, (-exp, student_id))
+
+    def remove(self, student_id):
+        exp = self._exp.pop(student_id, None)
+        if exp is not None:
+            index = bisect_left(self._keys, (-exp, student_id))
+            del self._keys[index]
+
+    def _entry(self, index):
+        negative_exp, student_id = self._keys[index]
+        # Место - число студентов с большим опытом плюс один
+        return {'rank': bisect_left(self._keys, (negative_exp,)) + 1,
+                'student_id': student_id, 'exp': -negative_exp}
+
+    def top(self, limit):
+        return [self._entry(index) for index in range(min(limit, len(self._keys)))]
+
+    def around(self, student_id, neighbors):
+        """Место студента и по neighbors соседей выше и ниже"""
+        exp = self._exp.get(student_id)
+        if exp is None:
+            return None, []
+        position = bisect_left(self._keys, (-exp, student_id))
+        window = range(max(0, position - neighbors), min(len(self._keys), position + neighbors + 1))
+        return self._entry(position), [self._entry(index) for index in window]
+
+
+# Опыт студентов по рейтингам: (рейтинг, область, id студента, опыт).
+# В рейтинги групп и курсов входят только текущие записи (completion_status = 'studying').
+# {students} и {memberships} - фильтры по студентам для инкрементального обновления
+_PLACEMENTS_SQL = '''
+    SELECT 'global' AS board, '' AS scope, s.id AS student_id, COALESCE(s.total_exp, 0) AS exp
+    FROM students s
+    WHERE s.status = 'active' {students}
+    UNION ALL
+    SELECT 'school', s.school, s.id, COALESCE(s.total_exp, 0)
+    FROM students s
+    WHERE s.status = 'active' AND s.school IS NOT NULL {students}
+    UNION ALL
+    SELECT 'group', sg.group_id, sg.student_id, COALESCE(sg.current_exp, 0)
+    FROM student_groups sg
+    JOIN students s ON s.id = sg.student_id
+    WHERE s.status = 'active' AND sg.completion_status = 'studying' {memberships}
+    UNION ALL
+    SELECT 'course', g.course_id, sg.student_id, SUM(COALESCE(sg.current_exp, 0))
+    FROM student_groups sg
+    JOIN groups g ON g.id = sg.group_id
+    JOIN students s ON s.id = sg.student_id
+    WHERE s.status = 'active' AND sg.completion_status = 'studying' {memberships}
+    GROUP BY g.course_id, sg.student_id
+'''
+
+
+class Leaderboards:
+    """Рейтинги по опыту в памяти процесса.
+
+    Полностью строятся один раз (rebuild), затем обновляются только для
+    студентов из журнала leaderboard_changes, который заполняют триггеры
+    при изменении опыта, школы, статуса или записи в группы.
+
+    _lock защищает структуры рейтингов при чтении, _update_lock выстраивает
+    обновления друг за другом: иначе два потока прочитают один отрезок журнала
+    и применят его дважды, а более старый снимок может затереть новый.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._update_lock = threading.RLock()
+        self._rankings = {}
+        self._placements = {}
+        self._seq = None
+        self.rebuilds = 0
+        self.applied_changes = 0
+
+    def _place(self, student_id, placements):
+        old = self._placements.get(student_id, {})
+        for key in old.keys() - placements.keys():
+            self._rankings[key].remove(student_id)
+        for key, exp in placements.items():
+            self._rankings.setdefault(key, Ranking()).set(student_id, exp)
+        if placements:
+            self._placements[student_id] = placements
+        else:
+            self._placements.pop(student_id, None)
+
+    def rebuild(self, conn):
+        """Полное построение рейтингов по таблицам (восстановление)"""
+        with self._update_lock:
+            return self._rebuild(conn)
+
+    def _rebuild(self, conn):
+        started = time.perf_counter()
+        # Номер изменения и данные читаются в одной транзакции чтения
+        conn.execute('BEGIN')
+        try:
+            # sqlite_sequence хранит последний номер, даже если журнал обрезан целиком
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'leaderboard_changes'").fetchone()
+            seq = row[0] if row else 0
+            placements = {}
+            for board, scope, student_id, exp in conn.execute(
+                    _PLACEMENTS_SQL.format(students='', memberships='')):
+                placements.setdefault(student_id, {})[(board, scope)] = exp
+        finally:
+            conn.rollback()
+
+        scores = {}
+        for student_id, keys in placements.items():
+            for key, exp in keys.items():
+                scores.setdefault(key, {})[student_id] = exp
+        # Каждый рейтинг сортируется один раз, а не вставками по одному
+        rankings = {key: Ranking.from_items(exp_by_student) for key, exp_by_student in scores.items()}
+
+        with self._lock:
+            self._rankings = rankings
+            self._placements = placements
+            self._seq = seq
+            self.rebuilds += 1
+        return {'students': len(placements), 'rankings': len(rankings),
+                'seconds': round(time.perf_counter() - started, 3)}
+
+    def refresh(self, conn):
+        """Применение изменений опыта после последнего обновления"""
+        with self._update_lock:
+            self._refresh(conn)
+
+    def _refresh(self, conn):
+        if self._seq is None:
+            self._rebuild(conn)
+            return
+
+        conn.execute('BEGIN')
+        try:
+            newest = conn.execute('SELECT MAX(seq) FROM leaderboard_changes WHERE seq > ?',
+                                  (self._seq,)).fetchone()[0]
+            if newest is None:
+                return
+            first_kept = conn.execute('SELECT MIN(seq) FROM leaderboard_changes').fetchone()[0]
+            # Журнал обрезан дальше, чем мы успели прочитать - только полное построение
+            if first_kept > self._seq + 1:
+                conn.rollback()
+                self._rebuild(conn)
+                return
+
+            student_ids = [row[0] for row in conn.execute(
+                'SELECT DISTINCT student_id FROM leaderboard_changes WHERE seq > ? AND seq <= ?',
+                (self._seq, newest))]
+            ids = json.dumps(student_ids)
+            placements = {student_id: {} for student_id in student_ids}
+            for board, scope, student_id, exp in conn.execute(_PLACEMENTS_SQL.format(
+                    students='AND s.id IN (SELECT value FROM json_each(:ids))',
+                    memberships='AND sg.student_id IN (SELECT value FROM json_each(:ids))'), {'ids': ids}):
+                placements[student_id][(board, scope)] = exp
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+        with self._lock:
+            for student_id, keys in placements.items():
+                self._place(student_id, keys)
+            self._seq = newest
+            self.applied_changes += len(student_ids)
+
+    def view(self, board, scope, limit, student_id=None, neighbors=3):
+        """Первые limit мест, место студента и его соседи"""
+        with self._lock:
+            ranking = self._rankings.get((board, scope))
+            if ranking is None:
+                return 0, [], None, []
+            me, around = ranking.around(student_id, neighbors) if student_id else (None, [])
+            return len(ranking), ranking.top(limit), me, around
+
+    def stats(self):
+        return {'rankings': len(self._rankings), 'students': len(self._placements),
+                'seq': self._seq, 'rebuilds': self.rebuilds, 'applied_changes': self.applied_changes}
+
+
+leaderboards = Leaderboards()
+
+
+def prune_leaderboard_changes(conn, keep):
+    """Удаление старых записей журнала; отставшие процессы перестроят рейтинги целиком"""
+    deleted = conn.execute('''
+        DELETE FROM leaderboard_changes
+        WHERE seq <= (SELECT MAX(seq) FROM leaderboard_changes) - ?
+    ''', (keep,)).rowcount
+    conn.commit()
+    return deleted
+
+
+def _with_students(conn, entries):
+    if not entries:
+        return entries
+    rows = conn.execute('''
+        SELECT id, full_name, school, level FROM students
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps([entry['student_id'] for entry in entries]),)).fetchall()
+    students = {row['id']: row for row in rows}
+    for entry in entries:
+        row = students.get(entry['student_id'])
+        if row:
+            entry.update(full_name=row['full_name'], school=row['school'], level=row['level'])
+    return entries
+
+
+def _leaderboard_response(board, scope):
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    neighbors = max(0, min(request.args.get('around', 3, type=int), 25))
+    student_id = request.args.get('student_id', type=int)
+
+    try:
+        with get_db_connection() as conn:
+            leaderboards.refresh(conn)
+            total, top, me, around = leaderboards.view(board, scope, limit, student_id, neighbors)
+            # Имена дочитываются только для выводимых строк
+            _with_students(conn, top + around)
+    except sqlite3.Error:
+        return jsonify({'board': board, 'scope': scope, 'error': 'Ошибка загрузки рейтинга'}), 500
+
+    return jsonify({'board': board, 'scope': scope, 'total': total, 'top': top,
+                    'student': me, 'neighbors': around})
+
+
+@leaderboard_bp.route('/leaderboard')
+@login_required
+def global_leaderboard():
+    return _leaderboard_response('global', '')
+
+
+@leaderboard_bp.route('/leaderboard/schools/<path:school>')
+@login_required
+def school_leaderboard(school):
+    return _leaderboard_response('school', school)
+
+
+@leaderboard_bp.route('/leaderboard/groups/<int:group_id>')
+@login_required
+def group_leaderboard(group_id):
+    return _leaderboard_response('group', group_id)
+
+
+@leaderboard_bp.route('/leaderboard/courses/<int:course_id>')
+@login_required
+def course_leaderboard(course_id):
+    return _leaderboard_response('course', course_id)
+
+
+@leaderboard_bp.route('/leaderboard/rebuild', methods=['POST'])
+@login_required
+def rebuild_leaderboards():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав'}), 403
+
+    with get_db_connection() as conn:
+        result = leaderboards.rebuild(conn)
+        result['pruned_changes'] = prune_leaderboard_changes(
+            conn, current_app.config.get('LEADERBOARD_CHANGES_KEEP', 100000))
+    return jsonify(result)
@@ -1,17 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
-from contextlib import contextmanager
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
+from .db import get_db_connection
+from .pagination import Keyset, page_args, fetch_page, cached_count, invalidate_counts
+from .page_cache import cached_page, bump
+from .schedule import ScheduleError, materialize_lessons
 
 lessons_bp = Blueprint('lessons', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Сначала свежие даты, внутри дня - по времени начала (занятия без времени первыми)
+LESSONS_KEYSET = Keyset(('l.lesson_date', 'DESC'),
+                        ("COALESCE(l.start_time, '')", 'ASC'),
+                        ('l.id', 'ASC'))
 
 def login_required(f):
     from functools import wraps
@@ -25,19 +23,88 @@ def login_required(f):
 
 @lessons_bp.route('/lessons')
 @login_required
+@cached_page('lessons', 'groups', 'courses')
 def list_lessons():
+    after, after_values, limit = page_args(LESSONS_KEYSET)
+    
     try:
         with get_db_connection() as conn:
-            lessons = conn.execute('''
-                SELECT l.*, g.group_code, c.title as course_title
+            lessons, next_cursor = fetch_page(conn, LESSONS_KEYSET, '''
+                SELECT l.*, g.group_code, c.title as course_title, {keyset_select}
                 FROM lessons l
                 JOIN groups g ON l.group_id = g.id
                 JOIN courses c ON g.course_id = c.id
-                ORDER BY l.lesson_date DESC, l.start_time
-            ''').fetchall()
+                {where}
+                ORDER BY {order_by}
+            ''', (), limit, after_values)
+            total = cached_count(conn, ('lessons', 'all'), '''
+                SELECT COUNT(*)
+                FROM lessons l
+                JOIN groups g ON l.group_id = g.id
+                JOIN courses c ON g.course_id = c.id
+            ''')
             
-        return render_template('lessons/list.html', lessons=lessons)
+        return render_template('lessons/list.html', 
+                             lessons=lessons,
+                             total=total,
+                             limit=limit,
+                             after=after,
+                             next_cursor=next_cursor)
                              
     except Exception as e:
         flash('Ошибка загрузки списка занятий', 'error')
-        return render_template('lessons/list.html', lessons=[])
\ No newline at end of file
+        return render_template('lessons/list.html', lessons=[])
+
+@lessons_bp.route('/lessons/schedule', methods=['POST'])
+@login_required
+def schedule_lessons():
+    """Создание занятий на период по расписанию групп (JSON или форма)"""
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        group_ids = payload.get('group_ids')
+        options = payload
+    else:
+        group_ids = request.form.getlist('group_id', type=int) or None
+        options = request.form
+    
+    def flag(name):
+        return str(options.get(name, '')).lower() in ('1', 'true', 'on', 'yes')
+    
+    try:
+        with get_db_connection() as conn:
+            report = materialize_lessons(conn, group_ids,
+                                         date_from=options.get('date_from') or None,
+                                         date_to=options.get('date_to') or None,
+                                         default_minutes=current_app.config.get('LESSON_DURATION_MINUTES', 90),
+                                         skip_conflicts=flag('skip_conflicts'),
+                                         dry_run=flag('dry_run'))
+    except ScheduleError as e:
+        if request.is_json:
+            return jsonify({'errors': [{'error': str(e)}]}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('lessons.list_lessons'))
+    except Exception as e:
+        if request.is_json:
+            return jsonify({'errors': [{'error': 'Ошибка создания расписания'}]}), 500
+        flash('Ошибка создания расписания', 'error')
+        return redirect(url_for('lessons.list_lessons'))
+    
+    if report['created'] and not report['dry_run']:
+        invalidate_counts('lessons')
+        bump('lessons')
+    
+    if request.is_json:
+        return jsonify(report), 409 if report['conflicts'] and not report['created'] else 200
+    
+    if report['conflicts'] and not report['created']:
+        flash(f'Занятия не созданы: конфликтов расписания {len(report["conflicts"])}', 'error')
+        for conflict in report['conflicts'][:10]:
+            lesson, other = conflict['lesson'], conflict['conflicts_with']
+            busy = 'аудитория занята' if conflict['kind'] == 'classroom' else 'преподаватель занят'
+            flash(f'{lesson["group_code"]} {lesson["date"]} {lesson["start"]}: {busy} '
+                  f'группой {other["group_code"]} {other["start"]}-{other["end"]}', 'error')
+    else:
+        flash(f'Создано занятий: {report["created"]}', 'success')
+    for error in report['errors'][:10]:
+        flash(f'{error["group_code"]}: {error["error"]}', 'error')
+    return redirect(url_for('lessons.list_lessons'))
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from bisect import bisect_right
+
+from flask import current_app, has_app_context
+
+from .jobs import job_handler
+
+
+class LevelResolver:
+    """Пороги опыта из таблицы levels в памяти процесса.
+
+    Пороги загружаются один раз в отсортированный массив, уровень по опыту
+    ищется через bisect. Версия таблицы levels (table_versions) проверяется
+    не чаще раза в refresh_interval секунд; при изменении пороги перечитываются.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._thresholds = []
+        self._levels = []
+        self._titles = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def load(self, conn):
+        rows = conn.execute('SELECT level, exp_required, title FROM levels ORDER BY exp_required, level').fetchall()
+        version = self._read_version(conn)
+        with self._lock:
+            self._thresholds = [row['exp_required'] for row in rows]
+            self._levels = [row['level'] for row in rows]
+            self._titles = {row['level']: row['title'] for row in rows}
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _read_version(self, conn):
+        row = conn.execute("SELECT version FROM table_versions WHERE name = 'levels'").fetchone()
+        return row['version'] if row else 0
+
+    def ensure_fresh(self, conn, force=False):
+        """Перечитать пороги, если таблица levels изменилась"""
+        if not force and self._levels and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if force or not self._levels or self._read_version(conn) != self._version:
+            self.load(conn)
+        else:
+            self._checked_at = time.monotonic()
+
+    def level_for(self, exp):
+        index = bisect_right(self._thresholds, exp or 0) - 1
+        if index < 0:
+            return self._levels[0] if self._levels else 1
+        return self._levels[index]
+
+    def title_for(self, level):
+        return self._titles.get(level)
+
+    def case_sql(self, column):
+        """CASE-выражение уровня по столбцу опыта с порогами из памяти"""
+        branches = ' '.join(
+            f'WHEN COALESCE({column}, 0) >= {int(threshold)} THEN {int(level)}'
+            for threshold, level in reversed(list(zip(self._thresholds, self._levels)))
+        )
+        default = int(self._levels[0]) if self._levels else 1
+        return f'CASE {branches} ELSE {default} END' if branches else str(default)
+
+
+resolver = LevelResolver()
+
+
+def get_resolver(conn):
+    if has_app_context():
+        resolver.refresh_interval = current_app.config.get('LEVELS_REFRESH_INTERVAL', resolver.refresh_interval)
+    resolver.ensure_fresh(conn)
+    return resolver
+
+
+def recalculate_levels(conn, student_ids=None):
+    """Пересчёт students.level одним UPDATE.
+
+    student_ids - студенты, чей total_exp изменился (например, после
+    сохранения оценок); None - проверить всех. Обновляются только строки,
+    где сохранённый уровень расходится с рассчитанным. Возвращает число
+    сменивших уровень и список (student_id, новый уровень).
+    """
+    if student_ids is not None and not student_ids:
+        return {'moved': 0, 'students': []}
+
+    level_sql = get_resolver(conn).case_sql('total_exp')
+    sql = f'''
+        UPDATE students
+        SET level = {level_sql}, updated_at = CURRENT_TIMESTAMP
+        WHERE level IS NOT {level_sql}
+    '''
+    params = []
+    if student_ids is not None:
+        sql += ' AND id IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(list(student_ids)))
+
+    moved = conn.execute(sql + ' RETURNING id, level', params).fetchall()
+    conn.commit()
+    return {'moved': len(moved), 'students': [(row['id'], row['level']) for row in moved]}
+
+
+@job_handler('recalculate_levels')
+def recalculate_levels_job(conn, payload):
+    """Задание пересчёта уровней: payload {"student_ids": [...]} или {} - все студенты"""
+    return {'moved': recalculate_levels(conn, payload.get('student_ids'))['moved']}
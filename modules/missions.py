@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import Blueprint, current_app, flash, has_app_context, jsonify, redirect, session, url_for
+
+from config import Config
+from .db import get_db_connection
+
+missions_bp = Blueprint('missions', __name__)
+
+Mission = namedtuple('Mission', 'level title description hint')
+
+# Поля миссии, которые каталог задаёт в таблице missions
+SYNC_FIELDS = ('title', 'description', 'hint')
+
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class CatalogError(Exception):
+    """Файл каталога миссий не читается или содержит некорректные записи"""
+
+
+class MissionCatalog:
+    """Неизменяемый снимок каталога миссий: индексы по уровню и по названию.
+
+    Снимок не меняется после создания - при перезагрузке файла создаётся
+    новый, поэтому читать его можно из любого потока без блокировок.
+    """
+
+    def __init__(self, missions, digest):
+        self.missions = tuple(sorted(missions, key=lambda mission: mission.level))
+        self.digest = digest
+        self.levels = tuple(mission.level for mission in self.missions)
+        self.by_level = MappingProxyType({mission.level: mission for mission in self.missions})
+        self.by_title = MappingProxyType({mission.title.casefold(): mission for mission in self.missions})
+
+    @classmethod
+    def from_bytes(cls, data):
+        try:
+            items = json.loads(data.decode('utf-8'))
+        except ValueError as e:
+            raise CatalogError(f'Некорректный JSON: {e}')
+        if not isinstance(items, list):
+            raise CatalogError('Каталог должен быть списком миссий')
+
+        missions, levels, titles = [], set(), set()
+        for number, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                raise CatalogError(f'Миссия {number}: ожидается объект')
+            title = str(item.get('title') or '').strip()
+            level = item.get('level')
+            if not title or not isinstance(level, int) or isinstance(level, bool) or level < 1:
+                raise CatalogError(f'Миссия {number}: нужны title и целый level >= 1')
+            if level in levels:
+                raise CatalogError(f'Миссия {number}: уровень {level} повторяется')
+            if title.casefold() in titles:
+                raise CatalogError(f'Миссия {number}: название «{title}» повторяется')
+            levels.add(level)
+            titles.add(title.casefold())
+            missions.append(Mission(level, title, str(item.get('description') or '').strip(),
+                                    (str(item['hint']).strip() or None) if item.get('hint') else None))
+        return cls(missions, hashlib.sha256(data).hexdigest())
+
+    def __len__(self):
+        return len(self.missions)
+
+    def get(self, level):
+        return self.by_level.get(level)
+
+    def find(self, title):
+        return self.by_title.get((title or '').strip().casefold())
+
+    def next_after(self, level):
+        """Первая миссия с уровнем выше level (None - каталог пройден)"""
+        index = bisect_right(self.levels, level or 0)
+        return self.missions[index] if index < len(self.missions) else None
+
+
+class CatalogService:
+    """Каталог миссий из brainrots.json в памяти процесса.
+
+    Файл разбирается один раз; его mtime и размер проверяются не чаще раза
+    в check_interval секунд. Если они изменились, но содержимое (sha256) то же,
+    снимок остаётся прежним. Новый снимок сразу переносится в таблицу missions.
+    """
+
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._synced_digest = None
+        self.reloads = 0
+        self.last_sync = None
+
+    def _file_stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def catalog(self, force=False):
+        """Текущий снимок; между проверками файла обращений к диску нет"""
+        if not force and self._catalog is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._catalog
+        with self._lock:
+            if force or self._catalog is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._refresh(force)
+            catalog = self._catalog
+        if force or catalog.digest != self._synced_digest:
+            self.sync(catalog)
+        return catalog
+
+    def _refresh(self, force):
+        try:
+            stat = self._file_stat()
+            if force or self._catalog is None or stat != self._stat:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+                # Некорректный файл повторно не разбирается, пока не изменится снова
+                self._stat = stat
+                digest = hashlib.sha256(data).hexdigest()
+                if self._catalog is None or digest != self._catalog.digest:
+                    self._catalog = MissionCatalog.from_bytes(data)
+                    self.reloads += 1
+        except (OSError, CatalogError) as e:
+            # Рабочий снимок сохраняется; без него - пустой каталог
+            if self._catalog is None:
+                self._catalog = MissionCatalog((), None)
+            if has_app_context():
+                current_app.logger.warning('Каталог миссий %s не загружен: %s', self.path, e)
+        self._checked_at = time.monotonic()
+
+    def sync(self, catalog):
+        """Перенос снимка в таблицу missions (см. sync_missions)"""
+        if catalog.digest is None:
+            return None
+        with get_db_connection() as conn:
+            result = sync_missions(conn, catalog)
+        self._synced_digest = catalog.digest
+        self.last_sync = result
+        return result
+
+    def stats(self):
+        catalog = self._catalog
+        return {'path': self.path, 'missions': len(catalog) if catalog else 0,
+                'digest': catalog.digest if catalog else None, 'reloads': self.reloads,
+                'last_sync': self.last_sync}
+
+
+def sync_missions(conn, catalog):
+    """Разница каталога и таблицы missions по уровню.
+
+    Новые уровни добавляются, у изменившихся обновляются title, description
+    и hint, уровни, которых нет в каталоге, помечаются is_active = 0.
+    Строки не удаляются: на них ссылаются student_missions.
+    Возвращает число добавленных, обновлённых и отключённых миссий.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = {row['level']: row for row in conn.execute(
+            'SELECT id, level, title, description, hint, is_active FROM missions')}
+
+        inserts, updates = [], []
+        for mission in catalog.missions:
+            row = current.get(mission.level)
+            if row is None:
+                inserts.append((mission.level, mission.title, mission.description, mission.hint))
+            elif (tuple(row[field] for field in SYNC_FIELDS) != tuple(getattr(mission, field) for field in SYNC_FIELDS)
+                  or not row['is_active']):
+                updates.append((mission.title, mission.description, mission.hint, row['id']))
+        deactivate = [(row['id'],) for level, row in current.items()
+                      if level not in catalog.by_level and row['is_active']]
+
+        conn.executemany('INSERT INTO missions (level, title, description, hint) VALUES (?, ?, ?, ?)', inserts)
+        conn.executemany('''
+            UPDATE missions SET title = ?, description = ?, hint = ?, is_active = 1 WHERE id = ?
+        ''', updates)
+        conn.executemany('UPDATE missions SET is_active = 0 WHERE id = ?', deactivate)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'inserted': len(inserts), 'updated': len(updates), 'deactivated': len(deactivate)}
+
+
+_service = None
+
+
+def init_app(app):
+    """Служба каталога миссий; файл читается при первом обращении"""
+    global _service
+    _service = CatalogService(
+        app.config.get('MISSION_CATALOG_PATH', Config.MISSION_CATALOG_PATH),
+        check_interval=app.config.get('MISSION_CATALOG_CHECK_INTERVAL', Config.MISSION_CATALOG_CHECK_INTERVAL),
+    )
+    app.extensions['missions'] = _service
+    return _service
+
+
+def get_catalog():
+    return _service.catalog()
+
+
+def _mission_dict(mission):
+    return mission._asdict() if mission else None
+
+
+@missions_bp.route('/missions')
+@login_required
+def mission_list():
+    catalog = get_catalog()
+    return jsonify({'digest': catalog.digest, 'missions': [mission._asdict() for mission in catalog.missions]})
+
+
+@missions_bp.route('/students/<int:student_id>/next-mission')
+@login_required
+def next_mission(student_id):
+    catalog = get_catalog()
+    with get_db_connection() as conn:
+        row = conn.execute('''
+            SELECT MAX(m.level) AS level
+            FROM student_missions sm
+            JOIN missions m ON m.id = sm.mission_id
+            WHERE sm.student_id = ? AND sm.completed = 1
+        ''', (student_id,)).fetchone()
+    completed_level = row['level'] or 0
+    return jsonify({'student_id': student_id, 'completed_level': completed_level,
+                    'next_mission': _mission_dict(catalog.next_after(completed_level))})
+
+
+@missions_bp.route('/missions/reload', methods=['POST'])
+@login_required
+def reload_catalog():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    try:
+        _service.catalog(force=True)
+    except sqlite3.Error:
+        return jsonify({'error': 'Ошибка синхронизации миссий'}), 500
+    return jsonify(_service.stats())
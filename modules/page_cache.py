@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session, message_flashed
+
+# Версии таблиц в памяти процесса: увеличиваются обработчиками записи
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def bump(*tables):
+    """Отметить изменение таблиц: закэшированные страницы по ним устаревают"""
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def versions(tables):
+    with _versions_lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+class PageCache:
+    """LRU-кэш отрисованных страниц с ограничением по объёму в байтах"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=30):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires'] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, etag, mimetype):
+        size = len(body)
+        # Слишком большие страницы не вытесняют весь кэш
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {'body': body, 'etag': etag, 'mimetype': mimetype,
+                                  'expires': time.monotonic() + self.ttl}
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry['body'])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PageCache(current_app.config.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+                                   current_app.config.get('PAGE_CACHE_TTL', 30))
+    return _cache
+
+
+def page_cache_stats():
+    return get_cache().stats()
+
+
+def _on_flash(app, message, category):
+    g.page_flashed = True
+
+
+message_flashed.connect(_on_flash)
+
+
+def cached_page(*tables):
+    """Кэширование страницы списка по endpoint, аргументам запроса и версиям таблиц.
+
+    Ответ получает ETag; если браузер присылает совпадающий If-None-Match,
+    возвращается 304 без обращения к базе и шаблонам. Страницы с
+    flash-сообщениями не кэшируются: они показываются один раз.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('PAGE_CACHE_ENABLED', True) or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            cache = get_cache()
+            # Страница содержит имя пользователя из сессии - ключ включает пользователя
+            key = (request.endpoint, session.get('user_id'),
+                   tuple(sorted(request.args.items(multi=True))),
+                   tuple(sorted(kwargs.items())), versions(tables))
+
+            entry = cache.get(key)
+            if entry is not None:
+                if request.if_none_match.contains(entry['etag']):
+                    cache.not_modified += 1
+                    response = make_response('', 304)
+                else:
+                    response = make_response(entry['body'])
+                    response.mimetype = entry['mimetype']
+                return _with_cache_headers(response, entry['etag'])
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or g.get('page_flashed') or response.direct_passthrough:
+                return response
+
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            cache.put(key, body, etag, response.mimetype)
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            return _with_cache_headers(response, etag)
+        return decorated_function
+    return decorator
+
+
+def _with_cache_headers(response, etag):
+    response.set_etag(etag)
+    # Браузер всегда переспрашивает сервер и получает 304, если страница не менялась
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
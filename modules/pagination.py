@@ -0,0 +1,140 @@
+import base64
+import json
+import threading
+import time
+
+from flask import current_app, request
+
+
+class Keyset:
+    """Keyset (seek) пагинация по набору столбцов ORDER BY.
+
+    columns - список пар (SQL-выражение, 'ASC' | 'DESC'). Последним
+    столбцом должен идти уникальный ключ (обычно id), чтобы порядок был
+    полностью определён. Выражения не должны возвращать NULL - для
+    nullable столбцов используйте COALESCE.
+    """
+
+    def __init__(self, *columns):
+        self.columns = [(expr, direction.upper()) for expr, direction in columns]
+
+    def select(self):
+        # Значения ключа сортировки попадают в строку результата как _k0, _k1, ...
+        return ', '.join(f'{expr} AS _k{i}' for i, (expr, _) in enumerate(self.columns))
+
+    def order_by(self):
+        return ', '.join(f'{expr} {direction}' for expr, direction in self.columns)
+
+    def where(self, values):
+        """Условие "строго после курсора" и его параметры"""
+        if len(values) != len(self.columns):
+            raise ValueError('Курсор не соответствует порядку сортировки')
+
+        branches = []
+        params = []
+        for i, (expr, direction) in enumerate(self.columns):
+            parts = [f'{prev_expr} = ?' for prev_expr, _ in self.columns[:i]]
+            params.extend(values[:i])
+            parts.append(f"{expr} {'>' if direction == 'ASC' else '<'} ?")
+            params.append(values[i])
+            branches.append('(' + ' AND '.join(parts) + ')')
+        return '(' + ' OR '.join(branches) + ')', params
+
+    def cursor_for(self, row):
+        return encode_cursor([row[f'_k{i}'] for i in range(len(self.columns))])
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size=None):
+    """Значения курсора; size - ожидаемое число столбцов ключа сортировки"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError('Некорректный курсор')
+    if not isinstance(values, list):
+        raise ValueError('Некорректный курсор')
+    # Вложенные списки и объекты не связываются как параметры SQLite
+    if any(isinstance(value, (list, dict)) for value in values):
+        raise ValueError('Некорректный курсор')
+    if size is not None and len(values) != size:
+        raise ValueError('Курсор не соответствует порядку сортировки')
+    return values
+
+
+def page_args(keyset=None):
+    """Параметры ?after= и ?limit= текущего запроса.
+
+    Курсор, который не разбирается или не подходит к keyset, игнорируется -
+    отдаётся первая страница.
+    """
+    default = current_app.config.get('PAGE_SIZE_DEFAULT', 50)
+    maximum = current_app.config.get('PAGE_SIZE_MAX', 200)
+    limit = request.args.get('limit', default, type=int)
+    limit = max(1, min(limit, maximum))
+
+    after = request.args.get('after') or None
+    values = None
+    if after:
+        try:
+            values = decode_cursor(after, len(keyset.columns) if keyset else None)
+        except ValueError:
+            after = None
+    return after, values, limit
+
+
+def fetch_page(conn, keyset, sql, params, limit, after_values=None, conditions=()):
+    """Выполнение запроса одной страницы.
+
+    sql должен содержать плейсхолдеры {keyset_select}, {where} и {order_by}.
+    {where} раскрывается в WHERE из conditions и условия курсора (или в
+    пустую строку), params - параметры conditions. Возвращает (rows, next_cursor).
+    """
+    conditions = list(conditions)
+    where_params = []
+    if after_values is not None:
+        condition, where_params = keyset.where(after_values)
+        conditions.append(condition)
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+    query = sql.format(keyset_select=keyset.select(),
+                       where=where_sql,
+                       order_by=keyset.order_by())
+    rows = conn.execute(query + ' LIMIT ?', [*params, *where_params, limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = keyset.cursor_for(rows[-1])
+    return rows, next_cursor
+
+
+# Кэш общего количества строк: COUNT(*) не пересчитывается на каждой странице
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def cached_count(conn, key, sql, params=()):
+    """COUNT с кэшированием по ключу (таблица, ...фильтры)"""
+    ttl = current_app.config.get('COUNT_CACHE_TTL', 60)
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    total = conn.execute(sql, params).fetchone()[0]
+    with _count_lock:
+        _count_cache[key] = (total, now + ttl)
+    return total
+
+
+def invalidate_counts(table):
+    """Сброс закэшированных количеств для таблицы"""
+    with _count_lock:
+        for key in [key for key in _count_cache if key[0] == table]:
+            del _count_cache[key]
@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+from .db import get_db_connection
+
+
+class VerifierBusy(Exception):
+    """Очередь проверки паролей заполнена или проверка не уложилась во время"""
+
+
+# Параметры werkzeug по умолчанию для методов, записанных без них
+_HASH_DEFAULTS = {'pbkdf2': ['sha256', '600000'], 'scrypt': ['32768', '8', '1']}
+_PBKDF2_DIGESTS = {'sha1': 1, 'sha224': 2, 'sha256': 3, 'sha384': 4, 'sha512': 4}
+
+
+def _hash_cost(method):
+    """(ранг алгоритма, стоимость) для сравнения: scrypt сильнее pbkdf2, pbkdf2 - других"""
+    name, *params = method.split(':')
+    params = params or _HASH_DEFAULTS.get(name, [])
+    try:
+        if name == 'scrypt':
+            n, r, p = (int(value) for value in params)
+            return 2, (n * r * p,)
+        if name == 'pbkdf2':
+            digest, iterations = params
+            return 1, (_PBKDF2_DIGESTS.get(digest, 0), int(iterations))
+    except ValueError:
+        pass
+    return 0, ()
+
+
+def needs_rehash(password_hash, method):
+    """Хэш слабее, чем даёт method (алгоритм, хэш-функция, число итераций).
+
+    Пересчёт только усиливает хэш: scrypt не заменяется на pbkdf2, а хэш с
+    большим числом итераций - хэшем с меньшим.
+    """
+    current = password_hash.split('$', 1)[0]
+    if current == method:
+        return False
+    (current_rank, current_cost), (rank, cost) = _hash_cost(current), _hash_cost(method)
+    if current_rank != rank:
+        return current_rank < rank
+    return any(have < want for have, want in zip(current_cost, cost))
+
+
+class PasswordVerifier:
+    """Проверка и вычисление хэшей паролей в ограниченном пуле потоков.
+
+    PBKDF2/scrypt занимают процессор на десятки миллисекунд, поэтому
+    одновременно считается не больше workers хэшей, а ждать своей очереди
+    могут ещё queue_size запросов. Остальные сразу получают VerifierBusy,
+    и всплеск входов не отнимает процессор у обычных страниц.
+    """
+
+    def __init__(self, workers=2, queue_size=16, timeout=5.0, method='pbkdf2'):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.method = method
+
+        self._pid = os.getpid()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        # Хэш для несуществующих пользователей: ответ по времени не выдаёт, есть ли логин
+        self._dummy_hash = None
+
+        self.verified = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            # Потоки пула не переживают fork - создаём новый пул в дочернем процессе
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password')
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise VerifierBusy()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self.rejected += 1
+            raise VerifierBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Проверка пароля; password_hash=None - пользователь не найден"""
+        if password_hash is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(os.urandom(16).hex())
+            self._run(check_password_hash, self._dummy_hash, password)
+            return False
+        ok = self._run(check_password_hash, password_hash, password)
+        self.verified += 1
+        return ok
+
+    def rehash_later(self, password, on_done):
+        """Фоновый пересчёт хэша со старыми параметрами; пропускается, если пул занят"""
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def task():
+            try:
+                on_done(generate_password_hash(password, self.method))
+                self.rehashed += 1
+            finally:
+                self._slots.release()
+
+        self._get_executor().submit(task)
+        return True
+
+    def stats(self):
+        return {'workers': self.workers, 'queue_size': self.queue_size, 'verified': self.verified,
+                'rejected': self.rejected, 'rehashed': self.rehashed}
+
+
+class LoginThrottle:
+    """Ограничение неудачных попыток входа по имени пользователя и по IP.
+
+    Неудачные попытки хранятся в таблице login_failures, общей для всех
+    процессов приложения: лимит не умножается на число воркеров gunicorn и не
+    сбрасывается при их перезапуске. После max_per_user (max_per_ip) неудач
+    за последние window секунд вход с этим ключом отклоняется до тех пор,
+    пока старейшая из них не выйдет из окна. Проверка выполняется до
+    вычисления хэша, поэтому подбор пароля не занимает пул PasswordVerifier.
+    """
+
+    def __init__(self, window=300, max_per_user=5, max_per_ip=30):
+        self.window = window
+        self.limits = {'user': max_per_user, 'ip': max_per_ip}
+        self.blocked = 0
+
+    def _keys(self, username, ip):
+        return [('user', (username or '').lower()), ('ip', ip or '')]
+
+    def retry_after(self, username, ip):
+        """Через сколько секунд можно повторить вход (0 - можно сейчас)"""
+        now = time.time()
+        wait = 0
+        with get_db_connection() as conn:
+            for scope, key in self._keys(username, ip):
+                # Самая ранняя из последних limit неудач; её нет - лимит не исчерпан
+                row = conn.execute('''
+                    SELECT failed_at FROM login_failures
+                    WHERE scope = ? AND key = ? AND failed_at > ?
+                    ORDER BY failed_at DESC LIMIT 1 OFFSET ?
+                ''', (scope, key, now - self.window, self.limits[scope] - 1)).fetchone()
+                if row:
+                    wait = max(wait, row[0] + self.window - now)
+        if wait:
+            self.blocked += 1
+        return int(wait) + 1 if wait else 0
+
+    def failed(self, username, ip):
+        now = time.time()
+        keys = self._keys(username, ip)
+        with get_db_connection() as conn:
+            conn.executemany('''
+                DELETE FROM login_failures WHERE scope = ? AND key = ? AND failed_at <= ?
+            ''', [(scope, key, now - self.window) for scope, key in keys])
+            conn.executemany('INSERT INTO login_failures (scope, key, failed_at) VALUES (?, ?, ?)',
+                             [(scope, key, now) for scope, key in keys])
+            conn.commit()
+
+    def succeeded(self, username):
+        # Успешный вход сбрасывает счётчик пользователя, но не IP
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM login_failures WHERE scope = 'user' AND key = ?",
+                         ((username or '').lower(),))
+            conn.commit()
+
+    def stats(self):
+        with get_db_connection() as conn:
+            tracked = conn.execute('SELECT COUNT(*) FROM login_failures WHERE failed_at > ?',
+                                   (time.time() - self.window,)).fetchone()[0]
+        return {'tracked_failures': tracked, 'blocked': self.blocked}
+
+
+def prune_login_failures(conn, window):
+    """Удаление неудачных попыток входа, вышедших из окна ограничения"""
+    deleted = conn.execute('DELETE FROM login_failures WHERE failed_at <= ?',
+                           (time.time() - window,)).rowcount
+    conn.commit()
+    return deleted
+
+
+_verifier = None
+_throttle = None
+
+
+def _from_config(config):
+    verifier = PasswordVerifier(
+        workers=config.get('PASSWORD_WORKERS', Config.PASSWORD_WORKERS),
+        queue_size=config.get('PASSWORD_QUEUE_SIZE', Config.PASSWORD_QUEUE_SIZE),
+        timeout=config.get('PASSWORD_VERIFY_TIMEOUT', Config.PASSWORD_VERIFY_TIMEOUT),
+        method=config.get('PASSWORD_HASH_METHOD', Config.PASSWORD_HASH_METHOD),
+    )
+    throttle = LoginThrottle(
+        window=config.get('LOGIN_THROTTLE_WINDOW', Config.LOGIN_THROTTLE_WINDOW),
+        max_per_user=config.get('LOGIN_MAX_FAILURES_PER_USER', Config.LOGIN_MAX_FAILURES_PER_USER),
+        max_per_ip=config.get('LOGIN_MAX_FAILURES_PER_IP', Config.LOGIN_MAX_FAILURES_PER_IP),
+    )
+    return verifier, throttle
+
+
+def init_app(app):
+    """Пул проверки паролей и ограничитель попыток по настройкам приложения"""
+    global _verifier, _throttle
+    _verifier, _throttle = _from_config(app.config)
+    app.extensions['password_verifier'] = _verifier
+    app.extensions['login_throttle'] = _throttle
+
+
+def get_verifier():
+    global _verifier, _throttle
+    if _verifier is None:
+        _verifier, _throttle = _from_config(vars(Config))
+    return _verifier
+
+
+def get_throttle():
+    get_verifier()
+    return _throttle
@@ -0,0 +1,181 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+from . import db
+
+slow_log = logging.getLogger('school_robotics.slow_sql')
+
+# Настройки задаются в init_profiling из конфигурации приложения
+_settings = {'slow_ms': 100.0, 'n_plus_one': 10, 'max_params': 500}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE_RE = re.compile(r'\s+')
+
+# Сводка по endpoint'ам с момента запуска процесса
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def normalize_sql(sql):
+    """SQL без форматирования и литералов: одинаковые запросы дают одну строку"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _format_params(params):
+    text = repr(params)
+    limit = _settings['max_params']
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+def _endpoint():
+    return request.endpoint if has_request_context() else None
+
+
+def _record(sql, params, elapsed, error=None):
+    normalized = None
+    if has_request_context():
+        profile = g.get('sql_profile')
+        if profile is not None:
+            normalized = normalize_sql(sql)
+            profile['queries'] += 1
+            profile['sql_time'] += elapsed
+            profile['statements'][normalized] += 1
+
+    if error is not None or elapsed * 1000 >= _settings['slow_ms']:
+        slow_log.warning('%s %.1f ms endpoint=%s sql=%s params=%s',
+                         'ERROR ' + repr(error) if error is not None else 'SLOW',
+                         elapsed * 1000, _endpoint(), normalized or normalize_sql(sql), _format_params(params))
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Соединение, замеряющее время execute/executemany.
+
+    Учитывается выполнение запроса до первой строки результата; чтение
+    остальных строк через fetch* в замер не входит.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            cursor = super().execute(sql, parameters)
+        except Exception as e:
+            _record(sql, parameters, time.perf_counter() - started, e)
+            raise
+        _record(sql, parameters, time.perf_counter() - started)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        try:
+            cursor = super().executemany(sql, seq_of_parameters)
+        except Exception as e:
+            _record(sql, f'<{len(seq_of_parameters)} наборов>', time.perf_counter() - started, e)
+            raise
+        _record(sql, f'<{len(seq_of_parameters)} наборов>', time.perf_counter() - started)
+        return cursor
+
+
+def _start_request():
+    g.sql_profile = {'queries': 0, 'sql_time': 0.0, 'template_time': 0.0,
+                     'statements': Counter(), 'started': time.perf_counter()}
+
+
+def _before_render(app, template, context):
+    profile = g.get('sql_profile')
+    if profile is not None:
+        profile.setdefault('render_stack', []).append(time.perf_counter())
+
+
+def _after_render(app, template, context):
+    profile = g.get('sql_profile')
+    if profile is not None and profile.get('render_stack'):
+        started = profile['render_stack'].pop()
+        # Вложенные шаблоны (include) учитываются в замере внешнего
+        if not profile['render_stack']:
+            profile['template_time'] += time.perf_counter() - started
+
+
+def _finish_request(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    total = time.perf_counter() - profile['started']
+    endpoint = request.endpoint or request.path
+
+    for sql, count in profile['statements'].items():
+        if count >= _settings['n_plus_one']:
+            slow_log.warning('N+1 endpoint=%s повторов=%d sql=%s', endpoint, count, sql)
+
+    with _endpoints_lock:
+        stats = _endpoints.setdefault(endpoint, {'requests': 0, 'queries': 0, 'sql_time': 0.0,
+                                                 'template_time': 0.0, 'total_time': 0.0,
+                                                 'max_total_time': 0.0})
+        stats['requests'] += 1
+        stats['queries'] += profile['queries']
+        stats['sql_time'] += profile['sql_time']
+        stats['template_time'] += profile['template_time']
+        stats['total_time'] += total
+        stats['max_total_time'] = max(stats['max_total_time'], total)
+
+    response.headers['X-SQL-Queries'] = str(profile['queries'])
+    response.headers['Server-Timing'] = (
+        f'sql;dur={profile["sql_time"] * 1000:.1f};desc="{profile["queries"]} queries", '
+        f'tpl;dur={profile["template_time"] * 1000:.1f}, '
+        f'total;dur={total * 1000:.1f}'
+    )
+    return response
+
+
+def profile_stats():
+    """Сводка по endpoint'ам: запросов к БД, время SQL, шаблонов и всего запроса"""
+    with _endpoints_lock:
+        return {
+            endpoint: dict(stats,
+                           avg_queries=round(stats['queries'] / stats['requests'], 2),
+                           avg_sql_ms=round(stats['sql_time'] * 1000 / stats['requests'], 2),
+                           avg_template_ms=round(stats['template_time'] * 1000 / stats['requests'], 2),
+                           avg_total_ms=round(stats['total_time'] * 1000 / stats['requests'], 2))
+            for endpoint, stats in _endpoints.items()
+        }
+
+
+def init_profiling(app):
+    """Включение профилирования SQL, если задано SQL_PROFILING.
+
+    Должно вызываться до создания пула: замер идёт в классе соединений.
+    """
+    if not app.config.get('SQL_PROFILING'):
+        return
+
+    _settings['slow_ms'] = float(app.config.get('SQL_SLOW_QUERY_MS', 100))
+    _settings['n_plus_one'] = int(app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 10))
+
+    if not slow_log.handlers:
+        handler = RotatingFileHandler(app.config['SQL_SLOW_LOG_PATH'],
+                                      maxBytes=app.config.get('SQL_SLOW_LOG_MAX_BYTES', 5 * 1024 * 1024),
+                                      backupCount=app.config.get('SQL_SLOW_LOG_BACKUPS', 3),
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+        slow_log.propagate = False
+
+    db.set_connection_factory(ProfilingConnection)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.extensions['sql_profiling'] = profile_stats
@@ -1,17 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .pagination import Keyset, page_args, fetch_page, cached_count
+from .page_cache import cached_page
+from .export import ExportError, export_response
 
 projects_bp = Blueprint('projects', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Лучшие проекты первыми (без оценки - в конце), затем новые
+PROJECTS_KEYSET = Keyset(('COALESCE(p.rating, -1)', 'DESC'),
+                         ("COALESCE(p.created_at, '')", 'DESC'),
+                         ('p.id', 'DESC'))
 
 def login_required(f):
     from functools import wraps
@@ -25,19 +23,55 @@ def login_required(f):
 
 @projects_bp.route('/projects')
 @login_required
+@cached_page('projects', 'students', 'groups')
 def list_projects():
+    after, after_values, limit = page_args(PROJECTS_KEYSET)
+    
     try:
         with get_db_connection() as conn:
-            projects = conn.execute('''
-                SELECT p.*, s.full_name as student_name, g.group_code
+            projects, next_cursor = fetch_page(conn, PROJECTS_KEYSET, '''
+                SELECT p.*, s.full_name as student_name, g.group_code, {keyset_select}
+                FROM projects p
+                JOIN students s ON p.student_id = s.id
+                JOIN groups g ON p.group_id = g.id
+                {where}
+                ORDER BY {order_by}
+            ''', (), limit, after_values)
+            total = cached_count(conn, ('projects', 'all'), '''
+                SELECT COUNT(*)
                 FROM projects p
                 JOIN students s ON p.student_id = s.id
                 JOIN groups g ON p.group_id = g.id
-                ORDER BY p.rating DESC, p.created_at DESC
-            ''').fetchall()
+            ''')
             
-        return render_template('projects/list.html', projects=projects)
+        return render_template('projects/list.html', 
+                             projects=projects,
+                             total=total,
+                             limit=limit,
+                             after=after,
+                             next_cursor=next_cursor)
         
     except Exception as e:
         flash('Ошибка загрузки проектов', 'error')
-        return render_template('projects/list.html', projects=[])
\ No newline at end of file
+        return render_template('projects/list.html', projects=[])
+
+PROJECT_EXPORT_COLUMNS = [
+    ('Проект', 'title'), ('Студент', 'student_name'), ('Группа', 'group_code'), ('Тип', 'project_type'),
+    ('Технологии', 'technologies'), ('GitHub', 'github_url'), ('Демо', 'demo_url'),
+    ('Статус', 'status'), ('Оценка', 'rating'), ('Создан', 'created_at'),
+]
+
+@projects_bp.route('/projects/export')
+@login_required
+def export_projects():
+    try:
+        return export_response(request.args.get('format', 'csv'), 'projects', PROJECT_EXPORT_COLUMNS, f'''
+            SELECT p.*, s.full_name as student_name, g.group_code
+            FROM projects p
+            JOIN students s ON p.student_id = s.id
+            JOIN groups g ON p.group_id = g.id
+            ORDER BY {PROJECTS_KEYSET.order_by()}
+        ''')
+    except ExportError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('projects.list_projects'))
@@ -0,0 +1,257 @@
+import json
+import re
+from bisect import bisect_left, insort
+from collections import namedtuple
+from itertools import count
+from datetime import date, datetime, timedelta
+
+# Дни недели в расписании группы (date.weekday(): 0 - понедельник)
+WEEKDAYS = {
+    'пн': 0, 'вт': 1, 'ср': 2, 'чт': 3, 'пт': 4, 'сб': 5, 'вс': 6,
+    'понедельник': 0, 'вторник': 1, 'среда': 2, 'четверг': 3, 'пятница': 4, 'суббота': 5, 'воскресенье': 6,
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+_TOKEN_RE = re.compile(r'([A-Za-zА-Яа-яЁё]+)|(\d{1,2}:\d{2})(?:\s*-\s*(\d{1,2}:\d{2}))?')
+
+Slot = namedtuple('Slot', 'weekday start end')
+
+
+class ScheduleError(Exception):
+    """Расписание группы не удаётся разобрать"""
+
+
+def _minutes(value):
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ScheduleError(f'Некорректное время: {value}')
+    return hours * 60 + minutes
+
+
+def _clock(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def parse_schedule(text, default_minutes=90):
+    """Разбор расписания группы в список Slot.
+
+    Формат: дни недели, за которыми следует время занятия, например
+    "Пн, Ср 15:00-16:30; Сб 11:00". Без времени окончания занятие длится
+    default_minutes. Также принимается JSON: [{"day": "Пн", "start": "15:00",
+    "end": "16:30"}, ...].
+    """
+    text = (text or '').strip()
+    if not text:
+        raise ScheduleError('Расписание не задано')
+
+    if text.startswith('['):
+        try:
+            items = json.loads(text)
+            pairs = [([str(item['day'])], item['start'], item.get('end')) for item in items]
+        except (ValueError, TypeError, KeyError):
+            raise ScheduleError('Некорректное расписание в формате JSON')
+    else:
+        pairs, days = [], []
+        for word, start, end in _TOKEN_RE.findall(text):
+            if word:
+                days.append(word)
+            else:
+                if not days:
+                    raise ScheduleError(f'Время {start} указано без дня недели')
+                pairs.append((days, start, end or None))
+                days = []
+        if days:
+            raise ScheduleError(f'Для дней {", ".join(days)} не указано время')
+
+    slots = set()
+    for days, start, end in pairs:
+        start_minutes = _minutes(start)
+        end_minutes = _minutes(end) if end else start_minutes + default_minutes
+        if end_minutes <= start_minutes or end_minutes > 24 * 60:
+            raise ScheduleError(f'Некорректный интервал {start}-{end}')
+        for day in days:
+            name = day.lower()
+            # Английские названия - по первым трём буквам (Monday, Mon)
+            weekday = WEEKDAYS.get(name, WEEKDAYS.get(name[:3]))
+            if weekday is None:
+                raise ScheduleError(f'Неизвестный день недели: {day}')
+            slots.add(Slot(weekday, start_minutes, end_minutes))
+
+    if not slots:
+        raise ScheduleError('В расписании нет ни одного занятия')
+    return sorted(slots)
+
+
+def format_schedule(slots):
+    """Каноническая запись расписания для groups.schedule"""
+    return ', '.join(f'{WEEKDAY_NAMES[slot.weekday]} {_clock(slot.start)}-{_clock(slot.end)}' for slot in slots)
+
+
+class IntervalIndex:
+    """Занятость аудиторий и преподавателей по дням.
+
+    Для каждого ключа (аудитория или преподаватель) и даты хранится список
+    интервалов, отсортированный по началу. Проверка нового занятия - bisect
+    по началу и просмотр интервалов, начавшихся раньше его окончания.
+    """
+
+    def __init__(self):
+        self._days = {}
+        # Порядковый номер разводит интервалы с одинаковыми границами
+        self._seq = count()
+
+    def add(self, key, day, start, end, lesson):
+        insort(self._days.setdefault((key, day), []), (start, end, next(self._seq), lesson))
+
+    def overlaps(self, key, day, start, end):
+        intervals = self._days.get((key, day))
+        if not intervals:
+            return []
+        # Интервалы [start, end): кандидаты - начавшиеся до окончания нового
+        stop = bisect_left(intervals, (end,))
+        return [lesson for _, other_end, _, lesson in intervals[:stop] if other_end > start]
+
+
+def _term_dates(start, end, slots):
+    by_weekday = {}
+    for slot in slots:
+        by_weekday.setdefault(slot.weekday, []).append(slot)
+    day = start
+    while day <= end:
+        for slot in by_weekday.get(day.weekday(), ()):
+            yield day, slot
+        day += timedelta(days=1)
+
+
+def _parse_date(value, field):
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ScheduleError(f'Некорректная дата ({field}): {value}')
+
+
+def materialize_lessons(conn, group_ids=None, date_from=None, date_to=None,
+                        default_minutes=90, skip_conflicts=False, dry_run=False):
+    """Создание занятий по расписанию групп одной пакетной вставкой.
+
+    group_ids=None - все активные группы. Занятия создаются с start_date
+    группы (или date_from) по end_date (или date_to); уже существующие
+    занятия группы в то же время пропускаются. Каждое новое занятие
+    проверяется на пересечение по аудитории и преподавателю с уже
+    существующими и с другими новыми занятиями. В отчёт попадают все
+    конфликты сразу; при конфликтах ничего не сохраняется, а с
+    skip_conflicts сохраняются занятия без конфликтов.
+    """
+    date_from = _parse_date(date_from, 'date_from') if date_from else None
+    date_to = _parse_date(date_to, 'date_to') if date_to else None
+
+    report = {'groups': 0, 'created': 0, 'skipped_existing': 0, 'conflicts': [], 'errors': [],
+              'dry_run': dry_run}
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        params = []
+        where = "WHERE g.status = 'active'"
+        if group_ids is not None:
+            where = 'WHERE g.id IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(list(group_ids)))
+        groups = conn.execute(f'''
+            SELECT g.id, g.group_code, g.schedule, g.start_date, g.end_date, g.classroom, g.teacher_id,
+                   (SELECT MAX(l.lesson_number) FROM lessons l WHERE l.group_id = g.id) AS last_number
+            FROM groups g
+            {where}
+        ''', params).fetchall()
+
+        plans = []
+        for group in groups:
+            try:
+                slots = parse_schedule(group['schedule'], default_minutes)
+                starts = [date_from] + ([_parse_date(group['start_date'], 'start_date')] if group['start_date'] else [])
+                ends = [date_to] + ([_parse_date(group['end_date'], 'end_date')] if group['end_date'] else [])
+                if not any(starts) or not any(ends):
+                    raise ScheduleError('Не заданы даты начала и окончания обучения')
+                start = max(filter(None, starts))
+                end = min(filter(None, ends))
+            except ScheduleError as e:
+                report['errors'].append({'group_id': group['id'], 'group_code': group['group_code'],
+                                         'error': str(e)})
+                continue
+            plans.append((group, slots, start, end))
+        report['groups'] = len(plans)
+
+        if plans:
+            first = min(start for _, _, start, _ in plans)
+            last = max(end for _, _, _, end in plans)
+            index = IntervalIndex()
+            existing = set()
+            # Все занятия периода одним запросом (idx_lessons_date_start)
+            for row in conn.execute('''
+                SELECT l.id, l.group_id, g.group_code, l.lesson_date, l.start_time, l.end_time,
+                       g.classroom, g.teacher_id
+                FROM lessons l
+                JOIN groups g ON g.id = l.group_id
+                WHERE l.lesson_date BETWEEN ? AND ? AND l.start_time IS NOT NULL
+            ''', (first.isoformat(), last.isoformat())):
+                try:
+                    start = _minutes(row['start_time'][:5])
+                    end = _minutes(row['end_time'][:5]) if row['end_time'] else start + default_minutes
+                except (ScheduleError, ValueError):
+                    continue
+                existing.add((row['group_id'], row['lesson_date'], start))
+                lesson = {'lesson_id': row['id'], 'group_code': row['group_code'], 'date': row['lesson_date'],
+                          'start': _clock(start), 'end': _clock(end)}
+                if row['classroom']:
+                    index.add(('classroom', row['classroom']), row['lesson_date'], start, end, lesson)
+                index.add(('teacher', row['teacher_id']), row['lesson_date'], start, end, lesson)
+
+            rows = []
+            for group, slots, start, end in plans:
+                number = group['last_number'] or 0
+                for day, slot in _term_dates(start, end, slots):
+                    lesson_date = day.isoformat()
+                    if (group['id'], lesson_date, slot.start) in existing:
+                        report['skipped_existing'] += 1
+                        continue
+
+                    lesson = {'lesson_id': None, 'group_code': group['group_code'], 'date': lesson_date,
+                              'start': _clock(slot.start), 'end': _clock(slot.end)}
+                    keys = [('teacher', group['teacher_id'])]
+                    if group['classroom']:
+                        keys.insert(0, ('classroom', group['classroom']))
+                    conflicts = [{'kind': kind, 'value': value, 'lesson': lesson, 'conflicts_with': other}
+                                 for kind, value in keys
+                                 for other in index.overlaps((kind, value), lesson_date, slot.start, slot.end)]
+                    if conflicts:
+                        # Конфликтное занятие не занимает аудиторию и преподавателя:
+                        # иначе следующие занятия получали бы вторичные конфликты
+                        report['conflicts'].extend(conflicts)
+                        continue
+
+                    for key in keys:
+                        index.add(key, lesson_date, slot.start, slot.end, lesson)
+                    number += 1
+                    rows.append((group['id'], number, f'Занятие {number}', lesson_date,
+                                 _clock(slot.start), _clock(slot.end), 'planned'))
+
+            if rows and not dry_run and (skip_conflicts or not report['conflicts']):
+                conn.executemany('''
+                    INSERT INTO lessons (group_id, lesson_number, title, lesson_date, start_time, end_time, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                report['created'] = len(rows)
+            elif dry_run:
+                report['created'] = len(rows)
+
+        if dry_run or report['created'] == 0:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return report
@@ -0,0 +1,80 @@
+from flask import Blueprint, request, redirect, url_for, flash, session, jsonify
+import re
+import sqlite3
+from .db import get_db_connection
+
+search_bp = Blueprint('search', __name__)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Пожалуйста, войдите в систему', 'error')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def fts_query(text):
+    """Строка поиска -> запрос FTS5: каждое слово ищется по префиксу, слова через AND"""
+    if not text:
+        return None
+    text = text.replace('ё', 'е').replace('Ё', 'Е')
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def match_ids(table):
+    """Подзапрос id строк таблицы, найденных полнотекстовым поиском"""
+    return f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?'
+
+@search_bp.route('/search')
+@login_required
+def search():
+    query = fts_query(request.args.get('q', '').strip())
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+
+    results = {'query': request.args.get('q', ''), 'students': [], 'courses': [], 'groups': []}
+    if not query:
+        return jsonify(results)
+
+    try:
+        with get_db_connection() as conn:
+            students = conn.execute('''
+                SELECT s.id, s.student_code, s.full_name, s.school, s.grade, s.status
+                FROM students_fts f
+                JOIN students s ON s.id = f.rowid
+                WHERE students_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (query, limit)).fetchall()
+
+            courses = conn.execute('''
+                SELECT c.id, c.course_code, c.title, c.status
+                FROM courses_fts f
+                JOIN courses c ON c.id = f.rowid
+                WHERE courses_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (query, limit)).fetchall()
+
+            groups = conn.execute('''
+                SELECT g.id, g.group_code, g.status, c.title as course_title
+                FROM groups_fts f
+                JOIN groups g ON g.id = f.rowid
+                JOIN courses c ON g.course_id = c.id
+                WHERE groups_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (query, limit)).fetchall()
+
+        results['students'] = [dict(row) for row in students]
+        results['courses'] = [dict(row) for row in courses]
+        results['groups'] = [dict(row) for row in groups]
+        return jsonify(results)
+
+    except sqlite3.Error:
+        return jsonify({**results, 'error': 'Ошибка поиска'}), 500
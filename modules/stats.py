@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+from init_db import DASHBOARD_COUNTERS
+from .db import get_db_connection
+from .jobs import job_handler, prune_jobs
+from .leaderboard import prune_leaderboard_changes
+from .passwords import prune_login_failures
+
+
+def read_dashboard_stats(conn):
+    """Счётчики панели управления из dashboard_stats и их давность в секундах"""
+    names = list(DASHBOARD_COUNTERS)
+    rows = conn.execute(f'''
+        SELECT name, value,
+               CAST((julianday('now') - julianday(updated_at)) * 86400 AS INTEGER) as updated_ago,
+               CAST((julianday('now') - julianday(reconciled_at)) * 86400 AS INTEGER) as reconciled_ago
+        FROM dashboard_stats
+        WHERE name IN ({', '.join('?' * len(names))}, 'lessons_on:' || date('now'))
+    ''', names).fetchall()
+
+    stats = {name: 0 for name in DASHBOARD_COUNTERS}
+    stats['today_lessons'] = 0
+    staleness = {}
+    for row in rows:
+        key = 'today_lessons' if row['name'].startswith('lessons_on:') else row['name']
+        stats[key] = row['value']
+        staleness[key] = {
+            'updated_seconds_ago': row['updated_ago'],
+            'reconciled_seconds_ago': row['reconciled_ago'],
+        }
+    return stats, staleness
+
+
+def reconcile_dashboard_stats(conn):
+    """Пересчёт счётчиков по исходным таблицам. Возвращает найденные расхождения."""
+    for name, (table, column, value) in DASHBOARD_COUNTERS.items():
+        conn.execute(f'''
+            INSERT INTO dashboard_stats (name, value, updated_at, reconciled_at, drift)
+            VALUES (?, (SELECT COUNT(*) FROM {table} WHERE {column} = ?),
+                    CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 0)
+            ON CONFLICT(name) DO UPDATE SET
+                drift = excluded.value - value,
+                value = excluded.value,
+                reconciled_at = CURRENT_TIMESTAMP
+        ''', (name, value))
+
+    conn.execute('''
+        INSERT INTO dashboard_stats (name, value, updated_at, reconciled_at, drift)
+        SELECT 'lessons_on:' || lesson_date, COUNT(*), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 0
+        FROM lessons
+        GROUP BY lesson_date
+        ON CONFLICT(name) DO UPDATE SET
+            drift = excluded.value - value,
+            value = excluded.value,
+            reconciled_at = CURRENT_TIMESTAMP
+    ''')
+    # Даты, на которые занятий больше нет
+    conn.execute('''
+        UPDATE dashboard_stats
+        SET drift = -value, value = 0, reconciled_at = CURRENT_TIMESTAMP
+        WHERE name LIKE 'lessons_on:%'
+          AND substr(name, 12) NOT IN (SELECT lesson_date FROM lessons WHERE lesson_date IS NOT NULL)
+    ''')
+
+    drift = {row['name']: row['drift'] for row in conn.execute(
+        'SELECT name, drift FROM dashboard_stats WHERE drift != 0'
+    )}
+    conn.execute("DELETE FROM dashboard_stats WHERE name LIKE 'lessons_on:%' AND value = 0")
+    conn.commit()
+    return drift
+
+
+@job_handler('reconcile_dashboard_stats')
+def reconcile_dashboard_stats_job(conn, payload):
+    return {'drift': reconcile_dashboard_stats(conn)}
+
+
+def _try_lock(path):
+    """Неблокирующая блокировка файла на время жизни процесса; None - она у другого процесса"""
+    lock_file = open(path, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class Reconciler:
+    """Периодическая сверка счётчиков, обрезка журнала рейтингов, старых заданий и попыток входа.
+
+    Поток запускается при первом запросе в процессе (проверка pid, как у
+    исполнителей заданий), а не при создании приложения: с preload_app оно
+    создаётся в мастере gunicorn, где запросы не обрабатываются. Из всех
+    воркеров сверку ведёт один - тот, кто держит файл блокировки рядом с базой;
+    остальные пробуют взять её раз в interval секунд, на случай если
+    владелец завершился.
+    """
+
+    def __init__(self, app, interval, lock_path):
+        self.app = app
+        self.interval = interval
+        self.lock_path = lock_path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._lock_file = None
+        self._retry_at = 0.0
+
+    def ensure(self):
+        if self._pid == os.getpid() and (self._thread is not None or time.monotonic() < self._retry_at):
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # После fork поток и блокировка остались у родителя
+                self._pid = os.getpid()
+                self._thread = None
+                self._lock_file = None
+                self._retry_at = 0.0
+            if self._thread is not None or time.monotonic() < self._retry_at:
+                return
+            self._lock_file = _try_lock(self.lock_path)
+            if self._lock_file is None:
+                self._retry_at = time.monotonic() + self.interval
+                return
+            self._thread = threading.Thread(target=self._run, name='dashboard-stats-reconciler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        app = self.app
+        while True:
+            time.sleep(self.interval)
+            try:
+                with get_db_connection() as conn:
+                    drift = reconcile_dashboard_stats(conn)
+                    prune_leaderboard_changes(conn, app.config.get('LEADERBOARD_CHANGES_KEEP', 100000))
+                    prune_jobs(conn, app.config.get('JOBS_KEEP_DAYS', 7))
+                    prune_login_failures(conn, app.config.get('LOGIN_THROTTLE_WINDOW', 300))
+                if drift:
+                    app.logger.warning('Расхождение счётчиков панели управления: %s', drift)
+            except Exception:
+                app.logger.exception('Ошибка сверки счётчиков панели управления')
+
+
+def start_reconciler(app):
+    """Сверка счётчиков в одном процессе; поток стартует с первым запросом (см. Reconciler)"""
+    interval = app.config.get('DASHBOARD_RECONCILE_INTERVAL', 0)
+    if not interval:
+        return None
+    reconciler = Reconciler(app, interval, app.config['DATABASE_PATH'] + '.reconcile.lock')
+    app.before_request(reconciler.ensure)
+    app.extensions['reconciler'] = reconciler
+    return reconciler
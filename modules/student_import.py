@@ -0,0 +1,206 @@
+import csv
+import io
+import re
+import sqlite3
+from datetime import datetime, date
+
+# Столбцы students, которые можно загрузить из файла
+IMPORT_COLUMNS = ('student_code', 'full_name', 'birth_date', 'parent_name', 'parent_phone',
+                  'parent_email', 'grade', 'school', 'notes')
+
+# Заголовки файла -> столбцы (регистр и пробелы по краям не важны)
+HEADER_ALIASES = {
+    'код': 'student_code', 'код студента': 'student_code',
+    'фио': 'full_name', 'имя': 'full_name',
+    'дата рождения': 'birth_date',
+    'родитель': 'parent_name', 'фио родителя': 'parent_name',
+    'телефон': 'parent_phone', 'телефон родителя': 'parent_phone',
+    'email': 'parent_email', 'email родителя': 'parent_email', 'почта': 'parent_email',
+    'класс': 'grade',
+    'школа': 'school',
+    'примечания': 'notes', 'заметки': 'notes',
+}
+
+# Сколько ошибок хранить в отчёте: память не растёт с размером файла
+MAX_REPORTED_ERRORS = 1000
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportFormatError(Exception):
+    """Файл не удаётся прочитать как таблицу студентов"""
+
+
+def _column_for(header):
+    name = (header or '').strip().lower()
+    if name in IMPORT_COLUMNS:
+        return name
+    return HEADER_ALIASES.get(name)
+
+
+def iter_csv(stream):
+    """Строки CSV по одной, без чтения всего файла в память"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        sample = text.read(4096)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        text.seek(0)
+        yield from csv.reader(text, dialect)
+    finally:
+        # Поток принадлежит запросу - не закрываем его вместе с обёрткой
+        text.detach()
+
+
+def iter_xlsx(stream):
+    """Строки первого листа XLSX в режиме read_only"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('Для загрузки XLSX установите пакет openpyxl')
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFormatError('Не удалось открыть файл XLSX')
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def _clean_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f'Некорректная дата рождения: {text}')
+
+
+def validated_rows(rows, max_length=100):
+    """Проверка строк файла.
+
+    Первая строка - заголовок. Для каждой строки данных отдаёт
+    (номер строки, кортеж значений IMPORT_COLUMNS, None) или
+    (номер строки, None, текст ошибки).
+    """
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFormatError('Файл пуст')
+
+    columns = [_column_for(str(cell)) for cell in header]
+    missing = {'student_code', 'full_name'} - set(columns)
+    if missing:
+        raise ImportFormatError('Нет обязательных столбцов: ' + ', '.join(sorted(missing)))
+
+    for line_number, row in enumerate(rows, start=2):
+        if not any(str(cell).strip() for cell in row):
+            continue
+
+        record = dict.fromkeys(IMPORT_COLUMNS)
+        for column, cell in zip(columns, row):
+            if column:
+                value = cell.strip() if isinstance(cell, str) else cell
+                record[column] = None if value == '' else value
+
+        try:
+            if not record['student_code']:
+                raise ValueError('Не указан код студента')
+            if not record['full_name']:
+                raise ValueError('Не указано ФИО')
+            for column in ('student_code', 'full_name', 'parent_name'):
+                if record[column] is not None:
+                    record[column] = str(record[column])
+                    if len(record[column]) > max_length:
+                        raise ValueError(f'Слишком длинное значение: {column}')
+            record['birth_date'] = _clean_date(record['birth_date'])
+            if record['parent_email'] and not _EMAIL_RE.match(str(record['parent_email'])):
+                raise ValueError(f'Некорректный email: {record["parent_email"]}')
+            for column in ('parent_phone', 'parent_email', 'grade', 'school', 'notes'):
+                if record[column] is not None:
+                    record[column] = str(record[column])
+        except ValueError as e:
+            yield line_number, None, str(e)
+            continue
+
+        yield line_number, tuple(record[column] for column in IMPORT_COLUMNS), None
+
+
+_UPSERT_SQL = f'''
+    INSERT INTO students ({', '.join(IMPORT_COLUMNS)})
+    VALUES ({', '.join('?' * len(IMPORT_COLUMNS))})
+    ON CONFLICT(student_code) DO UPDATE SET
+        {', '.join(f'{column} = COALESCE(excluded.{column}, {column})' for column in IMPORT_COLUMNS[1:])},
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+
+def import_students(conn, rows, batch_size=500, max_length=100):
+    """Загрузка студентов пачками executemany в одной транзакции.
+
+    Существующие коды студентов обновляются (ON CONFLICT(student_code)).
+    Ошибочные строки не прерывают загрузку, а попадают в отчёт.
+    """
+    report = {'processed': 0, 'inserted': 0, 'updated': 0, 'failed': 0,
+              'errors': [], 'errors_truncated': False}
+
+    def add_error(line_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': line_number, 'error': message})
+        else:
+            report['errors_truncated'] = True
+
+    def flush(batch):
+        conn.execute('SAVEPOINT import_batch')
+        try:
+            conn.executemany(_UPSERT_SQL, [values for _, values in batch])
+            report['processed'] += len(batch)
+        except sqlite3.IntegrityError:
+            # Ищем виновные строки по одной, остальные строки пачки сохраняем
+            conn.execute('ROLLBACK TO import_batch')
+            for line_number, values in batch:
+                try:
+                    conn.execute(_UPSERT_SQL, values)
+                    report['processed'] += 1
+                except sqlite3.IntegrityError as e:
+                    add_error(line_number, f'Ошибка целостности данных: {e}')
+        conn.execute('RELEASE import_batch')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        before = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+        batch = []
+        for line_number, values, error in validated_rows(rows, max_length):
+            if error:
+                add_error(line_number, error)
+                continue
+            batch.append((line_number, values))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        after = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    report['inserted'] = after - before
+    report['updated'] = report['processed'] - report['inserted']
+    return report
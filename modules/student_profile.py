@@ -0,0 +1,191 @@
+import json
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+# Справочники, названия из которых входят в профиль (версии в table_versions)
+PROFILE_CATALOG_TABLES = ('levels', 'groups', 'courses', 'achievements')
+
+# Профиль целиком - одна SQL-команда: CTE по каждой части и json_group_array.
+# Порядок элементов массивов задаёт ORDER BY во вложенном запросе.
+PROFILE_SQL = '''
+WITH st AS (
+    SELECT * FROM students WHERE id = :student_id
+),
+lvl AS (
+    SELECT
+        (SELECT json_object('level', lv.level, 'title', lv.title, 'exp_required', lv.exp_required)
+         FROM levels lv WHERE lv.exp_required <= COALESCE(st.total_exp, 0)
+         ORDER BY lv.exp_required DESC LIMIT 1) AS current_level,
+        (SELECT json_object('level', lv.level, 'title', lv.title, 'exp_required', lv.exp_required)
+         FROM levels lv WHERE lv.exp_required > COALESCE(st.total_exp, 0)
+         ORDER BY lv.exp_required LIMIT 1) AS next_level
+    FROM st
+),
+grp AS (
+    SELECT json_group_array(json_object(
+        'id', id, 'group_code', group_code, 'course_id', course_id, 'course_title', course_title,
+        'schedule', schedule, 'classroom', classroom, 'status', status,
+        'enrolled_date', enrolled_date, 'completion_status', completion_status,
+        'final_grade', final_grade, 'current_exp', current_exp)) AS items
+    FROM (
+        SELECT g.id, g.group_code, g.course_id, c.title AS course_title, g.schedule, g.classroom, g.status,
+               sg.enrolled_date, sg.completion_status, sg.final_grade, sg.current_exp
+        FROM student_groups sg
+        JOIN groups g ON sg.group_id = g.id
+        JOIN courses c ON g.course_id = c.id
+        WHERE sg.student_id = :student_id
+        ORDER BY sg.enrolled_date DESC, sg.id DESC
+    )
+),
+jr AS (
+    SELECT json_group_array(json_object(
+        'lesson_id', lesson_id, 'lesson_date', lesson_date, 'lesson_title', lesson_title,
+        'group_code', group_code, 'grade', grade, 'behavior', behavior,
+        'participation', participation, 'comments', comments, 'exp_earned', exp_earned)) AS items
+    FROM (
+        SELECT j.lesson_id, l.lesson_date, l.title AS lesson_title, g.group_code, j.grade, j.behavior,
+               j.participation, j.comments, j.exp_earned
+        FROM journal j
+        JOIN lessons l ON j.lesson_id = l.id
+        JOIN groups g ON l.group_id = g.id
+        WHERE j.student_id = :student_id
+        ORDER BY l.lesson_date DESC, j.lesson_id DESC
+        LIMIT :journal_limit
+    )
+),
+jstats AS (
+    SELECT json_object(
+        'entries', COUNT(*),
+        'graded', COUNT(grade),
+        'average_grade', ROUND(AVG(grade), 2),
+        'exp_earned', COALESCE(SUM(exp_earned), 0)) AS summary
+    FROM journal WHERE student_id = :student_id
+),
+prj AS (
+    SELECT json_group_array(json_object(
+        'id', id, 'title', title, 'project_type', project_type, 'technologies', technologies,
+        'github_url', github_url, 'demo_url', demo_url, 'status', status, 'rating', rating,
+        'featured', featured, 'group_id', group_id, 'created_at', created_at)) AS items
+    FROM (
+        SELECT * FROM projects WHERE student_id = :student_id ORDER BY created_at DESC, id DESC
+    )
+),
+ach AS (
+    SELECT json_group_array(json_object(
+        'id', id, 'name', name, 'description', description, 'icon', icon, 'rarity', rarity,
+        'exp_reward', exp_reward, 'earned_date', earned_date, 'group_id', group_id)) AS items
+    FROM (
+        SELECT a.id, a.name, a.description, a.icon, a.rarity, a.exp_reward, sa.earned_date, sa.group_id
+        FROM student_achievements sa
+        JOIN achievements a ON sa.achievement_id = a.id
+        WHERE sa.student_id = :student_id
+        ORDER BY sa.earned_date DESC, sa.id DESC
+    )
+)
+SELECT json_object(
+    'student', json_object(
+        'id', st.id, 'student_code', st.student_code, 'full_name', st.full_name,
+        'birth_date', st.birth_date, 'parent_name', st.parent_name, 'parent_phone', st.parent_phone,
+        'parent_email', st.parent_email, 'grade', st.grade, 'school', st.school, 'notes', st.notes,
+        'total_exp', st.total_exp, 'level', st.level, 'status', st.status,
+        'created_at', st.created_at, 'updated_at', st.updated_at),
+    'level', json(lvl.current_level),
+    'next_level', json(lvl.next_level),
+    'groups', json(grp.items),
+    'journal', json(jr.items),
+    'journal_summary', json(jstats.summary),
+    'projects', json(prj.items),
+    'achievements', json(ach.items)
+) AS profile
+FROM st, lvl, grp, jr, jstats, prj, ach
+'''
+
+VERSION_SQL = f'''
+SELECT
+    (SELECT version FROM student_profile_versions WHERE student_id = ?) AS version,
+    (SELECT SUM(version) FROM table_versions
+     WHERE name IN ({', '.join(f"'{table}'" for table in PROFILE_CATALOG_TABLES)})) AS catalog_version
+'''
+
+
+class ProfileCache:
+    """LRU-кэш профилей студентов (JSON-текст) по версии профиля.
+
+    Версию увеличивают триггеры на students, student_groups, journal,
+    projects и student_achievements (student_profile_versions), а справочники
+    отслеживаются через table_versions. Проверка версии - один запрос по
+    первичным ключам, поэтому запись из другого процесса сразу делает
+    закэшированный профиль устаревшим.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, student_id, version):
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(student_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, student_id, version, profile):
+        with self._lock:
+            self._entries[student_id] = (version, profile)
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ProfileCache(current_app.config.get('PROFILE_CACHE_MAX_ENTRIES', 1000))
+    return _cache
+
+
+def profile_version(conn, student_id):
+    """Версия профиля: меняется при любом изменении его строк или справочников"""
+    row = conn.execute(VERSION_SQL, (student_id,)).fetchone()
+    return f'{student_id}.{row["version"] or 0}.{row["catalog_version"] or 0}'
+
+
+def load_profile_json(conn, student_id, journal_limit=50):
+    """Профиль студента JSON-текстом и его версия; (None, версия) - студента нет"""
+    version = f'{profile_version(conn, student_id)}.{journal_limit}'
+    cache = get_cache()
+    profile = cache.get(student_id, version)
+    if profile is None:
+        row = conn.execute(PROFILE_SQL, {'student_id': student_id, 'journal_limit': journal_limit}).fetchone()
+        profile = row['profile'] if row else None
+        if profile is not None:
+            cache.put(student_id, version, profile)
+    return profile, version
+
+
+def load_profile(conn, student_id, journal_limit=50):
+    profile, _ = load_profile_json(conn, student_id, journal_limit)
+    return json.loads(profile) if profile is not None else None
+
+
+def profile_cache_stats():
+    return get_cache().stats()
@@ -1,18 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 import sqlite3
-from contextlib import contextmanager
+from .db import get_db_connection
+from .pagination import Keyset, page_args, fetch_page, cached_count, invalidate_counts
+from .search import fts_query, match_ids
+from .page_cache import cached_page, bump
+from .export import ExportError, export_response
+from .student_import import ImportFormatError, iter_csv, iter_xlsx, import_students
+from .student_profile import load_profile, load_profile_json
 from datetime import date
 
 students_bp = Blueprint('students', __name__)
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('instance/school_robotics.db')
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Порядок списка студентов: по ФИО, id - для однозначности курсора
+STUDENTS_KEYSET = Keyset(('s.full_name', 'ASC'), ('s.id', 'ASC'))
 
 def login_required(f):
     from functools import wraps
@@ -24,34 +24,53 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _student_filters(status_filter, search):
+    """Условия WHERE списка студентов по статусу и поисковой строке"""
+    conditions, params = [], []
+    if status_filter != 'all':
+        conditions.append('s.status = ?')
+        params.append(status_filter)
+    query = fts_query(search)
+    if query:
+        conditions.append(f's.id IN ({match_ids("students")})')
+        params.append(query)
+    return conditions, params, query
+
 @students_bp.route('/students')
 @login_required
+@cached_page('students', 'student_groups')
 def list_students():
     status_filter = request.args.get('status', 'active')
+    search = request.args.get('q', '').strip()
+    after, after_values, limit = page_args(STUDENTS_KEYSET)
+    conditions, params, query = _student_filters(status_filter, search)
     
     try:
         with get_db_connection() as conn:
-            if status_filter == 'all':
-                students = conn.execute('''
-                    SELECT s.*, COUNT(sg.id) as group_count
-                    FROM students s
-                    LEFT JOIN student_groups sg ON s.id = sg.student_id AND sg.completion_status = 'studying'
-                    GROUP BY s.id
-                    ORDER BY s.full_name
-                ''').fetchall()
+            students, next_cursor = fetch_page(conn, STUDENTS_KEYSET, '''
+                SELECT s.*, {keyset_select},
+                       (SELECT COUNT(*) FROM student_groups sg
+                        WHERE sg.student_id = s.id AND sg.completion_status = 'studying') as group_count
+                FROM students s
+                {where}
+                ORDER BY {order_by}
+            ''', params, limit, after_values, conditions)
+            
+            count_sql = 'SELECT COUNT(*) FROM students s ' + ('WHERE ' + ' AND '.join(conditions) if conditions else '')
+            if query:
+                # Результаты поиска не кэшируем: вариантов запроса слишком много
+                total = conn.execute(count_sql, params).fetchone()[0]
             else:
-                students = conn.execute('''
-                    SELECT s.*, COUNT(sg.id) as group_count
-                    FROM students s
-                    LEFT JOIN student_groups sg ON s.id = sg.student_id AND sg.completion_status = 'studying'
-                    WHERE s.status = ?
-                    GROUP BY s.id
-                    ORDER BY s.full_name
-                ''', (status_filter,)).fetchall()
+                total = cached_count(conn, ('students', status_filter), count_sql, params)
             
         return render_template('students/list.html', 
                              students=students, 
-                             current_status=status_filter)
+                             current_status=status_filter,
+                             search=search,
+                             total=total,
+                             limit=limit,
+                             after=after,
+                             next_cursor=next_cursor)
                              
     except Exception as e:
         flash('Ошибка загрузки списка студентов', 'error')
@@ -81,6 +100,8 @@ def add_student():
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', tuple(student_data.values()))
                 conn.commit()
+            invalidate_counts('students')
+            bump('students')
                 
             flash('Студент успешно добавлен', 'success')
             return redirect(url_for('students.list_students'))
@@ -92,32 +113,108 @@ def add_student():
     
     return render_template('students/add.html')
 
+STUDENT_EXPORT_COLUMNS = [
+    ('Код', 'student_code'), ('ФИО', 'full_name'), ('Дата рождения', 'birth_date'),
+    ('Родитель', 'parent_name'), ('Телефон родителя', 'parent_phone'), ('Email родителя', 'parent_email'),
+    ('Класс', 'grade'), ('Школа', 'school'), ('Опыт', 'total_exp'), ('Уровень', 'level'),
+    ('Статус', 'status'), ('Групп', 'group_count'),
+]
+
+@students_bp.route('/students/export')
+@login_required
+def export_students():
+    conditions, params, _ = _student_filters(request.args.get('status', 'active'),
+                                             request.args.get('q', '').strip())
+    try:
+        return export_response(request.args.get('format', 'csv'), 'students', STUDENT_EXPORT_COLUMNS, f'''
+            SELECT s.*,
+                   (SELECT COUNT(*) FROM student_groups sg
+                    WHERE sg.student_id = s.id AND sg.completion_status = 'studying') as group_count
+            FROM students s
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY s.full_name, s.id
+        ''', params)
+    except ExportError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('students.list_students'))
+
+@students_bp.route('/students/import', methods=['POST'])
+@login_required
+def import_students_file():
+    """Массовая загрузка студентов из CSV/XLSX с отчётом по строкам"""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    upload = request.files.get('file')
+
+    try:
+        if not upload or not upload.filename:
+            raise ImportFormatError('Файл не выбран')
+        extension = upload.filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            rows = iter_csv(upload.stream)
+        elif extension == 'xlsx':
+            rows = iter_xlsx(upload.stream)
+        else:
+            raise ImportFormatError('Поддерживаются только файлы CSV и XLSX')
+
+        with get_db_connection() as conn:
+            report = import_students(conn, rows,
+                                     batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 500),
+                                     max_length=current_app.config.get('MAX_NAME_LENGTH', 100))
+    except ImportFormatError as e:
+        if wants_json:
+            return jsonify({'errors': [{'row': None, 'error': str(e)}]}), 400
+        flash(f'Импорт не выполнен: {e}', 'error')
+        return redirect(url_for('students.list_students'))
+    except Exception:
+        if wants_json:
+            return jsonify({'errors': [{'row': None, 'error': 'Ошибка импорта студентов'}]}), 500
+        flash('Ошибка импорта студентов', 'error')
+        return redirect(url_for('students.list_students'))
+
+    if report['processed']:
+        invalidate_counts('students')
+        bump('students')
+
+    if wants_json:
+        return jsonify(report)
+
+    flash(f'Импорт завершён: добавлено {report["inserted"]}, обновлено {report["updated"]}, '
+          f'с ошибками {report["failed"]}', 'success')
+    for error in report['errors'][:10]:
+        flash(f'Строка {error["row"]}: {error["error"]}', 'error')
+    return redirect(url_for('students.list_students'))
+
 @students_bp.route('/students/<int:student_id>')
 @login_required
 def student_detail(student_id):
     try:
         with get_db_connection() as conn:
-            student = conn.execute(
-                'SELECT * FROM students WHERE id = ?', (student_id,)
-            ).fetchone()
-            
-            if not student:
-                flash('Студент не найден', 'error')
-                return redirect(url_for('students.list_students'))
+            profile = load_profile(conn, student_id, current_app.config.get('PROFILE_JOURNAL_LIMIT', 50))
             
-            groups = conn.execute('''
-                SELECT g.*, c.title as course_title, sg.enrolled_date, sg.completion_status
-                FROM student_groups sg
-                JOIN groups g ON sg.group_id = g.id
-                JOIN courses c ON g.course_id = c.id
-                WHERE sg.student_id = ?
-                ORDER BY sg.enrolled_date DESC
-            ''', (student_id,)).fetchall()
+        if not profile:
+            flash('Студент не найден', 'error')
+            return redirect(url_for('students.list_students'))
             
         return render_template('students/detail.html', 
-                             student=student, 
-                             groups=groups)
+                             student=profile['student'], 
+                             groups=profile['groups'],
+                             profile=profile)
                              
     except Exception as e:
         flash('Ошибка загрузки информации о студенте', 'error')
-        return redirect(url_for('students.list_students'))
\ No newline at end of file
+        return redirect(url_for('students.list_students'))
+
+@students_bp.route('/students/<int:student_id>/profile.json')
+@login_required
+def student_profile_json(student_id):
+    """Профиль студента для родительского и мобильного приложения; ETag - версия профиля"""
+    with get_db_connection() as conn:
+        profile, version = load_profile_json(conn, student_id, current_app.config.get('PROFILE_JOURNAL_LIMIT', 50))
+    if profile is None:
+        return jsonify({'error': 'Студент не найден'}), 404
+    if request.if_none_match.contains(version):
+        return '', 304, {'ETag': f'"{version}"', 'Cache-Control': 'private, no-cache'}
+    response = current_app.response_class(profile, mimetype='application/json')
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""Точка входа WSGI для production.
+
+Linux/macOS (несколько процессов и потоков):
+    gunicorn -c gunicorn.conf.py wsgi:app
+Windows (только потоки):
+    waitress-serve --threads=8 --port=8000 wsgi:app
+"""
+from app import create_app
+
+app = create_app()